@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the SDK's Happy Paisa Ledger client
+Starts fake_ledger_server.py in-process with a per-request latency standing in
+for the ledger's database round trips, then measures:
+
+- balance queries from many users, a few of them asking repeatedly, with a
+  share of writes mixed in, with the balance cache off and on
+- a dashboard-sized balance lookup: one request per user in turn, against
+  get_balances() cold and warm
+
+Run from the core-home-assistant-sdk directory:
+
+    python bench_ledger_client.py --queries 5000 --users 500 --latency-ms 5
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+
+from fake_ledger_server import create_app
+from ledger_client import LedgerClient
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))] if ordered else 0.0
+
+def start_fake_ledger(latency_ms: float) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(latency_ms), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+async def upstream_balance_requests(base_url: str) -> int:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        return (await client.get("/_stats")).json().get("balance", 0)
+
+async def bench_queries(args, base_url: str, users):
+    rng = random.Random(args.seed)
+    weights = [1.0 / (rank + 1) ** args.skew for rank in range(len(users))]
+    plan = [(rng.random() < args.write_share, user) for user in rng.choices(users, weights, k=args.queries)]
+    print(f"🚀 {args.queries} balance queries from {len(users)} users (skew {args.skew}), "
+          f"{args.write_share:.0%} writes, concurrency {args.concurrency}, ledger latency {args.latency_ms:.0f}ms")
+    print(f"   {'cache':<6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries/s':>11}{'ledger reads':>14}{'hit rate':>10}")
+    for label, ttl in (("off", 0), ("on", args.cache_seconds)):
+        async with LedgerClient(base_url=base_url, cache_ttl_seconds=ttl, max_connections=args.concurrency) as client:
+            queue = list(reversed(plan))
+            latencies = []
+            before = await upstream_balance_requests(base_url)
+
+            async def worker():
+                while queue:
+                    write, user = queue.pop()
+                    if write:
+                        await client.add_funds(user, 1.0, "bench")
+                        continue
+                    started = time.perf_counter()
+                    await client.get_balance(user)
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            reads = await upstream_balance_requests(base_url) - before
+            hit_rate = client.cache.stats()["hit_rate"] if client.cache else 0.0
+            print(f"   {label:<6}{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}{percentile(latencies, 99):>9.2f}"
+                  f"{len(latencies) / elapsed:>11.0f}{reads:>14}{hit_rate:>10.1%}")
+
+async def bench_batch(args, base_url: str, users):
+    batch = users[:args.batch]
+    print(f"\n🚀 Balances for {len(batch)} users (dashboard / broadcast)")
+    async with LedgerClient(base_url=base_url, cache_ttl_seconds=0) as client:
+        started = time.perf_counter()
+        for user in batch:
+            await client.get_balance(user)
+        print(f"   one at a time        {(time.perf_counter() - started) * 1000:8.1f}ms")
+    async with LedgerClient(base_url=base_url) as client:
+        for label in ("get_balances cold", "get_balances warm"):
+            started = time.perf_counter()
+            balances = await client.get_balances(batch)
+            print(f"   {label:<20} {(time.perf_counter() - started) * 1000:8.1f}ms  ({len(balances)} balances)")
+
+async def run(args):
+    base_url = start_fake_ledger(args.latency_ms)
+    users = [str(uuid.uuid4()) for _ in range(args.users)]
+    await bench_queries(args, base_url, users)
+    await bench_batch(args, base_url, users)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger client balance cache and batching benchmark")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for how often each user asks")
+    parser.add_argument("--write-share", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--cache-seconds", type=float, default=30.0)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Happy Paisa Ledger API, for tests and benchmarks
+Implements the /api/v1 wallet, balance, transactions, add-funds, deduct-funds
+and transfer endpoints with the Go service's response shapes, plus a
+configurable per-request latency standing in for the ledger's database round
+trips. GET /_stats reports how many requests arrived per endpoint. Run from
+the core-home-assistant-sdk directory:
+
+    python fake_ledger_server.py --port 18004 --latency-ms 5
+    HAPPY_PAISA_URL=http://localhost:18004 python main.py
+"""
+
+import argparse
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+def create_app(latency_ms: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake Happy Paisa Ledger")
+    wallets = {}
+    transactions = defaultdict(list)
+    stats = defaultdict(int)
+
+    def parse_user_id(value):
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            return None
+
+    def wallet_for(user_id):
+        if user_id not in wallets:
+            now = datetime.now(timezone.utc).isoformat()
+            wallets[user_id] = {
+                "id": str(uuid.uuid4()), "user_id": user_id, "balance": 0.0, "total_earned": 0.0,
+                "total_spent": 0.0, "is_active": True, "created_at": now, "updated_at": now,
+            }
+        return wallets[user_id]
+
+    def record(user_id, amount, transaction_type, description, reference_id, recipient_id=None):
+        wallet = wallet_for(user_id)
+        wallet["balance"] = round(wallet["balance"] + amount, 2)
+        if amount > 0:
+            wallet["total_earned"] = round(wallet["total_earned"] + amount, 2)
+        else:
+            wallet["total_spent"] = round(wallet["total_spent"] - amount, 2)
+        tx = {
+            "id": str(uuid.uuid4()), "wallet_id": wallet["id"], "user_id": user_id, "amount": amount,
+            "transaction_type": transaction_type, "description": description, "status": "completed",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if recipient_id:
+            tx["recipient_id"] = recipient_id
+        if reference_id:
+            tx["reference_id"] = reference_id
+        transactions[user_id].append(tx)
+        return tx
+
+    def result(success, message, balance, tx=None):
+        body = {"success": success, "message": message, "balance": balance}
+        if tx:
+            body.update(transaction_id=tx["id"], transaction=tx)
+        return JSONResponse(body, status_code=200 if success else 400)
+
+    @app.middleware("http")
+    async def count_and_delay(request: Request, call_next):
+        stats[request.url.path.split("/")[3] if request.url.path.startswith("/api/v1/") else request.url.path] += 1
+        if latency_ms and request.url.path.startswith("/api/"):
+            await asyncio.sleep(latency_ms / 1000.0)
+        return await call_next(request)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "service": "happy-paisa-ledger", "version": "fake"}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return dict(stats)
+
+    @app.get("/api/v1/balance/{user_id}")
+    async def balance(user_id: str):
+        user_id = parse_user_id(user_id)
+        if not user_id:
+            return PlainTextResponse("Invalid user ID\n", status_code=400)
+        wallet = wallet_for(user_id)
+        return {key: wallet[key] for key in ("user_id", "balance", "total_earned", "total_spent")}
+
+    @app.get("/api/v1/transactions/{user_id}")
+    async def get_transactions(user_id: str, limit: int = 50):
+        user_id = parse_user_id(user_id)
+        if not user_id:
+            return PlainTextResponse("Invalid user ID\n", status_code=400)
+        if limit <= 0 or limit > 100:
+            limit = 50
+        return list(reversed(transactions[user_id]))[:limit]
+
+    @app.post("/api/v1/wallet")
+    async def create_wallet(request: Request):
+        user_id = parse_user_id((await request.json()).get("user_id"))
+        if not user_id:
+            return PlainTextResponse("Invalid request body\n", status_code=400)
+        return wallet_for(user_id)
+
+    @app.post("/api/v1/add-funds")
+    async def add_funds(request: Request):
+        body = await request.json()
+        user_id = parse_user_id(body.get("user_id"))
+        if not user_id:
+            return PlainTextResponse("Invalid request body\n", status_code=400)
+        tx = record(user_id, body["amount"], "credit", f"Funds added: {body.get('source', '')}", body.get("reference_id"))
+        return result(True, "Funds added successfully", wallets[user_id]["balance"], tx)
+
+    @app.post("/api/v1/deduct-funds")
+    async def deduct_funds(request: Request):
+        body = await request.json()
+        user_id = parse_user_id(body.get("user_id"))
+        if not user_id:
+            return PlainTextResponse("Invalid request body\n", status_code=400)
+        if wallet_for(user_id)["balance"] < body["amount"]:
+            return result(False, "Insufficient balance", wallets[user_id]["balance"])
+        tx = record(user_id, -body["amount"], "debit", f"Funds deducted: {body.get('reason', '')}", body.get("reference_id"))
+        return result(True, "Funds deducted successfully", wallets[user_id]["balance"], tx)
+
+    @app.post("/api/v1/transfer")
+    async def transfer(request: Request):
+        body = await request.json()
+        sender, recipient = parse_user_id(body.get("from_user_id")), parse_user_id(body.get("to_user_id"))
+        if not sender or not recipient:
+            return PlainTextResponse("Invalid request body\n", status_code=400)
+        amount, description = body["amount"], body.get("description", "")
+        if wallet_for(sender)["balance"] < amount:
+            return result(False, "Insufficient balance", wallets[sender]["balance"])
+        tx = record(sender, -amount, "transfer_out", f"Transfer to user {recipient}: {description}", body.get("reference_id"), recipient)
+        record(recipient, amount, "transfer_in", f"Transfer from user {sender}: {description}", body.get("reference_id"), sender)
+        return result(True, "Transfer completed successfully", wallets[sender]["balance"], tx)
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Happy Paisa Ledger API")
+    parser.add_argument("--port", type=int, default=18004)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host="127.0.0.1", port=args.port, log_level="warning")
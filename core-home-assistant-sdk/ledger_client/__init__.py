@@ -0,0 +1,16 @@
+"""Async client for the Happy Paisa Ledger API"""
+
+from .cache import BalanceCache
+from .client import LedgerClient, LedgerError, LedgerUnavailableError
+from .models import Balance, LedgerTransaction, TransactionResult, Wallet
+
+__all__ = [
+    "Balance",
+    "BalanceCache",
+    "LedgerClient",
+    "LedgerError",
+    "LedgerTransaction",
+    "LedgerUnavailableError",
+    "TransactionResult",
+    "Wallet",
+]
@@ -0,0 +1,79 @@
+"""
+Per-user balance cache
+Entries live for ttl_seconds and are dropped as soon as this SDK writes to the
+user's wallet. Reads take a token before going to the ledger and only store
+their result if no write to that user was invalidated in the meantime, so a
+slow read that raced a transfer cannot put the pre-transfer balance back.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .models import Balance
+
+class BalanceCache:
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Balance]]" = OrderedDict()
+        # Epoch of each user's latest invalidation, bounded like the entries;
+        # reads older than anything forgotten are refused via _floor
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._epoch = 0
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_reads_dropped = 0
+
+    def token(self) -> int:
+        """Take before reading from the ledger; pass to put()"""
+        return self._epoch
+
+    def get(self, user_id: str) -> Optional[Balance]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: str, balance: Balance, token: int) -> bool:
+        if token < self._floor or self._invalidated.get(user_id, 0) > token:
+            self.stale_reads_dropped += 1
+            return False
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, balance)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, *user_ids: str):
+        self._epoch += 1
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+            self._invalidated[user_id] = self._epoch
+            self._invalidated.move_to_end(user_id)
+            self.invalidations += 1
+        while len(self._invalidated) > self.max_entries:
+            _, epoch = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, epoch)
+
+    def clear(self):
+        self.invalidate(*self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_reads_dropped": self.stale_reads_dropped,
+        }
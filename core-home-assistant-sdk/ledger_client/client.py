@@ -0,0 +1,214 @@
+"""
+Async Happy Paisa Ledger client.
+
+One pooled httpx.AsyncClient for every call the SDK makes to the ledger.
+Balance reads go through a per-user BalanceCache, and concurrent reads of the
+same user share one upstream request. The ledger has no multi-user endpoint,
+so get_balances() serves what it can from the cache and fetches the rest
+concurrently over the pooled keep-alive connections, bounded by
+LEDGER_BATCH_CONCURRENCY. add_funds, deduct_funds and transfer invalidate
+the balances they touch, whether or not the write succeeded.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from .cache import BalanceCache
+from .models import Balance, LedgerTransaction, TransactionResult, Wallet
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+HAPPY_PAISA_URL = os.getenv("HAPPY_PAISA_URL", "http://happy-paisa-ledger:8004")
+LEDGER_TIMEOUT_SECONDS = float(os.getenv("LEDGER_TIMEOUT_SECONDS", "10"))
+LEDGER_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LEDGER_CONNECT_TIMEOUT_SECONDS", "2"))
+LEDGER_MAX_CONNECTIONS = int(os.getenv("LEDGER_MAX_CONNECTIONS", "50"))
+LEDGER_BATCH_CONCURRENCY = int(os.getenv("LEDGER_BATCH_CONCURRENCY", "16"))
+LEDGER_BALANCE_CACHE_SECONDS = float(os.getenv("LEDGER_BALANCE_CACHE_SECONDS", "30"))
+LEDGER_BALANCE_CACHE_ENTRIES = int(os.getenv("LEDGER_BALANCE_CACHE_ENTRIES", "10000"))
+MAX_TRANSACTIONS_LIMIT = 100
+
+class LedgerError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+class LedgerUnavailableError(LedgerError):
+    """The ledger could not be reached or failed with a 5xx"""
+
+def normalize_user_id(user_id: str) -> str:
+    """The ledger only accepts UUIDs; reject anything else before a round trip"""
+    try:
+        return str(uuid.UUID(str(user_id)))
+    except ValueError:
+        raise LedgerError(400, f"Invalid user ID: {user_id!r}")
+
+class LedgerClient:
+    def __init__(
+        self,
+        base_url: str = HAPPY_PAISA_URL,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache_ttl_seconds: float = LEDGER_BALANCE_CACHE_SECONDS,
+        max_connections: int = LEDGER_MAX_CONNECTIONS,
+        batch_concurrency: int = LEDGER_BATCH_CONCURRENCY,
+    ):
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            timeout=httpx.Timeout(LEDGER_TIMEOUT_SECONDS, connect=LEDGER_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.cache = BalanceCache(cache_ttl_seconds, LEDGER_BALANCE_CACHE_ENTRIES) if cache_ttl_seconds > 0 else None
+        self.batch_concurrency = batch_concurrency
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+        self.shared_reads = 0
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        self.requests += 1
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise LedgerUnavailableError(503, f"Ledger unavailable: {e!r}")
+        if response.status_code >= 500:
+            raise LedgerUnavailableError(response.status_code, f"Ledger returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        if response.status_code >= 400:
+            raise LedgerError(response.status_code, response.text.strip()[:200] or f"Ledger returned {response.status_code}")
+
+    async def _fetch_balance(self, user_id: str) -> Balance:
+        token = self.cache.token() if self.cache else 0
+        response = await self._request("GET", f"/api/v1/balance/{user_id}")
+        self._raise_for_status(response)
+        balance = Balance.model_validate(response.json())
+        if self.cache:
+            self.cache.put(user_id, balance, token)
+        return balance
+
+    async def get_balance(self, user_id: str, use_cache: bool = True) -> Balance:
+        user_id = normalize_user_id(user_id)
+        if use_cache and self.cache:
+            cached = self.cache.get(user_id)
+            if cached is not None:
+                return cached
+        task = self._in_flight.get(user_id)
+        if task is not None:
+            self.shared_reads += 1
+        else:
+            task = asyncio.ensure_future(self._fetch_balance(user_id))
+            self._in_flight[user_id] = task
+            task.add_done_callback(lambda t: self._forget_read(user_id, t))
+        # Shielded so one caller's cancellation does not fail the others sharing the read
+        return await asyncio.shield(task)
+
+    def _forget_read(self, user_id: str, task: asyncio.Future):
+        if self._in_flight.get(user_id) is task:
+            del self._in_flight[user_id]
+
+    async def get_balances(self, user_ids: Iterable[str]) -> Dict[str, Balance]:
+        """Balances for many users, e.g. a dashboard or a broadcast; users that fail are left out and logged"""
+        unique = list(dict.fromkeys(user_ids))
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def fetch(user_id):
+            if self.cache:
+                cached = self.cache.get(normalize_user_id(user_id))
+                if cached is not None:
+                    return cached
+            async with semaphore:
+                return await self.get_balance(user_id, use_cache=False)
+
+        results = await asyncio.gather(*(fetch(user_id) for user_id in unique), return_exceptions=True)
+        balances = {}
+        for user_id, result in zip(unique, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Balance lookup failed for user {user_id}: {result}")
+            else:
+                balances[user_id] = result
+        return balances
+
+    async def get_transactions(self, user_id: str, limit: int = 50) -> List[LedgerTransaction]:
+        """Most recent first; the ledger returns at most 100"""
+        limit = max(1, min(limit, MAX_TRANSACTIONS_LIMIT))
+        response = await self._request("GET", f"/api/v1/transactions/{normalize_user_id(user_id)}", params={"limit": limit})
+        self._raise_for_status(response)
+        return [LedgerTransaction.model_validate(tx) for tx in response.json() or []]
+
+    async def create_wallet(self, user_id: str) -> Wallet:
+        response = await self._request("POST", "/api/v1/wallet", json={"user_id": normalize_user_id(user_id)})
+        self._raise_for_status(response)
+        return Wallet.model_validate(response.json())
+
+    async def _write(self, path: str, body: Dict, user_ids: List[str]) -> TransactionResult:
+        try:
+            response = await self._request("POST", path, json=body)
+        finally:
+            # Even a failed write may have been partly applied
+            self.invalidate(*user_ids)
+        if response.status_code == 400:
+            try:
+                # Business rejections ("Insufficient balance") come back as a result, not an error
+                return TransactionResult.model_validate(response.json())
+            except ValueError:
+                pass
+        self._raise_for_status(response)
+        return TransactionResult.model_validate(response.json())
+
+    async def add_funds(self, user_id: str, amount: float, source: str, reference_id: Optional[str] = None) -> TransactionResult:
+        user_id = normalize_user_id(user_id)
+        return await self._write(
+            "/api/v1/add-funds",
+            {"user_id": user_id, "amount": amount, "source": source, "reference_id": reference_id},
+            [user_id],
+        )
+
+    async def deduct_funds(self, user_id: str, amount: float, reason: str, reference_id: Optional[str] = None) -> TransactionResult:
+        user_id = normalize_user_id(user_id)
+        return await self._write(
+            "/api/v1/deduct-funds",
+            {"user_id": user_id, "amount": amount, "reason": reason, "reference_id": reference_id},
+            [user_id],
+        )
+
+    async def transfer(self, from_user_id: str, to_user_id: str, amount: float, description: str = "",
+                       reference_id: Optional[str] = None) -> TransactionResult:
+        from_user_id, to_user_id = normalize_user_id(from_user_id), normalize_user_id(to_user_id)
+        return await self._write(
+            "/api/v1/transfer",
+            {"from_user_id": from_user_id, "to_user_id": to_user_id, "amount": amount,
+             "description": description, "reference_id": reference_id},
+            [from_user_id, to_user_id],
+        )
+
+    def invalidate(self, *user_ids: str):
+        """Forget cached balances, e.g. after a write this client did not make"""
+        for user_id in user_ids:
+            # Later readers must not join a read that started before the write
+            self._in_flight.pop(user_id, None)
+        if self.cache:
+            self.cache.invalidate(*user_ids)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "shared_reads": self.shared_reads,
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
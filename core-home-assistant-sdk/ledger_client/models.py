@@ -0,0 +1,41 @@
+"""Response models for the Happy Paisa Ledger API (happy-paisa-ledger/app/models.go)"""
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+class Balance(BaseModel):
+    user_id: str
+    balance: float
+    total_earned: float
+    total_spent: float
+
+class Wallet(BaseModel):
+    id: str
+    user_id: str
+    balance: float
+    total_earned: float
+    total_spent: float
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class LedgerTransaction(BaseModel):
+    id: str
+    wallet_id: str
+    user_id: str
+    amount: float
+    transaction_type: str
+    description: str = ""
+    recipient_id: Optional[str] = None
+    reference_id: Optional[str] = None
+    status: str
+    created_at: datetime
+
+class TransactionResult(BaseModel):
+    success: bool
+    message: str
+    transaction_id: Optional[str] = None
+    balance: Optional[float] = None
+    transaction: Optional[LedgerTransaction] = None
@@ -1,17 +1,25 @@
 import asyncio
+import hmac
 import json
 import logging
+import os
+import re
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import httpx
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import uvicorn
 
+from ledger_client import LedgerClient, LedgerError
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared secret for /internal routes, which Kong does not expose; unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
 app = FastAPI(title="Core Home Assistant SDK", version="1.0.0")
 
 app.add_middleware(
@@ -62,12 +70,16 @@ class ServiceManager:
             return {"error": f"Service {service} returned error: {e.response.status_code}", "status": "error"}
 
 service_manager = ServiceManager()
+ledger_client = LedgerClient()
 
 class AssistantRequest(BaseModel):
     message: str
     context: Optional[Dict] = {}
     user_id: Optional[str] = None
 
+class WalletBalancesRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
 class AssistantResponse(BaseModel):
     response: str
     actions: List[Dict] = []
@@ -112,26 +124,41 @@ class ConnectionManager:
 
 connection_manager = ConnectionManager()
 
+# Turns that lean on earlier ones ("what about last month?", "why?"). Only these
+# carry history to the LLM orchestrator: a request with history bypasses its
+# semantic cache, so standalone questions are sent without it
+FOLLOW_UP = re.compile(
+    r"\b(it|its|that|this|those|these|them|they|he|she|him|her|there|then|and|also|instead|"
+    r"else|more|again|same|previous|earlier|above|what about|how about)\b",
+    re.I,
+)
+FOLLOW_UP_MAX_WORDS = 3
+
+def is_follow_up(message: str) -> bool:
+    return len(message.split()) <= FOLLOW_UP_MAX_WORDS or bool(FOLLOW_UP.search(message))
+
 class CoreAssistant:
-    def __init__(self, service_manager: ServiceManager):
+    # Turns kept per user; older turns live on in the orchestrator's rolling summary
+    max_history_messages = 50
+    
+    def __init__(self, service_manager: ServiceManager, ledger: LedgerClient):
         self.service_manager = service_manager
+        self.ledger = ledger
         self.conversation_history = {}
     
     async def process_message(self, request: AssistantRequest) -> AssistantResponse:
         """Process user message and coordinate with backend services"""
-        user_id = request.user_id or "anonymous"
         message = request.message.lower()
         
-        # Initialize conversation history for user
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
-        
-        # Add user message to history
-        self.conversation_history[user_id].append({
-            "role": "user",
-            "content": request.message,
-            "timestamp": datetime.now().isoformat()
-        })
+        # Only signed-in users get a history: anonymous callers are
+        # indistinguishable, so their turns must not reach each other's prompts
+        history = self.conversation_history.setdefault(request.user_id, []) if request.user_id else None
+        if history is not None:
+            history.append({
+                "role": "user",
+                "content": request.message,
+                "timestamp": datetime.now().isoformat()
+            })
         
         # Analyze intent using NLU service
         intent_data = await self.service_manager.call_service(
@@ -141,38 +168,54 @@ class CoreAssistant:
         
         # Process based on intent
         if "balance" in message or "wallet" in message:
-            return await self._handle_wallet_query(request, intent_data)
+            response = await self._handle_wallet_query(request, intent_data)
         elif "transfer" in message or "send money" in message:
-            return await self._handle_transfer_intent(request, intent_data)
+            response = await self._handle_transfer_intent(request, intent_data)
         elif "payment" in message or "pay" in message:
-            return await self._handle_payment_intent(request, intent_data)
+            response = await self._handle_payment_intent(request, intent_data)
         elif "card" in message or "virtual card" in message:
-            return await self._handle_card_intent(request, intent_data)
+            response = await self._handle_card_intent(request, intent_data)
         elif "help" in message or "what can you do" in message:
-            return await self._handle_help_request(request)
+            response = await self._handle_help_request(request)
         else:
-            return await self._handle_general_conversation(request, intent_data)
+            response = await self._handle_general_conversation(request, intent_data)
+        
+        # Record the reply so follow-up questions have context; the LLM
+        # orchestrator summarises whatever no longer fits its token budget
+        if history is not None:
+            history.append({
+                "role": "assistant",
+                "content": response.response,
+                "timestamp": datetime.now().isoformat()
+            })
+            del history[:-self.max_history_messages]
+        return response
     
     async def _handle_wallet_query(self, request: AssistantRequest, intent_data: Dict) -> AssistantResponse:
         """Handle wallet-related queries"""
-        wallet_data = await self.service_manager.call_service(
-            "happy_paisa", "/v1/happy-paisa/wallet/balance", "GET"
-        )
+        if not request.user_id:
+            return AssistantResponse(
+                response="Please sign in so I can look up your wallet.",
+                emotion="helpful",
+                confidence=0.9
+            )
         
-        if wallet_data.get("status") == "error":
+        try:
+            wallet = await self.ledger.get_balance(request.user_id)
+        except LedgerError as e:
+            logger.error(f"Balance lookup failed for user {request.user_id}: {e}")
             return AssistantResponse(
                 response="I'm having trouble accessing your wallet right now. Please try again in a moment.",
                 emotion="concerned",
                 confidence=0.8
             )
         
-        balance = wallet_data.get("balance", 0)
         return AssistantResponse(
-            response=f"Your current wallet balance is {balance} Happy Coins. Would you like to perform any transactions?",
+            response=f"Your current wallet balance is {wallet.balance:.2f} Happy Coins. Would you like to perform any transactions?",
             emotion="happy",
             confidence=0.9,
             actions=[
-                {"type": "show_wallet", "data": wallet_data}
+                {"type": "show_wallet", "data": wallet.model_dump()}
             ]
         )
     
@@ -222,14 +265,16 @@ class CoreAssistant:
     
     async def _handle_general_conversation(self, request: AssistantRequest, intent_data: Dict) -> AssistantResponse:
         """Handle general conversation using LLM service"""
-        llm_response = await self.service_manager.call_service(
-            "llm", "/v1/llm/chat", "POST",
-            {
-                "message": request.message,
-                "context": request.context,
-                "system_prompt": "You are Mr. Happy, a friendly financial assistant. Keep responses helpful, concise, and focused on financial services."
-            }
-        )
+        chat = {
+            "message": request.message,
+            "context": request.context,
+            "system_prompt": "You are Mr. Happy, a friendly financial assistant. Keep responses helpful, concise, and focused on financial services.",
+        }
+        if request.user_id and is_follow_up(request.message):
+            # The current message is the last entry; send only the turns before it
+            chat["history"] = self.conversation_history.get(request.user_id, [])[:-1]
+            chat["conversation_id"] = request.user_id
+        llm_response = await self.service_manager.call_service("llm", "/v1/llm/chat", "POST", chat)
         
         if llm_response.get("status") == "error":
             return AssistantResponse(
@@ -244,7 +289,7 @@ class CoreAssistant:
             confidence=llm_response.get("confidence", 0.7)
         )
 
-assistant = CoreAssistant(service_manager)
+assistant = CoreAssistant(service_manager, ledger_client)
 
 @app.post("/v1/assistant/chat", response_model=AssistantResponse)
 async def chat_with_assistant(request: AssistantRequest):
@@ -284,6 +329,20 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
     except WebSocketDisconnect:
         connection_manager.disconnect(websocket, user_id)
 
+def require_internal_token(token: Optional[str]):
+    if not INTERNAL_API_TOKEN or not token or not hmac.compare_digest(token, INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Internal endpoint")
+
+@app.post("/internal/assistant/wallet/balances")
+async def get_wallet_balances(request: WalletBalancesRequest, x_internal_token: Optional[str] = Header(None)):
+    """Balances for many users at once, for dashboards and broadcasts on the internal network"""
+    require_internal_token(x_internal_token)
+    balances = await ledger_client.get_balances(request.user_ids)
+    return {
+        "balances": {user_id: balance.model_dump() for user_id, balance in balances.items()},
+        "missing": [user_id for user_id in dict.fromkeys(request.user_ids) if user_id not in balances],
+    }
+
 @app.get("/v1/assistant/status")
 async def get_assistant_status():
     """Get current assistant and service status"""
@@ -297,8 +356,13 @@ async def get_assistant_status():
         except:
             status["services"][service_name] = "unreachable"
     
+    status["ledger_client"] = ledger_client.stats()
     return status
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ledger_client.close()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Test script for the SDK's Happy Paisa Ledger client
+Runs in-process against fake_ledger_server.py:
+
+    python test_ledger_client.py    (or: python -m pytest test_ledger_client.py)
+"""
+
+import asyncio
+import uuid
+
+import httpx
+
+from fake_ledger_server import create_app
+from ledger_client import BalanceCache, LedgerClient, LedgerError, LedgerUnavailableError
+from ledger_client.models import Balance
+
+def make_client(app=None, **kwargs) -> LedgerClient:
+    app = app or create_app()
+    return LedgerClient(base_url="http://ledger", transport=httpx.ASGITransport(app=app), **kwargs)
+
+async def upstream_stats(client: LedgerClient):
+    return (await client.client.get("/_stats")).json()
+
+def test_balance_is_cached_until_a_write():
+    async def scenario():
+        async with make_client() as client:
+            user = str(uuid.uuid4())
+            assert (await client.get_balance(user)).balance == 0
+            await client.get_balance(user)
+            assert (await upstream_stats(client))["balance"] == 1
+            result = await client.add_funds(user, 100.5, "test", "ref_001")
+            assert result.success and result.balance == 100.5
+            balance = await client.get_balance(user)
+            assert balance.balance == 100.5 and balance.total_earned == 100.5
+            assert (await upstream_stats(client))["balance"] == 2
+    asyncio.run(scenario())
+
+def test_transfer_invalidates_both_users():
+    async def scenario():
+        async with make_client() as client:
+            alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+            await client.add_funds(alice, 50, "test")
+            await client.get_balances([alice, bob])
+            result = await client.transfer(alice, bob, 20, "lunch")
+            assert result.success and result.transaction.transaction_type == "transfer_out"
+            balances = await client.get_balances([alice, bob])
+            assert balances[alice].balance == 30 and balances[bob].balance == 20
+            history = await client.get_transactions(alice, limit=10)
+            assert [tx.transaction_type for tx in history] == ["transfer_out", "credit"]
+            assert history[0].recipient_id == bob
+    asyncio.run(scenario())
+
+def test_insufficient_balance_is_a_result_not_an_error():
+    async def scenario():
+        async with make_client() as client:
+            user = str(uuid.uuid4())
+            result = await client.deduct_funds(user, 10, "fee")
+            assert not result.success and result.message == "Insufficient balance"
+    asyncio.run(scenario())
+
+def test_batched_balances_dedupe_and_bound_concurrency():
+    app = create_app(latency_ms=20)
+    in_flight, peak = 0, 0
+
+    @app.middleware("http")
+    async def track(request, call_next):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await call_next(request)
+        finally:
+            in_flight -= 1
+
+    async def scenario():
+        async with make_client(app, batch_concurrency=8) as client:
+            users = [str(uuid.uuid4()) for _ in range(40)]
+            balances = await client.get_balances(users + users[:10] + ["not-a-uuid"])
+            assert set(balances) == set(users)
+            assert (await upstream_stats(client))["balance"] == 40
+            assert peak <= 8
+            await client.get_balances(users)
+            assert (await upstream_stats(client))["balance"] == 40
+    asyncio.run(scenario())
+
+def test_concurrent_reads_share_one_request():
+    async def scenario():
+        async with make_client(create_app(latency_ms=20)) as client:
+            user = str(uuid.uuid4())
+            results = await asyncio.gather(*(client.get_balance(user) for _ in range(20)))
+            assert all(r.user_id == user for r in results)
+            assert (await upstream_stats(client))["balance"] == 1
+            assert client.shared_reads == 19
+    asyncio.run(scenario())
+
+def test_read_racing_a_write_is_not_cached():
+    cache = BalanceCache(ttl_seconds=60)
+    user = str(uuid.uuid4())
+    token = cache.token()
+    cache.invalidate(user)
+    assert not cache.put(user, Balance(user_id=user, balance=1, total_earned=1, total_spent=0), token)
+    assert cache.get(user) is None
+    assert cache.put(user, Balance(user_id=user, balance=2, total_earned=2, total_spent=0), cache.token())
+    assert cache.get(user).balance == 2
+
+def test_cache_can_be_disabled():
+    async def scenario():
+        async with make_client(cache_ttl_seconds=0) as client:
+            user = str(uuid.uuid4())
+            await client.get_balance(user)
+            await client.get_balance(user)
+            assert (await upstream_stats(client))["balance"] == 2
+            assert client.stats()["cache"] is None
+    asyncio.run(scenario())
+
+def test_errors():
+    async def scenario():
+        async with make_client() as client:
+            try:
+                await client.get_balance("anonymous")
+                assert False, "non-UUID user accepted"
+            except LedgerError as e:
+                assert e.status_code == 400
+        async with LedgerClient(base_url="http://127.0.0.1:9") as client:
+            try:
+                await client.get_balance(str(uuid.uuid4()))
+                assert False, "unreachable ledger did not raise"
+            except LedgerUnavailableError:
+                pass
+    asyncio.run(scenario())
+
+def test_wallet_query_uses_the_requesting_user():
+    import main
+
+    async def scenario():
+        async with make_client() as client:
+            assistant = main.CoreAssistant(main.service_manager, client)
+            user = str(uuid.uuid4())
+            await client.add_funds(user, 1250, "test")
+            response = await assistant._handle_wallet_query(main.AssistantRequest(message="my balance", user_id=user), {})
+            assert "1250.00 Happy Coins" in response.response
+            assert response.actions[0]["data"]["user_id"] == user
+            anonymous = await assistant._handle_wallet_query(main.AssistantRequest(message="my balance"), {})
+            assert "sign in" in anonymous.response
+    asyncio.run(scenario())
+
+class RecordingServices:
+    """Stands in for ServiceManager, answering every call and recording LLM chat requests"""
+
+    def __init__(self):
+        self.chats = []
+
+    async def call_service(self, service, endpoint, method="GET", data=None):
+        if endpoint == "/v1/llm/chat":
+            self.chats.append(data)
+            return {"response": f"reply {len(self.chats)}", "confidence": 0.9}
+        return {}
+
+def test_anonymous_turns_are_not_shared():
+    import main
+
+    async def scenario():
+        services = RecordingServices()
+        assistant = main.CoreAssistant(services, make_client())
+        await assistant.process_message(main.AssistantRequest(message="my name is Asha, remember it"))
+        await assistant.process_message(main.AssistantRequest(message="what is my name?"))
+        return services.chats, assistant.conversation_history
+
+    chats, history = asyncio.run(scenario())
+    assert len(chats) == 2
+    assert all("history" not in chat and "conversation_id" not in chat for chat in chats)
+    assert history == {}
+
+def test_only_follow_ups_carry_history():
+    import main
+
+    async def scenario():
+        services = RecordingServices()
+        assistant = main.CoreAssistant(services, make_client())
+        user = str(uuid.uuid4())
+        for message in ("tell me about saving for retirement", "how do I build an emergency fund?",
+                        "what about doing that monthly?", "why?"):
+            await assistant.process_message(main.AssistantRequest(message=message, user_id=user))
+        return user, services.chats
+
+    user, chats = asyncio.run(scenario())
+    # Standalone questions go without history, so the orchestrator can answer them from its semantic cache
+    assert [chat.get("history") is not None for chat in chats] == [False, False, True, True]
+    assert [turn["content"] for turn in chats[2]["history"]] == [
+        "tell me about saving for retirement", "reply 1", "how do I build an emergency fund?", "reply 2",
+    ]
+    assert chats[3]["conversation_id"] == user
+
+def test_bulk_balances_are_internal_only():
+    import main
+    from fastapi.testclient import TestClient
+
+    user = str(uuid.uuid4())
+    original = main.ledger_client, main.INTERNAL_API_TOKEN
+    main.ledger_client, main.INTERNAL_API_TOKEN = make_client(), "internal-test-token"
+    try:
+        client = TestClient(main.app)
+        body = {"user_ids": [user]}
+        # Not reachable under the /v1/assistant prefix Kong forwards
+        assert client.post("/v1/assistant/wallet/balances", json=body).status_code == 404
+        assert client.post("/internal/assistant/wallet/balances", json=body).status_code == 403
+        assert client.post("/internal/assistant/wallet/balances", json=body, headers={"X-Internal-Token": "guess"}).status_code == 403
+        response = client.post("/internal/assistant/wallet/balances", json=body, headers={"X-Internal-Token": "internal-test-token"})
+        assert response.status_code == 200 and response.json()["balances"][user]["balance"] == 0
+        # With no token configured the route stays closed
+        main.INTERNAL_API_TOKEN = ""
+        assert client.post("/internal/assistant/wallet/balances", json=body, headers={"X-Internal-Token": ""}).status_code == 403
+    finally:
+        main.ledger_client, main.INTERNAL_API_TOKEN = original
+
+if __name__ == "__main__":
+    print("🧪 Testing Ledger Client...")
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("🎉 All Ledger Client tests completed!")
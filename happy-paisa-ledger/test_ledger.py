@@ -6,10 +6,16 @@ This tests all the main wallet and transaction endpoints
 """
 
 import requests
+import asyncio
 import json
+import random
 import uuid
 import time
 
+import httpx
+
+from load_ledger import LedgerLoad, ZipfSampler, WalletRecord, build_parser, check_invariants, log_totals, parse_mix
+
 BASE_URL = "http://localhost:8004"
 
 def test_happy_paisa_ledger():
@@ -132,5 +138,103 @@ def test_happy_paisa_ledger():
     except Exception as e:
         print(f"❌ Test failed with error: {e}")
 
+class FakeLedger:
+    """In-memory ledger API; with atomic=False it reads, yields, then writes, like the Go service"""
+
+    def __init__(self, atomic=True):
+        self.atomic = atomic
+        self.wallets = {}
+        self.transactions = []
+
+    def wallet(self, user_id):
+        return self.wallets.setdefault(user_id, {"balance": 0, "total_earned": 0, "total_spent": 0})
+
+    async def update(self, user_id, delta):
+        wallet = self.wallet(user_id)
+        balance, earned, spent = wallet["balance"], wallet["total_earned"], wallet["total_spent"]
+        if not self.atomic:
+            await asyncio.sleep(0)
+        wallet.update(balance=balance + delta, total_earned=earned + max(delta, 0), total_spent=spent + max(-delta, 0))
+
+    async def handler(self, request):
+        path = request.url.path
+        if path == "/health":
+            return httpx.Response(200, json={"status": "ok"})
+        if path.startswith("/api/v1/balance/"):
+            user_id = path.rsplit("/", 1)[1]
+            wallet = self.wallet(user_id)
+            return httpx.Response(200, json={"user_id": user_id, **{k: v / 100 for k, v in wallet.items()}})
+        if path.startswith("/api/v1/transactions/"):
+            user_id = path.rsplit("/", 1)[1]
+            rows = [{"amount": a / 100} for u, a in self.transactions if u == user_id]
+            return httpx.Response(200, json=rows[-int(request.url.params["limit"]):])
+        body = json.loads(request.content)
+        if path == "/api/v1/wallet":
+            self.wallet(body["user_id"])
+            return httpx.Response(200, json={"balance": 0})
+        amount = round(body["amount"] * 100)
+        if path == "/api/v1/add-funds":
+            changes = [(body["user_id"], amount)]
+        elif path == "/api/v1/deduct-funds":
+            changes = [(body["user_id"], -amount)]
+        else:
+            changes = [(body["from_user_id"], -amount), (body["to_user_id"], amount)]
+        if self.wallet(changes[0][0])["balance"] < -min(changes[0][1], 0):
+            return httpx.Response(400, json={"success": False, "message": "Insufficient balance"})
+        for user_id, delta in changes:
+            self.transactions.append((user_id, delta))
+            await self.update(user_id, delta)
+        return httpx.Response(200, json={"success": True})
+
+async def run_fake_load(ledger, *argv):
+    args = build_parser().parse_args(["--wallets", "20", "--operations", "600", "--concurrency", "16", *argv])
+    async with httpx.AsyncClient(transport=httpx.MockTransport(ledger.handler), base_url="http://ledger") as client:
+        load = LedgerLoad(client, args)
+        await load.setup()
+        await load.run()
+        balances = await load.fetch_balances()
+        logs = await load.fetch_logs_from_api()
+    return load, check_invariants(load.records, balances, logs, load.funded + load.added, load.deducted)
+
+def test_parse_mix_normalises_weights():
+    assert parse_mix("transfer=3,credit=1") == {"transfer": 0.75, "credit": 0.25}
+    try:
+        parse_mix("refund=1")
+        assert False, "unknown operation accepted"
+    except ValueError:
+        pass
+
+def test_zipf_sampler_concentrates_on_hot_wallets():
+    uniform = ZipfSampler(100, 0, random.Random(0))
+    skewed = ZipfSampler(100, 1.2, random.Random(0))
+    assert sum(uniform.sample() == 0 for _ in range(5000)) < 150
+    assert sum(skewed.sample() == 0 for _ in range(5000)) > 1000
+    first, second = skewed.pair()
+    assert first != second
+
+def test_check_invariants_flags_a_lost_update():
+    record = WalletRecord()
+    record.earned, record.spent, record.rows = 1500, 200, 3
+    logs = {"a": log_totals([1000, 500, -200])}
+    consistent = {"a": {"balance": 1300, "total_earned": 1500, "total_spent": 200}}
+    assert check_invariants({"a": record}, consistent, logs, 1500, 200)["passed"]
+    # The 500 credit was overwritten by a concurrent write that read the old balance
+    lost = {"a": {"balance": 800, "total_earned": 1000, "total_spent": 200}}
+    result = check_invariants({"a": record}, lost, logs, 1500, 200)
+    assert not result["passed"]
+    assert {"sum_of_balances", "earned_matches_log", "balance_matches_log", "earned_matches_acknowledged"} <= set(result["violations_by_check"])
+
+def test_load_against_an_atomic_ledger_passes():
+    load, result = asyncio.run(run_fake_load(FakeLedger(atomic=True)))
+    summary = load.stats.summary()
+    assert summary["requests"] == 600
+    assert sum(op["errors"] for op in summary["operations"].values()) == 0
+    assert result["passed"], result["violations"][:3]
+
+def test_load_detects_lost_updates_under_concurrency():
+    _, result = asyncio.run(run_fake_load(FakeLedger(atomic=False), "--skew", "1.5"))
+    assert not result["passed"]
+    assert result["violations_by_check"].get("balance_matches_log", 0) > 0
+
 if __name__ == "__main__":
     test_happy_paisa_ledger()
@@ -0,0 +1,195 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index over a VectorStore.
+
+Vectors are partitioned into ``nlist`` clusters by spherical k-means; a query
+only scores the rows of the ``nprobe`` clusters whose centroids are closest.
+Upserts assign new rows to their nearest centroid and deletes are filtered
+through the store's liveness mask, so the index stays current without a
+rebuild. Centroids are retrained only when the corpus has grown well past
+the size they were trained on.
+
+Retriever never mutates an index that queries may be searching: writes are
+applied to a copy() which then replaces it.
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .vector_store import VectorStore, top_k
+
+# Configuration
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "8"))
+IVF_TRAIN_SAMPLE = int(os.getenv("RAG_IVF_TRAIN_SAMPLE", "50000"))
+IVF_RETRAIN_GROWTH = 4.0
+KMEANS_ITERATIONS = 10
+ASSIGN_BATCH = 65536
+PENDING_MERGE_THRESHOLD = 4096
+
+class IVFIndex:
+    def __init__(self, store: VectorStore, nlist: Optional[int] = None, nprobe: int = IVF_NPROBE):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.full(store.capacity, -1, dtype=np.int32)
+        self.lists: List[np.ndarray] = []
+        self.pending: List[List[int]] = []
+        self.pending_count = 0
+        self.trained_size = 0
+        self._load()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def needs_training(self) -> bool:
+        return not self.is_trained or self.store.count > self.trained_size * IVF_RETRAIN_GROWTH
+
+    def copy(self) -> "IVFIndex":
+        """Independent copy for copy-on-write updates; an index queries can see is never mutated"""
+        clone = IVFIndex.__new__(IVFIndex)
+        clone.__dict__.update(self.__dict__)
+        clone.assignments = self.assignments.copy()
+        clone.lists = list(self.lists)
+        clone.pending = [list(pending) for pending in self.pending]
+        return clone
+
+    def _paths(self) -> Tuple[str, str]:
+        return (
+            os.path.join(self.store.path, "ivf_centroids.npy"),
+            os.path.join(self.store.path, "ivf_assignments.npy"),
+        )
+
+    def _load(self):
+        centroids_path, assignments_path = self._paths()
+        if not (os.path.exists(centroids_path) and os.path.exists(assignments_path)):
+            return
+        centroids = np.load(centroids_path)
+        if centroids.shape[1] != self.store.dim:
+            return
+        self.centroids = centroids
+        assignments = np.load(assignments_path)
+        self._ensure_capacity()
+        self.assignments[:len(assignments)] = assignments[:len(self.assignments)]
+        self.trained_size = self.store.count
+        # Rows upserted after the last save have no assignment yet
+        alive = self.store.alive_rows()
+        missing = alive[self.assignments[alive] < 0]
+        if len(missing):
+            self.assignments[missing] = self._nearest(self.store.vectors[missing])
+        self._rebuild_lists()
+
+    def save(self):
+        if not self.is_trained:
+            return
+        centroids_path, assignments_path = self._paths()
+        np.save(centroids_path, self.centroids)
+        np.save(assignments_path, self.assignments[:self.store.size])
+
+    def _ensure_capacity(self):
+        if len(self.assignments) < self.store.capacity:
+            grown = np.full(self.store.capacity, -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+
+    def _nearest(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def train(self, seed: int = 0):
+        """Fit centroids on a sample of live vectors and assign every live row"""
+        rows = self.store.alive_rows()
+        if len(rows) == 0:
+            return
+        rng = np.random.default_rng(seed)
+        nlist = self.nlist or int(np.clip(4 * np.sqrt(len(rows)), 1, 65536))
+        sample_rows = np.sort(rng.choice(rows, size=min(len(rows), max(IVF_TRAIN_SAMPLE, nlist * 8)), replace=False))
+        sample = np.asarray(self.store.vectors[sample_rows])
+        nlist = min(nlist, len(sample))
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # Reseed empty clusters with random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        self._ensure_capacity()
+        self.assignments[:] = -1
+        for start in range(0, len(rows), ASSIGN_BATCH):
+            batch = rows[start:start + ASSIGN_BATCH]
+            self.assignments[batch] = self._nearest(self.store.vectors[batch])
+        self.trained_size = len(rows)
+        self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        # The store may have grown since the last resize (e.g. while training); rows past
+        # the end have no assignment yet
+        size = min(self.store.size, len(self.assignments))
+        assignments = self.assignments[:size]
+        valid = np.flatnonzero((assignments >= 0) & (self.store.alive[:size] == 1))
+        order = valid[np.argsort(assignments[valid], kind="stable")]
+        counts = np.bincount(assignments[order], minlength=len(self.centroids))
+        self.lists = np.split(order, np.cumsum(counts)[:-1])
+        self.pending = [[] for _ in range(len(self.centroids))]
+        self.pending_count = 0
+
+    def add(self, rows: np.ndarray):
+        """Assign upserted rows to their nearest cluster"""
+        if not self.is_trained or not len(rows):
+            return
+        self._ensure_capacity()
+        labels = self._nearest(self.store.vectors[rows])
+        self.assignments[rows] = labels
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self.pending[label].append(row)
+        self.pending_count += len(rows)
+        if self.pending_count > PENDING_MERGE_THRESHOLD:
+            self._merge_pending()
+
+    def remove(self, rows: np.ndarray):
+        """Detach deleted rows; stale list entries are skipped at query time"""
+        if self.is_trained and len(rows):
+            self.assignments[rows] = -1
+
+    def _merge_pending(self):
+        for label, pending in enumerate(self.pending):
+            if pending:
+                self.lists[label] = np.unique(np.concatenate([self.lists[label], np.array(pending, dtype=np.int64)]))
+                self.pending[label] = []
+        self.pending_count = 0
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k by inner product over the closest clusters"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        query = np.asarray(query, dtype=np.float32)
+        probes = top_k(self.centroids @ query, nprobe)
+
+        parts, labels = [], []
+        for label in probes.tolist():
+            members = self.lists[label]
+            if self.pending[label]:
+                members = np.concatenate([members, np.array(self.pending[label], dtype=np.int64)])
+            parts.append(members)
+            labels.append(np.full(len(members), label, dtype=np.int32))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = np.concatenate(parts)
+        # Drop deleted rows and rows that were re-upserted into another cluster
+        valid = (self.assignments[candidates] == np.concatenate(labels)) & (self.store.alive[candidates] == 1)
+        candidates = np.unique(candidates[valid])
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = self.store.vectors[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
@@ -0,0 +1,217 @@
+"""
+Token-budgeted prompt assembly.
+
+The prompt is filled in priority order: system prompt and the current message,
+then retrieved documents (best first, up to a share of the budget), then as
+many recent turns as fit. Turns that no longer fit are folded into a rolling
+summary that is cached per conversation and extended incrementally: each
+request only summarises the turns that have aged out since the previous one.
+Token counts come from the local approximate tokenizer in ``tokens.py``.
+"""
+
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from .metrics import SAMPLE_WINDOW, _percentile
+from .tokens import count_tokens
+
+# Configuration
+CONTEXT_BUDGET_TOKENS = int(os.getenv("LLM_CONTEXT_BUDGET_TOKENS", "3000"))
+DOCUMENT_SHARE = float(os.getenv("LLM_CONTEXT_DOCUMENT_SHARE", "0.5"))
+SUMMARY_SHARE = float(os.getenv("LLM_CONTEXT_SUMMARY_SHARE", "0.2"))
+SUMMARY_CACHE_SIZE = int(os.getenv("LLM_SUMMARY_CACHE_SIZE", "10000"))
+SUMMARY_LINE_TOKENS = 40
+MAX_SUMMARY_LINES = 200
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+def message_tokens(content: str) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+def turn_fingerprint(turn) -> str:
+    key = f"{turn.role}\0{turn.timestamp or ''}\0{turn.content}"
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+def summarize_turn(turn) -> str:
+    """One line per turn: its first sentence, cut to SUMMARY_LINE_TOKENS"""
+    text = " ".join(turn.content.split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    words = first.split(" ")
+    while len(words) > 1 and count_tokens(" ".join(words)) > SUMMARY_LINE_TOKENS:
+        words = words[: max(1, len(words) * 3 // 4)]
+    line = " ".join(words)
+    if line != text:
+        line += " …"
+    speaker = "User" if turn.role == "user" else "Assistant"
+    return f"{speaker}: {line}"
+
+class RollingSummary:
+    def __init__(self):
+        self.lines: Deque[Tuple[str, str]] = deque(maxlen=MAX_SUMMARY_LINES)
+        self.turns = 0
+
+    @property
+    def last_fingerprint(self) -> Optional[str]:
+        return self.lines[-1][0] if self.lines else None
+
+    def render(self, budget: int) -> Tuple[str, int]:
+        """Newest summary lines that fit in budget, oldest first"""
+        header = "Summary of the earlier conversation:"
+        used = message_tokens(header)
+        kept = []
+        for _, line in reversed(self.lines):
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        if not kept:
+            return "", 0
+        omitted = self.turns - len(kept)
+        if omitted:
+            kept.append(f"({omitted} earlier turns omitted)")
+        return header + "\n" + "\n".join(f"- {line}" for line in reversed(kept)), used
+
+class BuiltContext:
+    def __init__(self, messages: List[Dict[str, str]], prompt_tokens: int, documents: List[Dict], recent_turns: int, summarized_turns: int):
+        self.messages = messages
+        self.prompt_tokens = prompt_tokens
+        self.documents = documents
+        self.recent_turns = recent_turns
+        self.summarized_turns = summarized_turns
+
+    @property
+    def usage(self) -> Dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "history_turns": self.recent_turns,
+            "summarized_turns": self.summarized_turns,
+        }
+
+class ContextBuilder:
+    def __init__(self, budget_tokens: int = CONTEXT_BUDGET_TOKENS, cache_size: int = SUMMARY_CACHE_SIZE):
+        self.budget_tokens = budget_tokens
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[str, RollingSummary]" = OrderedDict()
+        self.requests = 0
+        self.documents_dropped = 0
+        self.turns_summarized = 0
+        self.summary_updates = {"incremental": 0, "unchanged": 0, "rebuilt": 0}
+        self.prompt_tokens: Deque[int] = deque(maxlen=SAMPLE_WINDOW)
+        self.assembly_ms: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def _cached_summary(self, conversation_id: Optional[str], history: Sequence) -> Tuple[RollingSummary, int]:
+        """The conversation's cached summary and how many leading turns of history it covers"""
+        summary = self._summaries.get(conversation_id) if conversation_id else None
+        if summary is not None and summary.last_fingerprint is not None:
+            # Search back from the newest turn; the covered turn is usually just before the recent window
+            for index in range(len(history) - 1, -1, -1):
+                if turn_fingerprint(history[index]) == summary.last_fingerprint:
+                    return summary, index + 1
+            # History was edited or trimmed past the summary: start over
+            self.summary_updates["rebuilt"] += 1
+        return RollingSummary(), 0
+
+    def _extend_summary(self, conversation_id: Optional[str], summary: RollingSummary, turns: Sequence):
+        if turns:
+            self.summary_updates["incremental"] += 1
+        elif summary.turns:
+            self.summary_updates["unchanged"] += 1
+        for turn in turns:
+            summary.lines.append((turn_fingerprint(turn), summarize_turn(turn)))
+            summary.turns += 1
+            self.turns_summarized += 1
+        if conversation_id and summary.turns:
+            self._summaries[conversation_id] = summary
+            self._summaries.move_to_end(conversation_id)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def build(
+        self,
+        system_prompt: str,
+        message: str,
+        history: Sequence = (),
+        conversation_id: Optional[str] = None,
+        documents: Optional[List[Dict]] = None,
+        budget_tokens: Optional[int] = None,
+    ) -> BuiltContext:
+        """Assemble an OpenAI-style message list that fits the token budget"""
+        started = time.perf_counter()
+        budget = budget_tokens or self.budget_tokens
+        used = message_tokens(system_prompt) + message_tokens(message)
+
+        kept_documents = []
+        if documents is not None:
+            document_budget = max(0, int(budget * DOCUMENT_SHARE) - used)
+            document_used = 0
+            for document in documents:
+                cost = count_tokens(document["text"]) + MESSAGE_OVERHEAD_TOKENS
+                if document_used + cost > document_budget:
+                    self.documents_dropped += 1
+                    continue
+                kept_documents.append(document)
+                document_used += cost
+            documents_block = "\n\n".join(f"[{i}] {d['text']}" for i, d in enumerate(kept_documents, 1))
+            user_content = f"Documents:\n{documents_block or '(none found)'}\n\nQuestion: {message}"
+            used += message_tokens(user_content) - message_tokens(message)
+        else:
+            user_content = message
+
+        # Turns already folded into the summary stay there, which keeps the
+        # prompt prefix stable and the summary update incremental
+        summary, covered = self._cached_summary(conversation_id, history)
+
+        # Newest turns first; if not everything fits, leave room for a summary
+        remaining = budget - used
+        costs = []
+        history_used = 0
+        split = len(history)
+        while split > covered:
+            cost = message_tokens(history[split - 1].content)
+            if history_used + cost > remaining:
+                break
+            costs.append(cost)
+            history_used += cost
+            split -= 1
+        if split:
+            summary_reserve = int(budget * SUMMARY_SHARE)
+            while costs and history_used > remaining - summary_reserve:
+                history_used -= costs.pop()
+                split += 1
+        recent = history[split:]
+
+        messages = [{"role": "system", "content": system_prompt}]
+        self._extend_summary(conversation_id, summary, history[covered:split])
+        if split:
+            text, summary_used = summary.render(remaining - history_used)
+            if text:
+                messages.append({"role": "system", "content": text})
+                used += summary_used
+        messages.extend({"role": turn.role, "content": turn.content} for turn in recent)
+        messages.append({"role": "user", "content": user_content})
+        used += history_used
+
+        self.requests += 1
+        self.prompt_tokens.append(used)
+        self.assembly_ms.append((time.perf_counter() - started) * 1000)
+        return BuiltContext(messages, used, kept_documents, len(recent), split)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "budget_tokens": self.budget_tokens,
+            "prompt_tokens_p50": _percentile(self.prompt_tokens, 50),
+            "prompt_tokens_p95": _percentile(self.prompt_tokens, 95),
+            "assembly_ms_p50": _percentile(self.assembly_ms, 50),
+            "assembly_ms_p95": _percentile(self.assembly_ms, 95),
+            "cached_summaries": len(self._summaries),
+            "summary_updates": dict(self.summary_updates),
+            "turns_summarized": self.turns_summarized,
+            "documents_dropped": self.documents_dropped,
+        }
@@ -0,0 +1,58 @@
+"""
+CPU text embeddings.
+
+``HashingEmbedder`` maps word unigrams and bigrams into a fixed number of
+buckets with a signed hash (the "hashing trick"), applies sublinear term
+frequency and L2-normalises the result. It needs no model download, is
+deterministic across processes and embeds thousands of chunks per second.
+"""
+
+import hashlib
+import math
+import os
+import re
+from typing import List
+
+import numpy as np
+
+# Configuration
+EMBEDDING_DIM = int(os.getenv("RAG_EMBEDDING_DIM", "384"))
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+class Embedder:
+    dim = 0
+    version = "base"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return a float32 array of shape (len(texts), dim) with unit-length rows"""
+        raise NotImplementedError
+
+class HashingEmbedder(Embedder):
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.version = f"hashing-v1-{dim}"
+        self._feature_cache = {}
+
+    def _feature(self, token: str):
+        cached = self._feature_cache.get(token)
+        if cached is None:
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            cached = (digest % self.dim, 1.0 if (digest >> 63) & 1 else -1.0)
+            if len(self._feature_cache) < 200000:
+                self._feature_cache[token] = cached
+        return cached
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = _WORD_PATTERN.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            counts = {}
+            for feature in features:
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                index, sign = self._feature(feature)
+                vectors[i, index] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,68 @@
+"""
+Provider-agnostic streaming generation with cancellation and metrics.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from .metrics import GenerationMetrics
+from .providers import Provider, RateLimitError
+from .scheduler import Lease
+from .tokens import count_tokens
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are Mr. Happy, a friendly financial assistant. "
+    "Keep responses helpful, concise, and focused on financial services."
+)
+
+RAG_SYSTEM_PROMPT = (
+    "You are Mr. Happy, a friendly financial assistant. Answer using only the "
+    "numbered documents provided. If they do not cover the question, say so."
+)
+
+async def stream_generation(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    metrics: GenerationMetrics,
+    model: str = None,
+    max_tokens: int = 512,
+    temperature: float = 0.7,
+    lease: Optional[Lease] = None,
+) -> AsyncIterator[str]:
+    """Stream deltas from a provider, recording TTFT and tokens/sec.
+
+    Closing this generator (or cancelling the task consuming it) closes the
+    provider stream, which aborts the upstream request. A scheduler lease is
+    released when the stream ends, refunding the unused part of max_tokens.
+    """
+    started = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    outcome = "error"
+    upstream = provider.stream(messages, model=model, max_tokens=max_tokens, temperature=temperature)
+    try:
+        async for delta in upstream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += count_tokens(delta)
+            yield delta
+        outcome = "completed"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    except RateLimitError as e:
+        if lease is not None:
+            lease.rate_limited(e.retry_after)
+        raise
+    finally:
+        await upstream.aclose()
+        if lease is not None:
+            lease.release(unused_tokens=max(0, max_tokens - tokens))
+        metrics.record(
+            provider.name,
+            outcome,
+            ttft_ms=(first_token_at - started) * 1000 if first_token_at else None,
+            tokens=tokens,
+            stream_seconds=time.perf_counter() - first_token_at if first_token_at else 0.0,
+        )
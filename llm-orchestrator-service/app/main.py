@@ -1,7 +1,23 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
+import hmac
+import json
+import logging
 import os
+from typing import Optional
+
+from . import models
+from .context_builder import ContextBuilder
+from .generation import DEFAULT_SYSTEM_PROMPT, RAG_SYSTEM_PROMPT, stream_generation
+from .metrics import GenerationMetrics
+from .providers import LLM_PROVIDER, ProviderError, RateLimitError, build_providers
+from .retrieval import Retriever
+from .scheduler import FAILOVER_ORDER, DeadlineExceeded, ProviderLimits, Scheduler, SchedulerOverloaded
+from .semantic_cache import CacheLookup, SemanticCache, scope_key
+from .tokens import count_tokens
 
 app = FastAPI(title="Axzora LLM Orchestrator", version="1.0.0")
 
@@ -14,6 +30,237 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+logger = logging.getLogger(__name__)
+
+providers = build_providers()
+default_provider = LLM_PROVIDER if LLM_PROVIDER in providers else "fake"
+if default_provider != LLM_PROVIDER:
+    logger.warning(f"LLM provider {LLM_PROVIDER!r} is not configured, falling back to the fake provider")
+metrics = GenerationMetrics()
+scheduler = Scheduler(
+    {name: ProviderLimits.from_env(name) for name in providers},
+    failover_order=FAILOVER_ORDER,
+)
+retriever = Retriever()
+semantic_cache = SemanticCache()
+context_builder = ContextBuilder()
+RAG_SEED_DIR = os.getenv("RAG_SEED_DIR")
+# Shared secret for /internal routes, which Kong does not expose; unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+def seed_documents(directory: str) -> int:
+    """Index every .md/.txt file in a directory, using the file name as doc_id"""
+    indexed = 0
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".md", ".txt")):
+            with open(os.path.join(directory, name)) as f:
+                retriever.upsert_document(name, f.read(), {"source": name})
+            indexed += 1
+    retriever.flush()
+    return indexed
+
+@app.on_event("startup")
+async def startup_event():
+    if RAG_SEED_DIR:
+        indexed = await run_blocking(seed_documents, RAG_SEED_DIR)
+        logger.info(f"Indexed {indexed} documents from {RAG_SEED_DIR}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await run_blocking(retriever.flush)
+
+def get_provider(name: str = None):
+    name = name or default_provider
+    if name not in providers:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Provider {name} is not configured"
+        )
+    return providers[name]
+
+def sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def cached_reply(chat, text: str, provider: str, model: str, response_model):
+    """Serve a semantic cache hit in the same shape as a fresh generation"""
+    if chat.stream:
+        async def event_stream():
+            yield sse_event({"token": text})
+            yield sse_event({"provider": provider, "model": model, "cached": True}, event="done")
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return response_model(response=text, provider=provider, model=model, cached=True)
+
+async def wait_for_disconnect(request: Request):
+    """Return once the HTTP client has gone away"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+class LeasedStreamingResponse(StreamingResponse):
+    """Streaming response that releases its scheduler lease however the response ends"""
+
+    def __init__(self, *args, lease, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lease = lease
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Normally already released by stream_generation; this covers a
+            # client that disconnects before the body iterator ever starts
+            self.lease.release()
+
+def chat_context(chat: models.ChatRequest):
+    return context_builder.build(
+        chat.system_prompt or DEFAULT_SYSTEM_PROMPT,
+        chat.message,
+        chat.history,
+        conversation_id=chat.conversation_id,
+        budget_tokens=chat.context_budget_tokens,
+    )
+
+async def acquire_lease(chat, provider, messages):
+    """Wait for the scheduler to admit this generation, possibly on a failover provider"""
+    estimated = sum(count_tokens(m["content"]) for m in messages) + chat.max_tokens
+    try:
+        return await scheduler.acquire(
+            provider.name,
+            estimated,
+            priority=chat.priority,
+            deadline_ms=chat.deadline_ms,
+            allow_failover=chat.provider is None,
+        )
+    except SchedulerOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
+
+async def run_chat(request: Request, chat, context, cacheable=False, response_model=models.ChatResponse, extra=None):
+    """Generate for a chat-like request, as SSE or a collected JSON response"""
+    provider = get_provider(chat.provider)
+    model = chat.model or provider.default_model
+    extra = extra or {}
+
+    system_prompt = chat.system_prompt or DEFAULT_SYSTEM_PROMPT
+    lookup = None
+    if cacheable and not semantic_cache.bypass(chat):
+        lookup = semantic_cache.lookup(scope_key(provider.name, model, system_prompt, chat.max_tokens), chat.message)
+        if lookup.entry is not None:
+            return cached_reply(chat, lookup.entry.response, provider.name, model, response_model)
+
+    messages = context.messages
+    lease = await acquire_lease(chat, provider, messages)
+    if lease.provider != provider.name:
+        # Failed over: the requested model belongs to the saturated provider
+        provider = providers[lease.provider]
+        model = provider.default_model
+        if lookup is not None:
+            # Store the reply under the provider and model that actually wrote it
+            lookup = CacheLookup(scope_key(provider.name, model, system_prompt, chat.max_tokens), lookup.vector)
+    queue_wait_ms = round(lease.queue_wait_ms, 2)
+
+    stream = stream_generation(
+        provider,
+        messages,
+        metrics,
+        model=model,
+        max_tokens=chat.max_tokens,
+        temperature=chat.temperature,
+        lease=lease,
+    )
+    if lookup is not None:
+        stream = semantic_cache.record(stream, lookup, chat.message)
+
+    if chat.stream:
+        async def event_stream():
+            # Starlette cancels this generator when the client disconnects;
+            # closing `stream` then aborts the upstream provider request
+            try:
+                if extra:
+                    yield sse_event(extra, event="context")
+                async for delta in stream:
+                    yield sse_event({"token": delta})
+                yield sse_event(
+                    {
+                        "provider": provider.name,
+                        "model": model,
+                        "cached": False,
+                        "queue_wait_ms": queue_wait_ms,
+                        "usage": context.usage,
+                    },
+                    event="done",
+                )
+            except ProviderError as e:
+                logger.error(f"Streaming generation failed: {e}")
+                yield sse_event({"error": str(e)}, event="error")
+            finally:
+                await stream.aclose()
+
+        return LeasedStreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            lease=lease,
+        )
+
+    async def collect():
+        return "".join([delta async for delta in stream])
+
+    generation = asyncio.create_task(collect())
+    disconnect = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({generation, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not generation.done():
+            # Client went away: cancelling the task closes the upstream stream
+            generation.cancel()
+    try:
+        text = await generation
+    except asyncio.CancelledError:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except RateLimitError as e:
+        logger.warning(f"Provider {provider.name} rate limited: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after or 1))},
+        )
+    except ProviderError as e:
+        logger.error(f"Generation failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=str(e)
+        )
+    finally:
+        lease.release()
+    return response_model(
+        response=text,
+        provider=provider.name,
+        model=model,
+        usage=context.usage,
+        queue_wait_ms=queue_wait_ms,
+        **extra,
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Hello from Axzora LLM Orchestrator!", "service": "llm-orchestrator"}
@@ -22,12 +269,80 @@ async def root():
 async def health_check():
     return {"status": "ok", "service": "llm-orchestrator"}
 
+@app.post("/v1/llm/chat")
+async def chat(request: Request, chat_request: models.ChatRequest):
+    """Generate a reply; set stream=true for server-sent events"""
+    return await run_chat(request, chat_request, chat_context(chat_request), cacheable=True)
+
 @app.post("/generate")
-async def generate_response():
-    # TODO: Implement LLM response generation
-    return {"message": "LLM generation endpoint - implementation needed"}
+@app.post("/v1/llm/generate")
+async def generate_response(request: Request, chat_request: models.ChatRequest):
+    """Alias of /v1/llm/chat kept for existing gateway routes"""
+    return await run_chat(request, chat_request, chat_context(chat_request), cacheable=True)
 
 @app.post("/rag_query")
-async def rag_query():
-    # TODO: Implement RAG-based queries
-    return {"message": "RAG query endpoint - implementation needed"}
+@app.post("/v1/llm/rag_query")
+async def rag_query(request: Request, rag_request: models.RagQueryRequest):
+    """Answer a question from indexed documents; generate=false returns only the sources"""
+    sources = await run_blocking(retriever.query, rag_request.query, rag_request.top_k)
+    if not rag_request.generate:
+        return {"query": rag_request.query, "sources": sources}
+    context = context_builder.build(
+        rag_request.system_prompt or RAG_SYSTEM_PROMPT,
+        rag_request.query,
+        rag_request.history,
+        conversation_id=rag_request.conversation_id,
+        documents=sources,
+        budget_tokens=rag_request.context_budget_tokens,
+    )
+    return await run_chat(
+        request,
+        rag_request,
+        context,
+        response_model=models.RagQueryResponse,
+        extra={"sources": context.documents},
+    )
+
+def require_internal_token(token: Optional[str]):
+    if not INTERNAL_API_TOKEN or not token or not hmac.compare_digest(token, INTERNAL_API_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Internal endpoint"
+        )
+
+@app.post("/internal/llm/documents")
+async def upsert_document(document: models.DocumentUpsert, x_internal_token: Optional[str] = Header(None)):
+    """Index or replace a document for retrieval"""
+    require_internal_token(x_internal_token)
+    def upsert():
+        chunks = retriever.upsert_document(document.doc_id, document.text, document.metadata)
+        retriever.flush()
+        return chunks
+
+    chunks = await run_blocking(upsert)
+    return {"doc_id": document.doc_id, "chunks": chunks}
+
+@app.delete("/internal/llm/documents/{doc_id}")
+async def delete_document(doc_id: str, x_internal_token: Optional[str] = Header(None)):
+    """Remove a document from the retrieval index"""
+    require_internal_token(x_internal_token)
+    chunks = await run_blocking(retriever.delete_document, doc_id)
+    if not chunks:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    return {"doc_id": doc_id, "chunks_removed": chunks}
+
+@app.get("/v1/llm/metrics")
+async def get_metrics():
+    """Report generation, scheduling, cache, context and retrieval metrics"""
+    return {
+        "service": "llm-orchestrator",
+        "default_provider": default_provider,
+        "providers": metrics.summary(),
+        "scheduler": scheduler.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "context": context_builder.stats(),
+        "retrieval": retriever.stats(),
+    }
@@ -0,0 +1,61 @@
+"""
+Per-provider generation metrics: time-to-first-token and tokens/sec.
+"""
+
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+# Number of recent samples kept per provider for percentile reporting
+SAMPLE_WINDOW = 1000
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return round(ordered[index], 2)
+
+class ProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.tokens = 0
+        self.ttft_ms: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+        self.tokens_per_second: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "tokens": self.tokens,
+            "ttft_ms_p50": _percentile(self.ttft_ms, 50),
+            "ttft_ms_p95": _percentile(self.ttft_ms, 95),
+            "tokens_per_second_p50": _percentile(self.tokens_per_second, 50),
+        }
+
+class GenerationMetrics:
+    def __init__(self):
+        self.providers: Dict[str, ProviderStats] = defaultdict(ProviderStats)
+
+    def record(self, provider: str, outcome: str, ttft_ms=None, tokens=0, stream_seconds=0.0):
+        """Record one finished generation; outcome is completed, cancelled or error"""
+        stats = self.providers[provider]
+        stats.requests += 1
+        stats.tokens += tokens
+        if outcome == "completed":
+            stats.completed += 1
+        elif outcome == "cancelled":
+            stats.cancelled += 1
+        else:
+            stats.errors += 1
+        if ttft_ms is not None:
+            stats.ttft_ms.append(ttft_ms)
+        if tokens > 1 and stream_seconds > 0:
+            stats.tokens_per_second.append(tokens / stream_seconds)
+
+    def summary(self) -> Dict:
+        return {name: stats.summary() for name, stats in self.providers.items()}
@@ -0,0 +1,56 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional, Any
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+    timestamp: Optional[str] = None
+
+class ChatRequest(BaseModel):
+    message: str
+    context: Optional[Dict[str, Any]] = {}
+    system_prompt: Optional[str] = None
+    history: List[ChatMessage] = []
+    conversation_id: Optional[str] = None
+    context_budget_tokens: Optional[int] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    stream: bool = False
+    max_tokens: int = 512
+    temperature: float = 0.7
+    priority: Literal["interactive", "batch"] = "interactive"
+    deadline_ms: Optional[int] = None
+
+class ChatResponse(BaseModel):
+    response: str
+    provider: str
+    model: str
+    confidence: float = 0.7
+    usage: Dict[str, Any] = {}
+    cached: bool = False
+    queue_wait_ms: Optional[float] = None
+    status: str = "ok"
+
+class RagQueryRequest(BaseModel):
+    query: str
+    top_k: int = Field(4, ge=1, le=20)
+    system_prompt: Optional[str] = None
+    history: List[ChatMessage] = []
+    conversation_id: Optional[str] = None
+    context_budget_tokens: Optional[int] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    stream: bool = False
+    generate: bool = True
+    max_tokens: int = 512
+    temperature: float = 0.3
+    priority: Literal["interactive", "batch"] = "interactive"
+    deadline_ms: Optional[int] = None
+
+class RagQueryResponse(ChatResponse):
+    sources: List[Dict[str, Any]] = []
+
+class DocumentUpsert(BaseModel):
+    doc_id: str
+    text: str
+    metadata: Dict[str, Any] = {}
@@ -0,0 +1,219 @@
+"""
+Streaming LLM providers.
+
+Every provider exposes ``stream()``, an async generator of text deltas. When
+the consumer stops iterating (client disconnect, cancellation), the
+generator's ``finally`` block closes the upstream request so the provider
+stops producing tokens nobody will read.
+"""
+
+import asyncio
+import math
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+# Configuration
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+PROVIDER_TIMEOUT_SECONDS = float(os.getenv("LLM_PROVIDER_TIMEOUT_SECONDS", "60"))
+FAKE_FIRST_TOKEN_DELAY_MS = float(os.getenv("LLM_FAKE_FIRST_TOKEN_DELAY_MS", "0"))
+FAKE_TOKEN_DELAY_MS = float(os.getenv("LLM_FAKE_TOKEN_DELAY_MS", "0"))
+
+class ProviderError(Exception):
+    """Raised when an upstream provider fails"""
+
+class RateLimitError(ProviderError):
+    """Raised when an upstream provider rejects a request with 429 / quota exhausted"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay seconds or an HTTP date); None if absent or unreadable"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return max(0.0, seconds) if math.isfinite(seconds) else None
+
+class Provider:
+    name = "base"
+    default_model = ""
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+    ) -> AsyncIterator[str]:
+        """Yield response text deltas for an OpenAI-style message list"""
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(self, api_key: str = OPENAI_API_KEY, default_model: str = OPENAI_MODEL):
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=api_key, timeout=PROVIDER_TIMEOUT_SECONDS, max_retries=0)
+        self.default_model = default_model
+
+    async def stream(self, messages, model=None, max_tokens=512, temperature=0.7):
+        import openai
+
+        try:
+            response = await self.client.chat.completions.create(
+                model=model or self.default_model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+            )
+        except openai.RateLimitError as e:
+            raise RateLimitError(
+                f"OpenAI rate limit: {e}", retry_after=parse_retry_after(e.response.headers.get("retry-after"))
+            ) from e
+        except openai.APIError as e:
+            raise ProviderError(f"OpenAI request failed: {e}") from e
+
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.APIError as e:
+            raise ProviderError(f"OpenAI stream failed: {e}") from e
+        finally:
+            # Closing the HTTP response aborts generation upstream
+            await response.response.aclose()
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def __init__(self, api_key: str = GOOGLE_API_KEY, default_model: str = GEMINI_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.default_model = default_model
+
+    @staticmethod
+    def _to_contents(messages: List[Dict[str, str]]) -> List[Dict]:
+        # google-generativeai 0.3 has no system_instruction: send system prompts as an opening
+        # user turn, which also holds when the history starts with an assistant reply
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        contents = [{"role": "user", "parts": [system]}] if system else []
+        for message in messages:
+            if message["role"] == "system":
+                continue
+            role = "model" if message["role"] == "assistant" else "user"
+            text = message["content"]
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append(text)
+            else:
+                contents.append({"role": role, "parts": [text]})
+        return contents
+
+    async def stream(self, messages, model=None, max_tokens=512, temperature=0.7):
+        from google.api_core.exceptions import ResourceExhausted
+
+        gemini = self.genai.GenerativeModel(model or self.default_model)
+        try:
+            response = await gemini.generate_content_async(
+                self._to_contents(messages),
+                generation_config={"max_output_tokens": max_tokens, "temperature": temperature},
+                stream=True,
+            )
+            # Cancelling the consuming task cancels the underlying gRPC call
+            async for chunk in response:
+                if chunk.parts:
+                    yield chunk.text
+        except asyncio.CancelledError:
+            raise
+        except ResourceExhausted as e:
+            raise RateLimitError(f"Gemini quota exhausted: {e}") from e
+        except Exception as e:
+            raise ProviderError(f"Gemini request failed: {e}") from e
+
+class FakeProvider(Provider):
+    """Deterministic local provider for tests, benchmarks and offline development"""
+
+    name = "fake"
+    default_model = "fake-echo"
+
+    def __init__(
+        self,
+        first_token_delay_ms: float = FAKE_FIRST_TOKEN_DELAY_MS,
+        token_delay_ms: float = FAKE_TOKEN_DELAY_MS,
+        name: str = "fake",
+        requests_per_second: float = 0,
+    ):
+        self.name = name
+        self.first_token_delay = first_token_delay_ms / 1000.0
+        self.token_delay = token_delay_ms / 1000.0
+        # Simulated upstream rate limit, a token bucket refilled continuously; 0 disables it
+        self.requests_per_second = requests_per_second
+        self._allowance = requests_per_second
+        self._allowance_at = time.monotonic()
+        self.rate_limited = 0
+        self.started = 0
+        self.completed = 0
+        self.closed_early = 0
+
+    @staticmethod
+    def reply_for(messages: List[Dict[str, str]]) -> str:
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return f"Mr. Happy here! You said: {last_user.strip()}. How else can I help with your finances?"
+
+    def _check_rate_limit(self):
+        now = time.monotonic()
+        self._allowance = min(
+            self.requests_per_second, self._allowance + (now - self._allowance_at) * self.requests_per_second
+        )
+        self._allowance_at = now
+        if self._allowance < 1:
+            self.rate_limited += 1
+            raise RateLimitError(
+                f"{self.name} rate limit exceeded", retry_after=(1 - self._allowance) / self.requests_per_second
+            )
+        self._allowance -= 1
+
+    async def stream(self, messages, model=None, max_tokens=512, temperature=0.7):
+        if self.requests_per_second:
+            self._check_rate_limit()
+        self.started += 1
+        tokens = self.reply_for(messages).split(" ")[:max_tokens]
+        finished = False
+        try:
+            if self.first_token_delay:
+                await asyncio.sleep(self.first_token_delay)
+            for index, token in enumerate(tokens):
+                if index and self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                yield token if index == 0 else " " + token
+            finished = True
+            self.completed += 1
+        finally:
+            if not finished:
+                self.closed_early += 1
+
+def build_providers() -> Dict[str, Provider]:
+    """Instantiate every provider that is configured in the environment"""
+    providers: Dict[str, Provider] = {"fake": FakeProvider()}
+    if OPENAI_API_KEY:
+        providers["openai"] = OpenAIProvider()
+    if GOOGLE_API_KEY:
+        providers["gemini"] = GeminiProvider()
+    return providers
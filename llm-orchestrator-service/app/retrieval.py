@@ -0,0 +1,154 @@
+"""
+Document retrieval for RAG queries.
+
+Documents are split into overlapping chunks of roughly ``RAG_CHUNK_TOKENS``
+tokens, embedded on CPU and stored in a memory-mapped VectorStore. Small
+corpora are searched exactly; once the corpus passes ``RAG_ANN_MIN_SIZE``
+chunks an IVF index is trained and used for queries.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .ann_index import IVFIndex
+from .embeddings import Embedder, HashingEmbedder
+from .tokens import count_tokens
+from .vector_store import VectorStore
+
+# Configuration
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "/tmp/rag-index")
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "120"))
+RAG_ANN_MIN_SIZE = int(os.getenv("RAG_ANN_MIN_SIZE", "50000"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.05"))
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+def chunk_text(text: str, max_tokens: int = RAG_CHUNK_TOKENS) -> List[str]:
+    """Pack sentences into chunks of at most max_tokens, overlapping by one sentence"""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        sentences = [s.strip() for s in _SENTENCE_BOUNDARY.split(paragraph) if s.strip()]
+        current, current_tokens = [], 0
+        for sentence in sentences:
+            tokens = count_tokens(sentence)
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(" ".join(current))
+                # Carry the last sentence over so context spanning the cut is kept
+                current = current[-1:] if count_tokens(current[-1]) < max_tokens // 2 else []
+                current_tokens = sum(count_tokens(s) for s in current)
+            current.append(sentence)
+            current_tokens += tokens
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+class Retriever:
+    def __init__(
+        self,
+        path: str = RAG_INDEX_DIR,
+        embedder: Optional[Embedder] = None,
+        ann_min_size: int = RAG_ANN_MIN_SIZE,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.store = VectorStore(path, self.embedder.dim)
+        self.index = IVFIndex(self.store)
+        self.ann_min_size = ann_min_size
+        # Serialises writers only; queries search whichever index is published when they start
+        self._write_lock = threading.Lock()
+        self._training = False
+        # Rows written while a retrain runs, replayed onto the new index before it is swapped in
+        self._changed_rows: Optional[set] = None
+
+    def _publish(self, removed: np.ndarray, added: np.ndarray):
+        """Apply a write to a copy of the index and swap it in; call with the write lock held"""
+        index = self.index.copy()
+        index.remove(removed)
+        index.add(added)
+        if self._changed_rows is not None:
+            self._changed_rows.update(removed.tolist())
+            self._changed_rows.update(added.tolist())
+        self.index = index
+
+    def upsert_document(self, doc_id: str, text: str, metadata: Optional[Dict] = None) -> int:
+        """Replace a document's chunks; returns the number of chunks stored"""
+        chunks = chunk_text(text)
+        vectors = self.embedder.embed(chunks) if chunks else None
+        with self._write_lock:
+            removed = self.store.delete_document(doc_id)
+            rows = np.empty(0, dtype=np.int64)
+            if chunks:
+                rows = self.store.upsert(
+                    [f"{doc_id}#{i}" for i in range(len(chunks))],
+                    vectors,
+                    texts=chunks,
+                    doc_ids=[doc_id] * len(chunks),
+                    metadata=[metadata or {}] * len(chunks),
+                )
+            self._publish(removed, rows)
+        self._maybe_train()
+        return len(chunks)
+
+    def delete_document(self, doc_id: str) -> int:
+        """Remove a document; returns the number of chunks removed"""
+        with self._write_lock:
+            rows = self.store.delete_document(doc_id)
+            self._publish(rows, np.empty(0, dtype=np.int64))
+        return len(rows)
+
+    def _maybe_train(self):
+        """Retrain the IVF index if due; runs in the caller's thread without blocking queries or writes"""
+        with self._write_lock:
+            if self._training or self.store.count < self.ann_min_size or not self.index.needs_training:
+                return
+            self._training = True
+            self._changed_rows = set()
+            candidate = self.index.copy()
+        try:
+            candidate.train()
+            with self._write_lock:
+                changed = np.fromiter(self._changed_rows, dtype=np.int64, count=len(self._changed_rows))
+                if len(changed):
+                    alive = self.store.alive[changed] == 1
+                    candidate.remove(changed[~alive])
+                    candidate.add(changed[alive])
+                candidate.save()
+                self.index = candidate
+        finally:
+            with self._write_lock:
+                self._training = False
+                self._changed_rows = None
+
+    def query(self, text: str, k: int = 4, min_score: float = RAG_MIN_SCORE) -> List[Dict]:
+        """Return up to k chunks scoring at least min_score, best first"""
+        query = self.embedder.embed([text])[0]
+        index = self.index
+        if index.is_trained and self.store.count >= self.ann_min_size:
+            rows, scores = index.search(query, k)
+        else:
+            rows, scores = self.store.search(query, k)
+        chunks = self.store.get_chunks(rows)
+        results = []
+        # A delete landing between the search and the lookup leaves a gap, not a shift
+        for chunk, score in zip(chunks, scores.tolist()):
+            if chunk is not None and score >= min_score:
+                chunk["score"] = round(float(score), 4)
+                results.append(chunk)
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": self.store.count,
+            "capacity": self.store.capacity,
+            "embedder": self.embedder.version,
+            "ann_trained": self.index.is_trained,
+            "ann_lists": len(self.index.lists),
+        }
+
+    def flush(self):
+        with self._write_lock:
+            self.store.flush()
+            self.index.save()
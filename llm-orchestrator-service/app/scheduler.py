@@ -0,0 +1,335 @@
+"""
+Admission control for upstream LLM providers.
+
+Each provider gets a lane with a concurrency limit and two token buckets, one
+for requests per minute and one for tokens per minute (prompt plus max_tokens,
+reconciled with the real count once the generation finishes). Requests that
+cannot start immediately wait in a bounded priority queue: interactive chat is
+admitted ahead of batch work, FIFO within a priority, and a full queue sheds
+its newest batch request to make room for an interactive one. A waiter whose deadline
+passes, or cannot possibly be met given the buckets' refill time, is dropped
+instead of being sent late. When the preferred provider is saturated or has
+just returned a 429, requests that did not pin a provider fail over to the next
+provider in the failover order that can admit them.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+from .metrics import SAMPLE_WINDOW, _percentile
+
+# Configuration
+SCHEDULER_MAX_QUEUE_SIZE = int(os.getenv("LLM_SCHEDULER_MAX_QUEUE_SIZE", "256"))
+INTERACTIVE_DEADLINE_MS = float(os.getenv("LLM_INTERACTIVE_DEADLINE_MS", "30000"))
+BATCH_DEADLINE_MS = float(os.getenv("LLM_BATCH_DEADLINE_MS", "300000"))
+# Bucket size in seconds of refill: upstreams enforce per-minute limits over
+# much shorter windows, so a full minute's budget must not go out in one burst
+BUCKET_BURST_SECONDS = float(os.getenv("LLM_SCHEDULER_BURST_SECONDS", "1"))
+FAILOVER_ORDER = [name.strip() for name in os.getenv("LLM_FAILOVER_ORDER", "openai,gemini").split(",") if name.strip()]
+DEFAULT_RATE_LIMIT_PENALTY_SECONDS = 5.0
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+DEFAULT_DEADLINES_MS = {"interactive": INTERACTIVE_DEADLINE_MS, "batch": BATCH_DEADLINE_MS}
+
+class SchedulerOverloaded(Exception):
+    """Raised when a provider's queue is full"""
+
+class DeadlineExceeded(Exception):
+    """Raised when a request cannot be admitted before its deadline"""
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = BUCKET_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; 0 if it can be taken now"""
+        if math.isinf(self.capacity):
+            return 0.0
+        self._refill(now)
+        # A request larger than the bucket goes out once the bucket is full and leaves
+        # it in debt, so later requests wait until the full amount has been paid back
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        """Charge the full amount, even past zero"""
+        self.tokens -= amount
+
+    def give(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class ProviderLimits:
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        requests_per_minute: float = math.inf,
+        tokens_per_minute: float = math.inf,
+        max_queue_size: int = SCHEDULER_MAX_QUEUE_SIZE,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue_size = max_queue_size
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ProviderLimits":
+        """Read LLM_<PROVIDER>_MAX_CONCURRENCY, _RPM and _TPM (0 or unset means unlimited)"""
+        prefix = f"LLM_{provider.upper()}_"
+        rpm = float(os.getenv(prefix + "RPM", "0"))
+        tpm = float(os.getenv(prefix + "TPM", "0"))
+        return cls(
+            max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", "16")),
+            requests_per_minute=rpm or math.inf,
+            tokens_per_minute=tpm or math.inf,
+        )
+
+class Lane:
+    def __init__(self, name: str, limits: ProviderLimits):
+        self.name = name
+        self.limits = limits
+        self.requests = TokenBucket(limits.requests_per_minute)
+        self.tokens = TokenBucket(limits.tokens_per_minute)
+        self.in_flight = 0
+        self.queued = 0
+        self.penalty_until = 0.0
+        self.admitted = 0
+        self.failovers_in = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.queue_wait_ms: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=SAMPLE_WINDOW))
+
+    def admission_wait(self, tokens: int, now: float) -> float:
+        """0 if a request can start now, seconds until it might, or inf while at the concurrency limit"""
+        if self.in_flight >= self.limits.max_concurrency:
+            return math.inf
+        return max(
+            self.penalty_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+            0.0,
+        )
+
+    def summary(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.limits.max_concurrency,
+            "admitted": self.admitted,
+            "failovers_in": self.failovers_in,
+            "rejected_queue_full": self.rejected,
+            "dropped_deadline": self.dropped,
+            "rate_limited": self.rate_limited,
+            "queue_wait_ms": {
+                priority: {
+                    "p50": _percentile(waits, 50),
+                    "p95": _percentile(waits, 95),
+                    "p99": _percentile(waits, 99),
+                }
+                for priority, waits in self.queue_wait_ms.items()
+            },
+        }
+
+class Lease:
+    """Permission to run one generation on `provider`; release() it when the generation ends"""
+
+    def __init__(self, scheduler: "Scheduler", lane: Lane, tokens: int, queue_wait_ms: float, failover: bool):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.provider = lane.name
+        self.tokens = tokens
+        self.queue_wait_ms = queue_wait_ms
+        self.failover = failover
+        self.released = False
+
+    def rate_limited(self, retry_after: Optional[float] = None):
+        """Keep new requests off this provider until it is expected to accept them again"""
+        self.lane.rate_limited += 1
+        penalty = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_PENALTY_SECONDS
+        self.lane.penalty_until = max(self.lane.penalty_until, time.monotonic() + penalty)
+
+    def release(self, unused_tokens: int = 0):
+        """Free the slot and refund budgeted tokens the generation did not use; safe to call twice"""
+        if self.released:
+            return
+        self.released = True
+        self.lane.in_flight -= 1
+        # Never refund more than was charged at admission
+        self.lane.tokens.give(min(max(unused_tokens, 0), self.tokens))
+        self.scheduler._pump()
+
+class _Waiter:
+    def __init__(self, lane: Lane, tokens: int, priority: str, deadline: float, failover: bool, future: asyncio.Future):
+        self.lane = lane
+        self.tokens = tokens
+        self.priority = priority
+        self.deadline = deadline
+        self.failover = failover
+        self.future = future
+        self.enqueued = time.monotonic()
+
+class Scheduler:
+    def __init__(self, limits: Dict[str, ProviderLimits], failover_order: Optional[List[str]] = None):
+        self.lanes = {name: Lane(name, provider_limits) for name, provider_limits in limits.items()}
+        self.failover_order = [name for name in (failover_order or []) if name in self.lanes]
+        self._heap = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = math.inf
+
+    def _candidates(self, waiter: _Waiter) -> List[Lane]:
+        if not waiter.failover or waiter.lane.name not in self.failover_order:
+            return [waiter.lane]
+        return [waiter.lane] + [self.lanes[name] for name in self.failover_order if name != waiter.lane.name]
+
+    async def acquire(
+        self,
+        provider: str,
+        tokens: int,
+        priority: str = "interactive",
+        deadline_ms: Optional[float] = None,
+        allow_failover: bool = True,
+    ) -> Lease:
+        """Wait for a slot on provider (or a failover provider) within the deadline"""
+        lane = self.lanes[provider]
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}")
+        if lane.queued >= lane.limits.max_queue_size and not self._shed(lane, PRIORITIES[priority]):
+            lane.rejected += 1
+            raise SchedulerOverloaded(f"{provider} queue is full")
+
+        timeout = (deadline_ms if deadline_ms is not None else DEFAULT_DEADLINES_MS[priority]) / 1000.0
+        waiter = _Waiter(
+            lane,
+            tokens,
+            priority,
+            time.monotonic() + timeout,
+            allow_failover,
+            asyncio.get_running_loop().create_future(),
+        )
+        lane.queued += 1
+        heapq.heappush(self._heap, (PRIORITIES[priority], next(self._sequence), waiter))
+        self._pump()
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            raise DeadlineExceeded(f"Not admitted to {provider} within {timeout * 1000:.0f}ms") from None
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def _shed(self, lane: Lane, priority: int) -> bool:
+        """Make room in a full queue by rejecting its newest lower-priority waiter"""
+        victim = max(
+            (entry for entry in self._heap if entry[2].lane is lane and not entry[2].future.done()),
+            key=lambda entry: (entry[0], entry[1]),
+            default=None,
+        )
+        if victim is None or victim[0] <= priority:
+            return False
+        lane.queued -= 1
+        lane.rejected += 1
+        victim[2].future.set_exception(SchedulerOverloaded(f"{lane.name} queue is full"))
+        return True
+
+    def _abandon(self, waiter: _Waiter):
+        if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+            # Admitted in the same tick the caller gave up: hand the slot back
+            waiter.future.result().release(unused_tokens=waiter.tokens)
+            return
+        if not waiter.future.done():
+            waiter.lane.dropped += 1
+            waiter.future.cancel()
+            waiter.lane.queued -= 1
+
+    def _admit(self, waiter: _Waiter, lane: Lane, now: float):
+        waiter.lane.queued -= 1
+        lane.in_flight += 1
+        lane.requests.take(1)
+        lane.tokens.take(waiter.tokens)
+        lane.admitted += 1
+        failover = lane is not waiter.lane
+        if failover:
+            lane.failovers_in += 1
+        wait_ms = (now - waiter.enqueued) * 1000
+        lane.queue_wait_ms[waiter.priority].append(wait_ms)
+        waiter.future.set_result(Lease(self, lane, waiter.tokens, wait_ms, failover))
+
+    def _pump(self):
+        """Admit queued requests in priority order wherever they fit now"""
+        now = time.monotonic()
+        blocked = set()
+        retry_at = math.inf
+        kept = []
+        while self._heap and len(blocked) < len(self.lanes):
+            entry = heapq.heappop(self._heap)
+            waiter = entry[2]
+            if waiter.future.done():
+                continue
+            if waiter.deadline <= now:
+                self._drop(waiter)
+                continue
+
+            waits = []
+            admitted = False
+            for lane in self._candidates(waiter):
+                if lane.name in blocked:
+                    waits.append(math.inf)
+                    continue
+                wait = lane.admission_wait(waiter.tokens, now)
+                if wait == 0:
+                    self._admit(waiter, lane, now)
+                    admitted = True
+                    break
+                # Lower-priority waiters must not jump ahead of this one on this lane
+                blocked.add(lane.name)
+                waits.append(wait)
+                retry_at = min(retry_at, now + wait)
+            if admitted:
+                continue
+            if all(not math.isinf(wait) for wait in waits) and now + min(waits) > waiter.deadline:
+                # The buckets cannot refill in time: fail now rather than at the deadline
+                self._drop(waiter)
+                continue
+            kept.append(entry)
+
+        for entry in kept:
+            heapq.heappush(self._heap, entry)
+        self._schedule(retry_at)
+
+    def _drop(self, waiter: _Waiter):
+        waiter.lane.queued -= 1
+        waiter.lane.dropped += 1
+        waiter.future.set_exception(DeadlineExceeded(f"Deadline cannot be met on {waiter.lane.name}"))
+
+    def _schedule(self, at: float):
+        """Re-run admission when a bucket refills or a rate-limit penalty ends"""
+        if math.isinf(at) or at >= self._timer_at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer_at = at
+        self._timer = loop.call_later(max(0.0, at - time.monotonic()), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._timer_at = math.inf
+        self._pump()
+
+    def stats(self) -> Dict:
+        return {name: lane.summary() for name, lane in self.lanes.items()}
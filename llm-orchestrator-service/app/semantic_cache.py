@@ -0,0 +1,232 @@
+"""
+Semantic response cache for chat generation.
+
+Replies are cached per scope (provider, model, max_tokens and the exact system
+prompt) and looked up by embedding similarity, so near-paraphrases of the same
+question ("how can I save money?" / "how do I save money") reuse one
+generation. Entries are bounded by a global LRU size limit and a TTL.
+Messages that carry user-specific content (amounts, account numbers, emails,
+handles, references to "my balance" and so on) bypass the cache entirely, as
+does any request with conversation history: the reply may draw on earlier
+turns (a wallet balance, a name), so it must never be served to someone else.
+"""
+
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embeddings import Embedder, HashingEmbedder
+from .models import ChatRequest
+
+# Configuration
+SEMANTIC_CACHE_ENABLED = os.getenv("LLM_SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("LLM_SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("LLM_SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+
+INITIAL_SCOPE_CAPACITY = 64
+
+_STOPWORDS = frozenset(
+    "a an the i me we you your is are am be do does did can could would should will "
+    "please tell give some any about of for to in on at with and or it this that "
+    "hey hi hello mr happy".split()
+)
+_WORD = re.compile(r"[a-z]+")
+_PERSONAL_DATA = [
+    ("amount_or_number", re.compile(r"\d")),
+    ("email", re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")),
+    ("handle", re.compile(r"(?<!\w)@\w+")),
+    ("currency", re.compile(r"[₹$€£]")),
+    (
+        "account_reference",
+        re.compile(r"\bmy\s+(balance|wallet|account|card|cards|transactions?|payments?|transfers?|history|statement)\b", re.I),
+    ),
+]
+
+def cache_text(message: str) -> str:
+    """Reduce a message to its content words so filler and phrasing differences do not affect similarity"""
+    words = []
+    for word in _WORD.findall(message.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+def bypass_reason(request: ChatRequest) -> Optional[str]:
+    """Why this request must not be served from or stored in the cache, if at all"""
+    if (request.context or {}).get("cache") is False:
+        return "disabled_by_request"
+    if request.history:
+        return "has_history"
+    for reason, pattern in _PERSONAL_DATA:
+        if pattern.search(request.message):
+            return reason
+    if not cache_text(request.message):
+        return "no_content_words"
+    return None
+
+def scope_key(provider: str, model: str, system_prompt: str, max_tokens: int) -> str:
+    return hashlib.sha256(f"{provider}\0{model}\0{max_tokens}\0{system_prompt}".encode()).hexdigest()
+
+class CacheEntry:
+    def __init__(self, scope: str, slot: int, message: str, response: str, generation_ms: float, expires_at: float):
+        self.scope = scope
+        self.slot = slot
+        self.message = message
+        self.response = response
+        self.generation_ms = generation_ms
+        self.expires_at = expires_at
+
+class CacheLookup:
+    """Result of a lookup: the hit, if any, and the query vector to store a miss under"""
+
+    def __init__(self, scope: str, vector: np.ndarray, entry: Optional[CacheEntry] = None, similarity: float = 0.0):
+        self.scope = scope
+        self.vector = vector
+        self.entry = entry
+        self.similarity = similarity
+
+class _Scope:
+    """Embedding matrix of one scope; slot i holds the vector of entry ids[i]"""
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((INITIAL_SCOPE_CAPACITY, dim), dtype=np.float32)
+        self.ids = np.full(INITIAL_SCOPE_CAPACITY, -1, dtype=np.int64)
+        self.free: List[int] = []
+        self.size = 0
+
+    def add(self, entry_id: int, vector: np.ndarray) -> int:
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.size == len(self.ids):
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+                self.ids = np.concatenate([self.ids, np.full(len(self.ids), -1, dtype=np.int64)])
+            slot = self.size
+            self.size += 1
+        self.vectors[slot] = vector
+        self.ids[slot] = entry_id
+        return slot
+
+    def remove(self, slot: int):
+        self.ids[slot] = -1
+        self.free.append(slot)
+
+    def best(self, vector: np.ndarray) -> Tuple[int, float]:
+        """Entry id and similarity of the nearest live entry, or (-1, 0.0)"""
+        if self.size == len(self.free):
+            return -1, 0.0
+        scores = self.vectors[:self.size] @ vector
+        scores[self.ids[:self.size] < 0] = -np.inf
+        slot = int(np.argmax(scores))
+        return int(self.ids[slot]), float(scores[slot])
+
+class SemanticCache:
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._scopes: Dict[str, _Scope] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed: Dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+        self.latency_saved_ms = 0.0
+
+    def bypass(self, request: ChatRequest) -> Optional[str]:
+        """Return the bypass reason for a request, counting it"""
+        reason = "cache_disabled" if not self.enabled else bypass_reason(request)
+        if reason:
+            self.bypassed[reason] = self.bypassed.get(reason, 0) + 1
+        return reason
+
+    def lookup(self, scope: str, message: str) -> CacheLookup:
+        started = time.perf_counter()
+        vector = self.embedder.embed([cache_text(message)])[0]
+        result = CacheLookup(scope, vector)
+        if scope in self._scopes:
+            entry_id, similarity = self._scopes[scope].best(vector)
+            entry = self._entries.get(entry_id)
+            if entry is not None and entry.expires_at < time.monotonic():
+                self._drop(entry_id)
+                self.expirations += 1
+                entry = None
+            if entry is not None and similarity >= self.threshold:
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                self.latency_saved_ms += max(0.0, entry.generation_ms - (time.perf_counter() - started) * 1000)
+                result.entry, result.similarity = entry, similarity
+                return result
+        self.misses += 1
+        return result
+
+    def store(self, lookup: CacheLookup, message: str, response: str, generation_ms: float):
+        if not response:
+            return
+        scope = self._scopes.get(lookup.scope)
+        if scope is None:
+            scope = self._scopes[lookup.scope] = _Scope(self.embedder.dim)
+        entry_id = self._next_id
+        self._next_id += 1
+        slot = scope.add(entry_id, lookup.vector)
+        self._entries[entry_id] = CacheEntry(
+            lookup.scope, slot, message, response, generation_ms, time.monotonic() + self.ttl_seconds
+        )
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        scope = self._scopes[entry.scope]
+        scope.remove(entry.slot)
+        if scope.size == len(scope.free):
+            del self._scopes[entry.scope]
+
+    async def record(self, stream: AsyncIterator[str], lookup: CacheLookup, message: str) -> AsyncIterator[str]:
+        """Pass a generation stream through, caching the reply only if it completes"""
+        started = time.perf_counter()
+        parts = []
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+        finally:
+            await stream.aclose()
+        self.store(lookup, message, "".join(parts), (time.perf_counter() - started) * 1000)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            "scopes": len(self._scopes),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bypassed": dict(self.bypassed),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
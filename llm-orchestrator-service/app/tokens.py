@@ -0,0 +1,16 @@
+import re
+from functools import lru_cache
+
+# Words, numbers and individual punctuation marks; close enough to BPE counts
+# for budgeting and throughput metrics without loading a real tokenizer
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in text"""
+    count = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        word = match.group(0)
+        # Long words are usually split into several sub-word tokens
+        count += 1 + (len(word) - 1) // 6
+    return count
@@ -0,0 +1,217 @@
+"""
+Persistent embedding store.
+
+Vectors live in a memory-mapped ``.npy`` matrix and a parallel liveness mask,
+so the corpus is paged in by the OS instead of being loaded up front. Chunk
+text and metadata live in SQLite. Upserts overwrite rows in place, deletes
+clear the liveness bit and recycle the row; neither rewrites the matrix
+except when it has to grow.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+SQLITE_BATCH = 500
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+class VectorStore:
+    def __init__(self, path: str, dim: int, initial_capacity: int = INITIAL_CAPACITY):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+
+        self.db = sqlite3.connect(os.path.join(path, "chunks.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL, "
+            "doc_id TEXT, text TEXT, metadata TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks(doc_id)")
+        self.db.commit()
+
+        self.vectors = self._open_array("vectors.npy", (initial_capacity, dim), np.float32)
+        if self.vectors.shape[1] != dim:
+            raise ValueError(f"Store at {path} has dimension {self.vectors.shape[1]}, expected {dim}")
+        self.alive = self._open_array("alive.npy", (initial_capacity,), np.uint8)
+
+        # Readers get their own connection per thread so lookups never share a cursor with a write
+        self._readers = threading.local()
+
+        max_row = self.db.execute("SELECT MAX(row) FROM chunks").fetchone()[0]
+        self.size = 0 if max_row is None else max_row + 1
+        self._free = [int(row) for row in np.flatnonzero(self.alive[:self.size] == 0)[::-1]]
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._readers, "db", None)
+        if db is None:
+            db = self._readers.db = sqlite3.connect(os.path.join(self.path, "chunks.sqlite"), check_same_thread=False)
+        return db
+
+    def _open_array(self, name: str, shape, dtype) -> np.memmap:
+        filename = os.path.join(self.path, name)
+        if os.path.exists(filename):
+            return np.lib.format.open_memmap(filename, mode="r+")
+        return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
+
+    def _grow_array(self, name: str, array: np.memmap, capacity: int) -> np.memmap:
+        filename = os.path.join(self.path, name)
+        grown = np.lib.format.open_memmap(
+            filename + ".tmp", mode="w+", dtype=array.dtype, shape=(capacity,) + array.shape[1:]
+        )
+        grown[:self.size] = array[:self.size]
+        grown.flush()
+        # Readers holding the old mapping keep a valid view of the replaced file
+        os.replace(filename + ".tmp", filename)
+        return grown
+
+    @property
+    def capacity(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def count(self) -> int:
+        return self.size - len(self._free)
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        self.vectors = self._grow_array("vectors.npy", self.vectors, capacity)
+        self.alive = self._grow_array("alive.npy", self.alive, capacity)
+
+    def _existing_rows(self, chunk_ids: Sequence[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(chunk_ids), SQLITE_BATCH):
+            batch = list(chunk_ids[start:start + SQLITE_BATCH])
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self.db.execute(
+                f"SELECT chunk_id, row FROM chunks WHERE chunk_id IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+    def upsert(
+        self,
+        chunk_ids: Sequence[str],
+        vectors: np.ndarray,
+        texts: Optional[Sequence[str]] = None,
+        doc_ids: Optional[Sequence[str]] = None,
+        metadata: Optional[Sequence[Dict]] = None,
+    ) -> np.ndarray:
+        """Insert or overwrite chunks; returns the row assigned to each chunk"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            existing = self._existing_rows(chunk_ids)
+            rows = np.empty(len(chunk_ids), dtype=np.int64)
+            new_rows = 0
+            for i, chunk_id in enumerate(chunk_ids):
+                if chunk_id in existing:
+                    rows[i] = existing[chunk_id]
+                    continue
+                if self._free:
+                    rows[i] = self._free.pop()
+                else:
+                    rows[i] = self.size + new_rows
+                    new_rows += 1
+                # A chunk id repeated within the batch reuses its first row
+                existing[chunk_id] = rows[i]
+            self._ensure_capacity(self.size + new_rows)
+            self.vectors[rows] = vectors
+            self.alive[rows] = 1
+            self.size += new_rows
+
+            self.db.executemany(
+                "INSERT OR REPLACE INTO chunks (row, chunk_id, doc_id, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        int(row),
+                        chunk_id,
+                        doc_ids[i] if doc_ids else None,
+                        texts[i] if texts else None,
+                        json.dumps(metadata[i]) if metadata else None,
+                    )
+                    for i, (row, chunk_id) in enumerate(zip(rows, chunk_ids))
+                ),
+            )
+            self.db.commit()
+        return rows
+
+    def delete(self, chunk_ids: Sequence[str]) -> np.ndarray:
+        """Remove chunks by id; returns the freed rows"""
+        with self._lock:
+            rows = np.fromiter(self._existing_rows(chunk_ids).values(), dtype=np.int64)
+            self._release(rows)
+        return rows
+
+    def delete_document(self, doc_id: str) -> np.ndarray:
+        """Remove every chunk of a document; returns the freed rows"""
+        with self._lock:
+            rows = np.array(
+                [row for (row,) in self.db.execute("SELECT row FROM chunks WHERE doc_id = ?", (doc_id,))],
+                dtype=np.int64,
+            )
+            self._release(rows)
+        return rows
+
+    def _release(self, rows: np.ndarray):
+        if not len(rows):
+            return
+        self.alive[rows] = 0
+        self._free.extend(int(row) for row in rows)
+        for start in range(0, len(rows), SQLITE_BATCH):
+            batch = [int(row) for row in rows[start:start + SQLITE_BATCH]]
+            self.db.execute(f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch)
+        self.db.commit()
+
+    def alive_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[:self.size])
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k by inner product over every live row"""
+        vectors, alive, size = self.vectors, self.alive, self.size
+        if size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = vectors[:size] @ np.asarray(query, dtype=np.float32)
+        scores[alive[:size] == 0] = -np.inf
+        rows = top_k(scores, min(k, self.count))
+        return rows, scores[rows]
+
+    def get_chunks(self, rows: Sequence[int]) -> List[Optional[Dict]]:
+        """Chunk text and metadata for rows, aligned with rows; None where a row has since been deleted"""
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+        found = {}
+        db = self._reader()
+        for start in range(0, len(rows), SQLITE_BATCH):
+            batch = rows[start:start + SQLITE_BATCH]
+            for row, chunk_id, doc_id, text, metadata in db.execute(
+                f"SELECT row, chunk_id, doc_id, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})",
+                batch,
+            ):
+                found[row] = {
+                    "chunk_id": chunk_id,
+                    "doc_id": doc_id,
+                    "text": text,
+                    "metadata": json.loads(metadata) if metadata else {},
+                }
+        return [found.get(row) for row in rows]
+
+    def flush(self):
+        with self._lock:
+            self.vectors.flush()
+            self.alive.flush()
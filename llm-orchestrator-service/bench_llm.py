@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the LLM Orchestrator
+Measures query latency and recall@k of exact vs IVF retrieval on synthetic
+clustered embeddings as the corpus grows, and how the provider scheduler
+handles a burst against rate-limited fake providers
+Run from the llm-orchestrator-service directory:
+
+    python bench_llm.py retrieval --sizes 10000,100000,1000000 --dim 128
+    python bench_llm.py scheduler --interactive 300 --batch 300
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.ann_index import IVFIndex
+from app.generation import stream_generation
+from app.metrics import GenerationMetrics
+from app.providers import FakeProvider, ProviderError, RateLimitError
+from app.scheduler import DeadlineExceeded, ProviderLimits, Scheduler, SchedulerOverloaded
+from app.vector_store import VectorStore
+
+UPSERT_BATCH = 20000
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if len(values) else 0.0
+
+def synthetic_corpus(rng, size, dim):
+    """Unit vectors drawn around sqrt(size) topic centres, like chunks of related documents"""
+    centres = rng.standard_normal((max(8, int(np.sqrt(size))), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centres), size)
+    vectors = centres[labels] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def time_queries(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows, _ = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(rows)
+    return latencies, results
+
+def bench_retrieval(args):
+    rng = np.random.default_rng(args.seed)
+    print(f"🚀 Retrieval benchmark: dim={args.dim}, k={args.k}, {args.queries} queries per size")
+    print(f"{'chunks':>9} {'index':>12} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+    for size in args.sizes:
+        path = tempfile.mkdtemp(prefix="bench-rag-")
+        try:
+            store = VectorStore(path, args.dim)
+            vectors = synthetic_corpus(rng, size, args.dim)
+            start = time.perf_counter()
+            for offset in range(0, size, UPSERT_BATCH):
+                batch = vectors[offset:offset + UPSERT_BATCH]
+                store.upsert([f"c{i}" for i in range(offset, offset + len(batch))], batch)
+            load_seconds = time.perf_counter() - start
+
+            index = IVFIndex(store)
+            start = time.perf_counter()
+            index.train()
+            train_seconds = time.perf_counter() - start
+            print(f"📦 {size} chunks stored in {load_seconds:.1f}s, "
+                  f"{len(index.centroids)} IVF lists trained in {train_seconds:.1f}s")
+
+            # Queries are perturbed corpus vectors so each has real near neighbours
+            picks = rng.integers(0, size, args.queries)
+            queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+            exact_latencies, truth = time_queries(lambda q: store.search(q, args.k), queries)
+            print(f"{size:>9} {'exact':>12} {percentile(exact_latencies, 50):>8.2f} "
+                  f"{percentile(exact_latencies, 95):>8.2f} {1.0:>7.3f}")
+
+            for nprobe in args.nprobe:
+                latencies, found = time_queries(lambda q: index.search(q, args.k, nprobe=nprobe), queries)
+                recall = np.mean([
+                    len(np.intersect1d(expected, got)) / len(expected)
+                    for expected, got in zip(truth, found)
+                ])
+                print(f"{size:>9} {f'ivf/{nprobe}':>12} {percentile(latencies, 50):>8.2f} "
+                      f"{percentile(latencies, 95):>8.2f} {recall:>7.3f}")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+    print("\n🎉 Retrieval benchmark completed!")
+
+async def run_burst(args, scheduled):
+    upstreams = {
+        "primary": FakeProvider(args.first_token_ms, args.token_ms, name="primary", requests_per_second=args.primary_rps),
+        "secondary": FakeProvider(args.first_token_ms, args.token_ms, name="secondary", requests_per_second=args.secondary_rps),
+    }
+    scheduler = Scheduler(
+        {
+            "primary": ProviderLimits(args.concurrency, args.primary_rps * 60, max_queue_size=args.max_queue),
+            "secondary": ProviderLimits(args.concurrency, args.secondary_rps * 60, max_queue_size=args.max_queue),
+        },
+        failover_order=["primary", "secondary"],
+    )
+    metrics = GenerationMetrics()
+    outcomes = {"ok": 0, "rate_limited": 0, "dropped": 0}
+    dropped = {"interactive": 0, "batch": 0}
+    latencies = {"interactive": [], "batch": []}
+    messages = [{"role": "user", "content": "how do I build an emergency fund"}]
+    rng = np.random.default_rng(args.seed)
+
+    async def request(priority, delay):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        lease = None
+        provider = upstreams["primary"]
+        try:
+            if scheduled:
+                deadline = args.interactive_deadline_ms if priority == "interactive" else args.batch_deadline_ms
+                lease = await scheduler.acquire("primary", 64, priority=priority, deadline_ms=deadline)
+                provider = upstreams[lease.provider]
+            async for _ in stream_generation(provider, messages, metrics, max_tokens=64, lease=lease):
+                pass
+        except RateLimitError:
+            outcomes["rate_limited"] += 1
+            return
+        except (DeadlineExceeded, SchedulerOverloaded, ProviderError):
+            outcomes["dropped"] += 1
+            dropped[priority] += 1
+            return
+        outcomes["ok"] += 1
+        latencies[priority].append((time.perf_counter() - started) * 1000)
+
+    # Everything arrives within the burst window, batch and interactive interleaved
+    tasks = [request("interactive", rng.uniform(0, args.burst_seconds)) for _ in range(args.interactive)]
+    tasks += [request("batch", rng.uniform(0, args.burst_seconds)) for _ in range(args.batch)]
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    outcomes["dropped_by_priority"] = dropped
+    return outcomes, latencies, scheduler.stats(), time.perf_counter() - started
+
+def bench_scheduler(args):
+    print(f"🚀 Scheduler benchmark: {args.interactive} interactive + {args.batch} batch requests "
+          f"over {args.burst_seconds}s, upstream limits {args.primary_rps}/{args.secondary_rps} req/s")
+    for scheduled in (False, True):
+        outcomes, latencies, stats, elapsed = asyncio.run(run_burst(args, scheduled))
+        print(f"\n📊 {'scheduled (buckets + failover)' if scheduled else 'direct to primary'} in {elapsed:.1f}s")
+        print(f"   ok={outcomes['ok']} 429s={outcomes['rate_limited']} dropped={outcomes['dropped']} "
+              f"{outcomes['dropped_by_priority']}")
+        for priority, values in latencies.items():
+            if values:
+                print(f"   {priority:>11} latency p50={percentile(values, 50):.0f}ms "
+                      f"p95={percentile(values, 95):.0f}ms p99={percentile(values, 99):.0f}ms")
+        if scheduled:
+            for name, lane in stats.items():
+                waits = ", ".join(f"{p} p50={w['p50']} p95={w['p95']}" for p, w in lane["queue_wait_ms"].items())
+                print(f"   {name}: admitted={lane['admitted']} failovers_in={lane['failovers_in']} "
+                      f"dropped={lane['dropped_deadline']} queue wait ms: {waits}")
+    print("\n🎉 Scheduler benchmark completed!")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM orchestrator benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    retrieval = subparsers.add_parser("retrieval", help="latency and recall of exact vs IVF search by corpus size")
+    retrieval.add_argument("--sizes", type=lambda v: [int(n) for n in v.split(",")], default=[10000, 100000, 1000000])
+    retrieval.add_argument("--dim", type=int, default=128)
+    retrieval.add_argument("--k", type=int, default=10)
+    retrieval.add_argument("--queries", type=int, default=200)
+    retrieval.add_argument("--nprobe", type=lambda v: [int(n) for n in v.split(",")], default=[4, 8, 16, 32])
+    retrieval.add_argument("--seed", type=int, default=0)
+    retrieval.set_defaults(func=bench_retrieval)
+
+    sched = subparsers.add_parser("scheduler", help="burst against rate-limited fake providers, with and without the scheduler")
+    sched.add_argument("--interactive", type=int, default=300)
+    sched.add_argument("--batch", type=int, default=300)
+    sched.add_argument("--burst-seconds", type=float, default=2.0)
+    sched.add_argument("--primary-rps", type=float, default=60)
+    sched.add_argument("--secondary-rps", type=float, default=40)
+    sched.add_argument("--concurrency", type=int, default=32)
+    sched.add_argument("--max-queue", type=int, default=256)
+    sched.add_argument("--first-token-ms", type=float, default=150)
+    sched.add_argument("--token-ms", type=float, default=2)
+    sched.add_argument("--interactive-deadline-ms", type=float, default=5000)
+    sched.add_argument("--batch-deadline-ms", type=float, default=60000)
+    sched.add_argument("--seed", type=int, default=0)
+    sched.set_defaults(func=bench_scheduler)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
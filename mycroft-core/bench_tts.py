@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Mycroft TTS pipeline
+Measures time-to-first-audio against time-to-whole-utterance, real-time
+factor and bytes on the wire (binary PCM frames vs the old base64-in-JSON)
+for the assistant's typical replies, and what the phrase cache saves on
+repeated replies. Run from the mycroft-core directory:
+
+    python bench_tts.py pipeline --engine sine --rounds 5
+    python bench_tts.py cache --engine sine --requests 200
+    python bench_tts.py sessions --engine sine --levels 10,50,100,200
+
+The sessions benchmark starts simple_tts_server.py in a subprocess and opens
+N simultaneous WebSocket sessions, each playing its audio back in real time
+behind a small jitter buffer; a session that runs out of audio before the
+next frame arrives counts as an underrun.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from tts_cache import PhraseCache, load_prewarm_phrases
+from tts_engine import TTS_WORKERS, TTSPipeline, UtteranceStats, percentile
+
+UTTERANCES = [
+    "I'm having trouble accessing your wallet right now. Please try again in a moment.",
+    "Your current wallet balance is 1250 Happy Coins. Would you like to perform any transactions?",
+    "I can help you transfer money! To get started, I'll need the recipient's information and the amount "
+    "you'd like to send. Would you like me to open the transfer form?",
+    "I'm Mr. Happy, your personal financial assistant! I can help you with:\n\n• Check wallet balance\n"
+    "• Transfer money\n• Make payments\n• Manage virtual cards\n• View transaction history\n"
+    "• Answer financial questions\n\nJust ask me anything related to your finances!",
+]
+
+async def bench_pipeline(args):
+    pipeline = TTSPipeline(args.engine, workers=args.workers, chunk_bytes=args.chunk_bytes)
+    pipeline.start()
+    # Warm the worker processes so process start-up is not billed to the first utterance
+    async for _ in pipeline.stream("Warm up.", "en-us"):
+        pass
+    print(f"🚀 {pipeline.engine.name} engine, {args.workers} workers, {args.chunk_bytes}-byte chunks")
+    print(f"   {'utterance':<12}{'chars':>7}{'audio s':>9}{'ttfa ms':>9}{'total ms':>10}{'rtf':>8}{'binary KB':>11}{'base64 KB':>11}")
+    for index, text in enumerate(UTTERANCES):
+        ttfa, totals, rtfs = [], [], []
+        for _ in range(args.rounds):
+            stats = UtteranceStats()
+            frames = 0
+            async for chunk in pipeline.stream(text, "en-us", stats):
+                frames += 1
+            totals.append((time.perf_counter() - stats.started) * 1000)
+            ttfa.append(stats.ttfa_ms)
+            rtfs.append(stats.rtf)
+        binary_kb = stats.audio_bytes / 1024
+        # What the old server would have sent: the whole utterance base64-encoded in one JSON message
+        base64_kb = len(json.dumps({"type": "tts_response", "audio_data": base64.b64encode(bytes(stats.audio_bytes)).decode()})) / 1024
+        print(f"   #{index + 1:<11}{len(text):>7}{stats.audio_bytes / 2 / pipeline.engine.sample_rate:>9.2f}"
+              f"{percentile(ttfa, 50):>9.1f}{percentile(totals, 50):>10.1f}{percentile(rtfs, 50):>8.3f}"
+              f"{binary_kb:>11.1f}{base64_kb:>11.1f}")
+    print(f"\n📊 {pipeline.metrics.summary()}")
+    pipeline.stop()
+
+async def bench_cache(args):
+    """Replay a reply mix (mostly fixed replies, some with varying amounts) without and with the cache"""
+    rng = random.Random(args.seed)
+    mix = [
+        rng.choice(UTTERANCES) if rng.random() < args.fixed_share else
+        f"Your current wallet balance is {rng.randint(1, 99999)} Happy Coins. Would you like to perform any transactions?"
+        for _ in range(args.requests)
+    ]
+    print(f"🚀 {args.requests} replies, {args.fixed_share:.0%} fixed phrases, {args.workers} workers")
+    for label, cache in (("no cache", None), ("pre-warmed cache", PhraseCache(tempfile.mkdtemp(prefix="tts-bench-")))):
+        pipeline = TTSPipeline(args.engine, workers=args.workers, cache=cache)
+        pipeline.start()
+        async for _ in pipeline.stream("Warm up.", "en-us"):
+            pass
+        if cache is not None:
+            cache.load()
+            started = time.perf_counter()
+            warmed = await pipeline.prewarm(load_prewarm_phrases())
+            print(f"   pre-warmed {warmed} sentences in {time.perf_counter() - started:.1f}s")
+        ttfa, totals = [], []
+        started = time.perf_counter()
+        for text in mix:
+            stats = UtteranceStats()
+            async for _ in pipeline.stream(text, "en-us", stats):
+                pass
+            ttfa.append(stats.ttfa_ms)
+            totals.append((time.perf_counter() - stats.started) * 1000)
+        elapsed = time.perf_counter() - started
+        metrics = pipeline.metrics.summary()
+        print(f"   {label:<18} ttfa p50 {percentile(ttfa, 50):7.1f}ms  p95 {percentile(ttfa, 95):7.1f}ms  "
+              f"total p50 {percentile(totals, 50):7.1f}ms  {args.requests / elapsed:6.1f} replies/s  "
+              f"synthesized {metrics['sentences'] - metrics['cached_sentences']} sentences")
+        if cache is not None:
+            print(f"   cache: {cache.stats()}")
+        pipeline.stop()
+
+async def play_session(port, texts, buffer_ms, sample_rate):
+    """Speak texts in turn, as a client that starts playback buffer_ms after the first frame"""
+    import websockets
+
+    ttfa, underruns = [], 0
+    async with websockets.connect(f"ws://127.0.0.1:{port}/tts_stream", compression=None, open_timeout=60) as ws:
+        for text in texts:
+            sent = time.perf_counter()
+            await ws.send(json.dumps({"text": text}))
+            playback_start, played = None, 0.0
+            while True:
+                frame = await ws.recv()
+                now = time.perf_counter()
+                if isinstance(frame, str):
+                    if json.loads(frame)["type"] in ("audio_end", "error"):
+                        break
+                    continue
+                if playback_start is None:
+                    ttfa.append((now - sent) * 1000)
+                    playback_start = now + buffer_ms / 1000.0
+                elif now > playback_start + played:
+                    # The speaker ran dry before this frame arrived
+                    underruns += 1
+                    playback_start = now - played
+                played += len(frame) / 2 / sample_rate
+    return ttfa, underruns
+
+async def bench_sessions(args):
+    import httpx
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, TTS_ENGINE=args.engine, TTS_WORKERS=str(args.workers), MYCROFT_TTS_STREAM_PORT=str(port),
+               TTS_CACHE_DIR=tempfile.mkdtemp(prefix="tts-bench-"), TTS_MAX_CONNECTIONS=str(max(args.levels) + 10))
+    server = subprocess.Popen([sys.executable, "simple_tts_server.py"], env=env, stdout=subprocess.DEVNULL)
+    rng = random.Random(args.seed)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+            # Let the pre-warm finish so every level sees the same cache
+            while (await client.get("/metrics")).json()["cache"]["entries"] < 20:
+                await asyncio.sleep(0.5)
+            print(f"🚀 {args.engine} engine, {args.workers} workers, {args.utterances} replies per session, "
+                  f"{args.fixed_share:.0%} fixed phrases, {args.buffer_ms:.0f}ms jitter buffer")
+            print(f"   {'sessions':>8}{'ttfa p50':>10}{'ttfa p95':>10}{'underrun sessions':>19}{'underruns':>11}{'wall s':>8}")
+            for level in args.levels:
+                sessions = [
+                    [rng.choice(UTTERANCES) if rng.random() < args.fixed_share else
+                     f"Your current wallet balance is {rng.randint(1, 99999)} Happy Coins. Would you like to perform any transactions?"
+                     for _ in range(args.utterances)]
+                    for _ in range(level)
+                ]
+                started = time.perf_counter()
+                results = await asyncio.gather(*(
+                    play_session(port, texts, args.buffer_ms, 22050) for texts in sessions
+                ), return_exceptions=True)
+                elapsed = time.perf_counter() - started
+                failed = [r for r in results if isinstance(r, Exception)]
+                done = [r for r in results if not isinstance(r, Exception)]
+                ttfa = [t for r, _ in done for t in r]
+                underrun_sessions = sum(1 for _, u in done if u)
+                print(f"   {level:>8}{percentile(ttfa, 50) or 0:>10.1f}{percentile(ttfa, 95) or 0:>10.1f}"
+                      f"{underrun_sessions / level:>19.1%}{sum(u for _, u in done):>11}{elapsed:>8.1f}"
+                      + (f"  ({len(failed)} failed: {failed[0]!r})" if failed else ""))
+            print(f"\n📊 {(await client.get('/metrics')).json()['server']}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mycroft TTS benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pipe = subparsers.add_parser("pipeline", help="time-to-first-audio, real-time factor and wire size per utterance")
+    pipe.add_argument("--engine", default="auto", choices=["auto", "sine", "espeak-ng"])
+    pipe.add_argument("--workers", type=int, default=TTS_WORKERS)
+    pipe.add_argument("--chunk-bytes", type=int, default=4096)
+    pipe.add_argument("--rounds", type=int, default=5)
+    pipe.set_defaults(func=bench_pipeline)
+
+    cache = subparsers.add_parser("cache", help="reply latency on a realistic reply mix with and without the phrase cache")
+    cache.add_argument("--engine", default="auto", choices=["auto", "sine", "espeak-ng"])
+    cache.add_argument("--workers", type=int, default=TTS_WORKERS)
+    cache.add_argument("--requests", type=int, default=200)
+    cache.add_argument("--fixed-share", type=float, default=0.8)
+    cache.add_argument("--seed", type=int, default=0)
+    cache.set_defaults(func=bench_cache)
+
+    sessions = subparsers.add_parser("sessions", help="simultaneous real-time streaming sessions against the server")
+    sessions.add_argument("--engine", default="auto", choices=["auto", "sine", "espeak-ng"])
+    sessions.add_argument("--workers", type=int, default=TTS_WORKERS)
+    sessions.add_argument("--levels", type=lambda v: [int(n) for n in v.split(",")], default=[10, 50, 100, 200])
+    sessions.add_argument("--utterances", type=int, default=3)
+    sessions.add_argument("--fixed-share", type=float, default=0.8)
+    sessions.add_argument("--buffer-ms", type=float, default=300)
+    sessions.add_argument("--seed", type=int, default=0)
+    sessions.set_defaults(func=bench_sessions)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,223 @@
-
 #!/usr/bin/env python3
 """
-Simple TTS server placeholder for Mycroft Core
-This will be replaced with actual Mycroft integration
+TTS server for Mycroft Core
+One asyncio server on MYCROFT_TTS_STREAM_PORT handles both the WebSocket
+voice stream (/tts_stream) and plain HTTP requests (/health, /metrics), so a
+slow HTTP client can no longer hold up health checks.
+
+Each connection speaks one utterance at a time. Audio frames are awaited
+through the connection's write buffer (TTS_WRITE_LIMIT_BYTES): a client that
+reads slowly pauses its own stream, and with it the synthesis of its next
+sentences, instead of buffering audio in the server. A client that stops
+reading altogether is disconnected after TTS_SEND_TIMEOUT_SECONDS.
+Connections beyond TTS_MAX_CONNECTIONS are refused with 503. On SIGTERM the
+server stops accepting connections, reports unhealthy, lets utterances in
+progress finish for up to TTS_DRAIN_SECONDS and then closes.
 """
 
 import asyncio
-import websockets
+import http
 import json
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import threading
-
-class TTSHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "ok", "service": "mycroft-tts"}).encode())
-        else:
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"message": "Mycroft TTS Server", "service": "mycroft-core"}).encode())
-
-async def tts_websocket_handler(websocket, path):
+import os
+import signal
+import time
+
+import websockets
+
+from tts_cache import PhraseCache, load_prewarm_phrases
+from tts_engine import MAX_TEXT_CHARS, TTS_VOICE, TTSPipeline, UtteranceStats, validate_voice
+
+# Configuration
+MYCROFT_TTS_STREAM_PORT = int(os.getenv("MYCROFT_TTS_STREAM_PORT", "8181"))
+TTS_MAX_CONNECTIONS = int(os.getenv("TTS_MAX_CONNECTIONS", "500"))
+TTS_WRITE_LIMIT_BYTES = int(os.getenv("TTS_WRITE_LIMIT_BYTES", str(64 * 1024)))
+TTS_SEND_TIMEOUT_SECONDS = float(os.getenv("TTS_SEND_TIMEOUT_SECONDS", "30"))
+TTS_DRAIN_SECONDS = float(os.getenv("TTS_DRAIN_SECONDS", "20"))
+MAX_MESSAGE_BYTES = 16 * 1024
+
+pipeline = TTSPipeline(cache=PhraseCache())
+
+class ServerState:
+    def __init__(self):
+        self.connections = {}
+        self.draining = False
+        self.started = time.time()
+        self.peak_connections = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.slow_client_disconnects = 0
+
+    @property
+    def speaking(self) -> int:
+        return sum(1 for busy in self.connections.values() if busy)
+
+    def summary(self):
+        return {
+            "connections": len(self.connections),
+            "speaking": self.speaking,
+            "peak_connections": self.peak_connections,
+            "max_connections": TTS_MAX_CONNECTIONS,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "slow_client_disconnects": self.slow_client_disconnects,
+            "draining": self.draining,
+            "uptime_seconds": round(time.time() - self.started),
+        }
+
+state = ServerState()
+
+def json_response(status, body):
+    return status, [("Content-Type", "application/json")], json.dumps(body).encode()
+
+async def process_request(path, request_headers):
+    """Answer plain HTTP requests; return None to continue with the WebSocket handshake"""
+    route = path.split("?", 1)[0]
+    if route == "/health":
+        if state.draining:
+            return json_response(http.HTTPStatus.SERVICE_UNAVAILABLE, {"status": "draining", "service": "mycroft-tts"})
+        return json_response(http.HTTPStatus.OK, {"status": "ok", "service": "mycroft-tts"})
+    if route == "/metrics":
+        return json_response(http.HTTPStatus.OK, {
+            "engine": pipeline.engine.name,
+            "server": state.summary(),
+            "tts": pipeline.metrics.summary(),
+            "cache": pipeline.cache.stats(),
+        })
+    if route != "/tts_stream" or request_headers.get("Upgrade", "").lower() != "websocket":
+        return json_response(http.HTTPStatus.OK, {"message": "Mycroft TTS Server", "service": "mycroft-core"})
+    if state.draining or len(state.connections) >= TTS_MAX_CONNECTIONS:
+        state.rejected += 1
+        status, headers, body = json_response(http.HTTPStatus.SERVICE_UNAVAILABLE, {"detail": "TTS server is at capacity"})
+        return status, headers + [("Retry-After", "1")], body
+    return None
+
+def parse_speak_request(message):
+    """Accept {"text": ..., "voice": ..., "request_id": ...} or plain text"""
+    if isinstance(message, bytes):
+        raise ValueError("Send text frames")
+    try:
+        request = json.loads(message)
+    except ValueError:
+        request = {"text": message}
+    if not isinstance(request, dict):
+        request = {"text": str(request)}
+    text = str(request.get("text") or "").strip()
+    if not text:
+        raise ValueError("No text to speak")
+    if len(text) > MAX_TEXT_CHARS:
+        raise ValueError(f"Text is longer than {MAX_TEXT_CHARS} characters")
+    return text, validate_voice(request.get("voice") or TTS_VOICE), request.get("request_id")
+
+async def send(websocket, data):
+    """Send one frame, waiting for the client to drain its buffer first if it is behind"""
+    try:
+        await asyncio.wait_for(websocket.send(data), TTS_SEND_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        state.slow_client_disconnects += 1
+        await websocket.close(1008, "Client is not reading audio")
+        raise websockets.exceptions.ConnectionClosedError(None, None)
+
+async def speak(websocket, message):
+    """Stream one utterance: a JSON audio_start, binary PCM frames, then a JSON audio_end"""
+    try:
+        text, voice, request_id = parse_speak_request(message)
+    except ValueError as e:
+        await send(websocket, json.dumps({"type": "error", "message": str(e)}))
+        return
+    stats = UtteranceStats()
+    await send(websocket, json.dumps({"type": "audio_start", "request_id": request_id, **pipeline.audio_format}))
+    try:
+        async for chunk in pipeline.stream(text, voice, stats):
+            await send(websocket, chunk)
+    except websockets.exceptions.ConnectionClosed:
+        raise
+    except Exception as e:
+        print(f"TTS synthesis failed: {e}")
+        await send(websocket, json.dumps({"type": "error", "request_id": request_id, "message": "Synthesis failed"}))
+        return
+    await send(websocket, json.dumps({
+        "type": "audio_end",
+        "request_id": request_id,
+        "chunks": stats.chunks,
+        "bytes": stats.audio_bytes,
+        "ttfa_ms": round(stats.ttfa_ms or 0.0, 1),
+        "rtf": stats.rtf,
+        "cached_sentences": stats.cached_sentences,
+    }))
+
+async def tts_websocket_handler(websocket):
     """Handle WebSocket connections for TTS streaming"""
-    print(f"New TTS WebSocket connection: {path}")
+    state.connections[websocket] = False
+    state.accepted += 1
+    state.peak_connections = max(state.peak_connections, len(state.connections))
     try:
         async for message in websocket:
-            # TODO: Implement actual TTS processing
-            response = {
-                "type": "tts_response",
-                "message": "TTS processing would happen here",
-                "audio_data": "base64_encoded_audio_placeholder"
-            }
-            await websocket.send(json.dumps(response))
+            state.connections[websocket] = True
+            try:
+                await speak(websocket, message)
+            finally:
+                state.connections[websocket] = False
+            if state.draining:
+                await websocket.close(1001, "Server is shutting down")
     except websockets.exceptions.ConnectionClosed:
-        print("TTS WebSocket connection closed")
+        pass
+    finally:
+        del state.connections[websocket]
+
+async def drain(server):
+    """Refuse new work, let utterances in progress finish, then close everything"""
+    state.draining = True
+    print(f"Draining {len(state.connections)} TTS connections ({state.speaking} speaking)...")
+    idle = [ws for ws, busy in state.connections.items() if not busy]
+    await asyncio.gather(*(ws.close(1001, "Server is shutting down") for ws in idle), return_exceptions=True)
+    deadline = time.monotonic() + TTS_DRAIN_SECONDS
+    while state.speaking and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    server.close()
+    await server.wait_closed()
 
-def start_http_server():
-    """Start HTTP server for health checks"""
-    server = HTTPServer(('0.0.0.0', 8180), TTSHandler)
-    print("HTTP server starting on port 8180")
-    server.serve_forever()
+async def prewarm_cache():
+    """Synthesize the fixed replies in the background so their first request is a cache hit"""
+    try:
+        warmed = await pipeline.prewarm(load_prewarm_phrases())
+        print(f"TTS cache pre-warmed {warmed} sentences ({pipeline.cache.stats()['entries']} cached)")
+    except Exception as e:
+        print(f"TTS cache pre-warm failed: {e}")
+
+async def start_server(port=MYCROFT_TTS_STREAM_PORT):
+    pipeline.cache.load()
+    pipeline.start()
+    print(f"TTS engine: {pipeline.engine.name} {pipeline.engine.version}, {pipeline.workers} workers")
+    server = await websockets.serve(
+        tts_websocket_handler,
+        "0.0.0.0",
+        port,
+        process_request=process_request,
+        # PCM barely compresses; deflate would only cost CPU per session
+        compression=None,
+        max_size=MAX_MESSAGE_BYTES,
+        max_queue=4,
+        write_limit=TTS_WRITE_LIMIT_BYTES,
+    )
+    print(f"TTS server listening on port {port} (WebSocket /tts_stream, HTTP /health and /metrics)")
+    return server
 
-def start_websocket_server():
-    """Start WebSocket server for TTS streaming"""
-    print("WebSocket server starting on port 8181")
-    start_server = websockets.serve(tts_websocket_handler, '0.0.0.0', 8181)
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
+async def serve(port=MYCROFT_TTS_STREAM_PORT):
+    """Run the server until SIGTERM or SIGINT, then drain it"""
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+    server = await start_server(port)
+    warm = asyncio.create_task(prewarm_cache())
+    try:
+        await stop
+    finally:
+        warm.cancel()
+        await drain(server)
+        pipeline.stop()
+        print("TTS server stopped")
 
 if __name__ == "__main__":
     print("Starting Mycroft TTS Server...")
-    
-    # Start HTTP server in a separate thread
-    http_thread = threading.Thread(target=start_http_server)
-    http_thread.daemon = True
-    http_thread.start()
-    
-    # Start WebSocket server (blocks)
-    start_websocket_server()
+    asyncio.run(serve())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Test script for the Mycroft TTS server
+Runs in-process on the sine-tone stand-in engine:
+
+    python test_tts.py    (or: python -m pytest test_tts.py)
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("TTS_ENGINE", "sine")
+os.environ.setdefault("TTS_SINE_RTF", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="tts-cache-test-"))
+
+import websockets
+
+import simple_tts_server
+from tts_cache import PhraseCache, cache_key
+from tts_engine import TTSPipeline, UtteranceStats, split_sentences
+
+def test_split_sentences_keeps_abbreviations_and_bullets():
+    text = "I'm Mr. Happy! I can help with:\n\n• Check wallet balance\n• Transfer money\n\nJust ask."
+    assert split_sentences(text) == ["I'm Mr. Happy!", "I can help with:", "Check wallet balance", "Transfer money", "Just ask."]
+
+def test_long_sentences_are_split():
+    sentences = split_sentences("word, " * 200)
+    assert len(sentences) > 1
+    assert all(len(s) <= 250 for s in sentences)
+
+def test_pipeline_streams_sentences_in_order():
+    async def scenario():
+        pipeline = TTSPipeline("sine", workers=2, chunk_bytes=1000)
+        pipeline.start()
+        whole = b"".join([bytes(c) async for c in pipeline.stream("Hello there. Bye now.")])
+        stats = UtteranceStats()
+        chunks = [bytes(c) async for c in pipeline.stream("Hello there. Bye now.", stats=stats)]
+        first = b"".join([bytes(c) async for c in pipeline.stream("Hello there.")])
+        pipeline.stop()
+        return whole, chunks, stats, first, pipeline.metrics
+
+    whole, chunks, stats, first, metrics = asyncio.run(scenario())
+    assert b"".join(chunks) == whole and whole.startswith(first)
+    assert max(len(c) for c in chunks) == 1000 and all(len(c) % 2 == 0 for c in chunks)
+    assert stats.ttfa_ms is not None and stats.audio_bytes == len(whole)
+    assert metrics.utterances == 3 and metrics.sentences == 5
+
+async def start_test_server():
+    simple_tts_server.state = simple_tts_server.ServerState()
+    server = await simple_tts_server.start_server(0)
+    return server, server.sockets[0].getsockname()[1]
+
+async def http_get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split()[1]), json.loads(body)
+
+async def speak_and_collect(ws, text, request_id=None):
+    await ws.send(json.dumps({"text": text, "request_id": request_id}))
+    frames = []
+    while True:
+        frame = await ws.recv()
+        frames.append(frame)
+        if isinstance(frame, str) and json.loads(frame)["type"] in ("audio_end", "error"):
+            return frames
+
+def test_websocket_streams_binary_audio():
+    async def scenario():
+        server, port = await start_test_server()
+        async with websockets.connect(f"ws://127.0.0.1:{port}/tts_stream") as ws:
+            frames = await speak_and_collect(ws, "Your balance is ready. Anything else?", "r1")
+            await ws.send(json.dumps({"text": "hi", "voice": "--help"}))
+            error = json.loads(await ws.recv())
+        await simple_tts_server.drain(server)
+        simple_tts_server.pipeline.stop()
+        return frames, error
+
+    frames, error = asyncio.run(scenario())
+    start, audio, end = json.loads(frames[0]), frames[1:-1], json.loads(frames[-1])
+    assert start["type"] == "audio_start" and start["format"] == "pcm_s16le" and start["request_id"] == "r1"
+    assert audio and all(isinstance(frame, bytes) for frame in audio)
+    assert end["bytes"] == sum(len(frame) for frame in audio) and end["chunks"] == len(audio)
+    assert error["type"] == "error"
+
+def test_http_is_served_on_the_stream_port():
+    async def scenario():
+        server, port = await start_test_server()
+        async with websockets.connect(f"ws://127.0.0.1:{port}/tts_stream") as ws:
+            await speak_and_collect(ws, "Hello.")
+            health = await http_get(port, "/health")
+            metrics = await http_get(port, "/metrics")
+        await simple_tts_server.drain(server)
+        simple_tts_server.pipeline.stop()
+        return health, metrics
+
+    health, metrics = asyncio.run(scenario())
+    assert health == (200, {"status": "ok", "service": "mycroft-tts"})
+    assert metrics[0] == 200
+    assert metrics[1]["server"]["connections"] == 1 and metrics[1]["tts"]["utterances"] >= 1
+
+def test_connections_over_the_limit_are_refused():
+    async def scenario():
+        limit = simple_tts_server.TTS_MAX_CONNECTIONS
+        simple_tts_server.TTS_MAX_CONNECTIONS = 1
+        server, port = await start_test_server()
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/tts_stream"):
+                try:
+                    async with websockets.connect(f"ws://127.0.0.1:{port}/tts_stream"):
+                        status = 101
+                except websockets.exceptions.InvalidStatusCode as e:
+                    status = e.status_code
+        finally:
+            simple_tts_server.TTS_MAX_CONNECTIONS = limit
+            await simple_tts_server.drain(server)
+            simple_tts_server.pipeline.stop()
+        return status, simple_tts_server.state.rejected
+
+    status, rejected = asyncio.run(scenario())
+    assert status == 503 and rejected == 1
+
+def test_drain_finishes_utterances_in_progress():
+    async def scenario():
+        server, port = await start_test_server()
+        async with websockets.connect(f"ws://127.0.0.1:{port}/tts_stream") as speaking, \
+                websockets.connect(f"ws://127.0.0.1:{port}/tts_stream") as idle:
+            await speaking.send(json.dumps({"text": "One. Two. Three. Four. Five."}))
+            assert json.loads(await speaking.recv())["type"] == "audio_start"
+            draining = asyncio.create_task(simple_tts_server.drain(server))
+            await asyncio.sleep(0)
+            health = await http_get(port, "/health")
+            frames = []
+            async for frame in speaking:
+                frames.append(frame)
+            await draining
+            await idle.wait_closed()
+        simple_tts_server.pipeline.stop()
+        return health, frames, speaking.close_code, idle.close_code
+
+    health, frames, speaking_code, idle_code = asyncio.run(scenario())
+    assert health[0] == 503
+    assert json.loads(frames[-1])["type"] == "audio_end"
+    assert speaking_code == 1001 and idle_code == 1001
+
+def test_cache_key_covers_voice_format_and_engine():
+    key = cache_key("Hello  there.", "en-us", "pcm_s16le", "sine:1")
+    assert key == cache_key("Hello there.", "en-us", "pcm_s16le", "sine:1")
+    assert key != cache_key("Hello there.", "en-gb", "pcm_s16le", "sine:1")
+    assert key != cache_key("Hello there.", "en-us", "pcm_s16le", "sine:2")
+
+def test_cache_evicts_least_recently_used():
+    directory = tempfile.mkdtemp(prefix="tts-cache-test-")
+    cache = PhraseCache(directory, max_bytes=250)
+    for key in ("a" * 64, "b" * 64):
+        cache.put(key, bytes(100))
+        time.sleep(0.01)
+    assert cache.get("a" * 64) is not None
+    cache.put("c" * 64, bytes(100))
+    assert "b" * 64 not in cache and "a" * 64 in cache
+    assert cache.stats()["evictions"] == 1 and cache.bytes_used == 200
+
+    # A restart rebuilds the index from disk in the same LRU order
+    open(os.path.join(directory, "aa", "junk.tmp"), "wb").close()
+    reloaded = PhraseCache(directory, max_bytes=150)
+    reloaded.load()
+    assert "c" * 64 in reloaded and "a" * 64 not in reloaded
+    assert bytes(reloaded.get("c" * 64)) == bytes(100)
+    assert not os.path.exists(os.path.join(directory, "aa", "junk.tmp"))
+
+def test_cached_sentences_skip_synthesis():
+    async def scenario():
+        cache = PhraseCache(tempfile.mkdtemp(prefix="tts-cache-test-"))
+        cache.load()
+        pipeline = TTSPipeline("sine", workers=1, cache=cache)
+        pipeline.start()
+        warmed = await pipeline.prewarm(["Please try again in a moment."])
+        cold = UtteranceStats()
+        first = b"".join([bytes(c) async for c in pipeline.stream("Hello there. Please try again in a moment.", stats=cold)])
+        warm = UtteranceStats()
+        second = b"".join([bytes(c) async for c in pipeline.stream("Hello there. Please try again in a moment.", stats=warm)])
+        pipeline.stop()
+        return warmed, first, second, cold, warm, cache
+
+    warmed, first, second, cold, warm, cache = asyncio.run(scenario())
+    assert warmed == 1
+    assert first == second
+    assert cold.cached_sentences == 1 and warm.cached_sentences == 2
+    assert warm.synthesis_seconds == 0.0
+    assert cache.stats()["entries"] == 2
+
+def test_prewarm_shares_synthesis_with_streams_and_keeps_cache_io_off_the_loop():
+    syntheses = []
+    cache_threads = set()
+
+    async def scenario():
+        cache = PhraseCache(tempfile.mkdtemp(prefix="tts-cache-test-"))
+        cache.load()
+        for name in ("get", "put"):
+            method = getattr(cache, name)
+            def recorded(*args, method=method):
+                cache_threads.add(threading.current_thread())
+                return method(*args)
+            setattr(cache, name, recorded)
+        pipeline = TTSPipeline("sine", workers=2, cache=cache)
+        synthesize_and_store = pipeline._synthesize_and_store
+        async def counted(sentence, voice, key):
+            syntheses.append(sentence)
+            return await synthesize_and_store(sentence, voice, key)
+        pipeline._synthesize_and_store = counted
+        pipeline.start()
+        # A cold request arrives while the same phrase is being pre-warmed
+        warmed, chunks = await asyncio.gather(
+            pipeline.prewarm(["Please try again in a moment."]),
+            collect(pipeline.stream("Please try again in a moment.")),
+        )
+        pipeline.stop()
+        return warmed, chunks, cache
+
+    warmed, chunks, cache = asyncio.run(scenario())
+    assert warmed == 1 and chunks
+    assert syntheses == ["Please try again in a moment."]
+    assert cache.stats()["stores"] == 1
+    assert cache_threads and threading.main_thread() not in cache_threads
+
+async def collect(stream):
+    return [bytes(chunk) async for chunk in stream]
+
+if __name__ == "__main__":
+    print("🧪 Testing Mycroft TTS...")
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n🎉 All Mycroft TTS tests completed!")
@@ -0,0 +1,143 @@
+"""
+Content-addressed phrase cache for synthesized speech
+The assistant repeats a small set of fixed sentences ("I'm having trouble
+accessing your wallet right now.", the help text, ...), so synthesized PCM is
+stored on disk under a hash of (text, voice, audio format, engine and engine
+version): changing any of them is a different entry, and upgrading the engine
+never serves stale audio. Hits are read through mmap and streamed as slices
+of the mapping, so cached audio reaches the socket without being copied into
+Python objects or re-encoded. The directory is capped at TTS_CACHE_MAX_BYTES
+with least-recently-used eviction; file mtimes carry the LRU order across
+restarts.
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Configuration
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/tmp/mycroft-tts-cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+TTS_PREWARM_FILE = os.getenv("TTS_PREWARM_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_prewarm.txt"))
+SUFFIX = ".pcm"
+
+def cache_key(text: str, voice: str, audio_format: str, engine_id: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256("\0".join([normalized, voice, audio_format, engine_id]).encode()).hexdigest()
+
+def load_prewarm_phrases(path: str = TTS_PREWARM_FILE) -> List[str]:
+    """Non-empty, non-comment lines of the pre-warm file"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+class PhraseCache:
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        # get/put run on executor threads, so index bookkeeping is serialised
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + SUFFIX)
+
+    def load(self):
+        """Index what is already on disk, least recently used first"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if not name.endswith(SUFFIX):
+                    # Leftover temporary file from an interrupted write
+                    os.unlink(path)
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-len(SUFFIX)], stat.st_size))
+        self._index.clear()
+        self.bytes_used = 0
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.bytes_used += size
+        self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def get(self, key: str) -> Optional[mmap.mmap]:
+        """A read-only mapping of the cached PCM, or None"""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.bytes_used -= self._index.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+            self.hits += 1
+            self.bytes_served += len(mapping)
+        return mapping
+
+    def put(self, key: str, pcm: bytes):
+        if not pcm or len(pcm) > self.max_bytes or key in self._index:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never map a half-written file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pcm)
+        os.replace(temp_path, path)
+        with self._lock:
+            if key in self._index:
+                return
+            self._index[key] = len(pcm)
+            self.bytes_used += len(pcm)
+            self.stores += 1
+            self._evict()
+
+    def _evict(self):
+        while self.bytes_used > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self.bytes_used -= size
+            self.evictions += 1
+            try:
+                # Mappings already streaming from the file stay valid after unlink
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bytes_served": self.bytes_served,
+        }
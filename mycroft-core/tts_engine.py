@@ -0,0 +1,341 @@
+"""
+Text-to-speech pipeline for Mr. Happy's voice stream
+Text is split into sentences, which are synthesized on a pool of worker
+processes while earlier sentences are already streaming: the client gets its
+first audio once the first sentence is done instead of after the whole
+utterance. Sentences found in the phrase cache (tts_cache.py) skip the
+workers entirely. Audio is raw 16-bit mono PCM cut into fixed-size chunks (the last
+chunk of each sentence may be shorter) so it can go out as binary WebSocket
+frames without any base64 or container overhead.
+
+Engines are pluggable: espeak-ng when it is installed, otherwise a sine-tone
+stand-in that burns CPU at a configurable real-time factor so latency and
+concurrency can be measured without a real voice.
+"""
+
+import array
+import asyncio
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple
+
+from tts_cache import PhraseCache, cache_key
+
+# Configuration
+TTS_ENGINE = os.getenv("TTS_ENGINE", "auto")  # auto, espeak-ng or sine
+TTS_VOICE = os.getenv("TTS_VOICE", "en-us")
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", str(os.cpu_count() or 1)))
+TTS_CHUNK_BYTES = int(os.getenv("TTS_CHUNK_BYTES", "4096"))
+TTS_LOOKAHEAD_SENTENCES = int(os.getenv("TTS_LOOKAHEAD_SENTENCES", "2"))
+TTS_SINE_RTF = float(os.getenv("TTS_SINE_RTF", "0.15"))
+SAMPLE_RATE = 22050
+AUDIO_FORMAT = "pcm_s16le"
+MAX_TEXT_CHARS = 5000
+MAX_SENTENCE_CHARS = 250
+SAMPLE_WINDOW = 10000
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\s*\n+\s*")
+_ABBREVIATION = re.compile(r"\b(Mr|Mrs|Ms|Dr|Prof|St|Rs|vs|etc|e\.g|i\.e|No)\.$", re.I)
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+_BULLET = re.compile(r"^[•\-*]\s*")
+# Must not start with "-", or espeak-ng would read it as an option
+_VOICE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_+-]{0,31}$")
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences (and bullet lines) of text, with overlong ones split at clauses, then words"""
+    parts = []
+    for part in _SENTENCE_END.split(text):
+        part = _BULLET.sub("", part.strip())
+        if not part:
+            continue
+        # "Mr. Happy" is one sentence
+        if parts and _ABBREVIATION.search(parts[-1]):
+            parts[-1] += " " + part
+        else:
+            parts.append(part)
+    sentences = []
+    for part in parts:
+        if len(part) <= MAX_SENTENCE_CHARS:
+            sentences.append(part)
+            continue
+        current = ""
+        for piece in _CLAUSE_END.split(part):
+            for word in piece.split(" ") if len(piece) > MAX_SENTENCE_CHARS else [piece]:
+                if current and len(current) + 1 + len(word) > MAX_SENTENCE_CHARS:
+                    sentences.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}" if current else word
+        if current:
+            sentences.append(current)
+    return sentences
+
+def validate_voice(voice: str) -> str:
+    if not _VOICE.match(voice):
+        raise ValueError(f"Invalid voice: {voice!r}")
+    return voice
+
+def pcm_duration(pcm_bytes: int, sample_rate: int = SAMPLE_RATE) -> float:
+    return pcm_bytes / 2.0 / sample_rate
+
+class SineEngine:
+    """CPU stand-in for a neural voice: a tone per letter, paced to a target real-time factor"""
+
+    name = "sine"
+    version = "1"
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, rtf: float = TTS_SINE_RTF):
+        self.rtf = rtf
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        started = time.perf_counter()
+        base = 110 + sum(map(ord, voice)) % 80
+        letter = int(self.sample_rate * 0.06)
+        samples = array.array("h")
+        for char in text:
+            if char.isspace() or not char.isalnum():
+                samples.extend([0] * letter)
+                continue
+            step = 2 * math.pi * (base + (ord(char.lower()) % 26) * 9) / self.sample_rate
+            samples.extend(int(8000 * math.sin(i * step) * math.sin(math.pi * i / letter)) for i in range(letter))
+        # Busy-wait rather than sleep: a real engine occupies the core
+        deadline = started + len(samples) / self.sample_rate * self.rtf
+        spin = 0.0
+        while time.perf_counter() < deadline:
+            spin = math.sqrt(spin + 1.0)
+        return samples.tobytes()
+
+class EspeakEngine:
+    name = "espeak-ng"
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng")
+        if self.binary is None:
+            raise RuntimeError("espeak-ng is not installed")
+        output = subprocess.run([self.binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+        self.version = output.split()[3] if len(output.split()) > 3 else output.strip()
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        wav = subprocess.run(
+            [self.binary, "--stdout", "-v", voice], input=text.encode(), capture_output=True, timeout=30, check=True
+        ).stdout
+        # espeak-ng writes a WAV header (22050 Hz mono s16) and cannot know the
+        # data length up front when streaming, so locate the data chunk by name
+        data = wav.find(b"data")
+        if data < 0:
+            raise RuntimeError("espeak-ng returned no audio")
+        return wav[data + 8:]
+
+ENGINES = {"sine": SineEngine, "espeak-ng": EspeakEngine}
+
+def create_engine(name: str = TTS_ENGINE):
+    if name == "auto":
+        name = "espeak-ng" if shutil.which("espeak-ng") else "sine"
+    if name not in ENGINES:
+        raise ValueError(f"Unknown TTS engine: {name}")
+    return ENGINES[name]()
+
+# --- worker processes ---
+
+_worker_engine = None
+
+def _init_worker(engine_name: str):
+    global _worker_engine
+    _worker_engine = create_engine(engine_name)
+
+def _synthesize(text: str, voice: str) -> Tuple[bytes, float]:
+    started = time.perf_counter()
+    pcm = _worker_engine.synthesize(text, voice)
+    return pcm, time.perf_counter() - started
+
+class TTSMetrics:
+    def __init__(self):
+        self.utterances = 0
+        self.sentences = 0
+        self.cached_sentences = 0
+        self.failures = 0
+        self.audio_seconds = 0.0
+        self.synthesis_seconds = 0.0
+        self.ttfa_ms: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+        self.rtf: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def summary(self) -> Dict:
+        return {
+            "utterances": self.utterances,
+            "sentences": self.sentences,
+            "cached_sentences": self.cached_sentences,
+            "failures": self.failures,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "synthesis_seconds": round(self.synthesis_seconds, 2),
+            "ttfa_ms_p50": percentile(self.ttfa_ms, 50),
+            "ttfa_ms_p95": percentile(self.ttfa_ms, 95),
+            "rtf_p50": percentile(self.rtf, 50),
+            "rtf_p95": percentile(self.rtf, 95),
+        }
+
+def percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))], 3)
+
+class UtteranceStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ttfa_ms: Optional[float] = None
+        self.audio_bytes = 0
+        self.synthesis_seconds = 0.0
+        self.chunks = 0
+        self.cached_sentences = 0
+
+    @property
+    def rtf(self) -> Optional[float]:
+        audio = pcm_duration(self.audio_bytes)
+        return round(self.synthesis_seconds / audio, 4) if audio else None
+
+class TTSPipeline:
+    def __init__(
+        self,
+        engine_name: str = TTS_ENGINE,
+        workers: int = TTS_WORKERS,
+        chunk_bytes: int = TTS_CHUNK_BYTES,
+        lookahead: int = TTS_LOOKAHEAD_SENTENCES,
+        cache: Optional[PhraseCache] = None,
+    ):
+        self.engine = create_engine(engine_name)
+        self.cache = cache
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.workers = workers
+        # Whole samples only, so every chunk is independently playable
+        self.chunk_bytes = chunk_bytes - chunk_bytes % 2
+        self.lookahead = lookahead
+        self.metrics = TTSMetrics()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def audio_format(self) -> Dict:
+        return {"format": AUDIO_FORMAT, "sample_rate": self.engine.sample_rate, "channels": 1}
+
+    def start(self):
+        if self._executor is None:
+            # Workers must not be forked from the server: they would inherit its
+            # sockets and keep closed client connections half-open
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=context, initializer=_init_worker, initargs=(self.engine.name,)
+            )
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _key(self, sentence: str, voice: str) -> str:
+        return cache_key(sentence, voice, AUDIO_FORMAT, f"{self.engine.name}:{self.engine.version}")
+
+    async def _synthesize_and_store(self, sentence: str, voice: str, key: str) -> Tuple[bytes, float, bool]:
+        loop = asyncio.get_running_loop()
+        pcm, seconds = await loop.run_in_executor(self._executor, _synthesize, sentence, voice)
+        # File writes and evictions stay off the loop serving other sessions
+        await loop.run_in_executor(None, self.cache.put, key, pcm)
+        return pcm, seconds, False
+
+    async def _cached_or_synthesize(self, sentence: str, voice: str) -> Tuple[bytes, float, bool]:
+        key = self._key(sentence, voice)
+        task = self._in_flight.get(key)
+        if task is None:
+            mapping = await asyncio.get_running_loop().run_in_executor(None, self.cache.get, key)
+            if mapping is not None:
+                return mapping, 0.0, True
+            # Sessions asking for the same uncached sentence at once share one synthesis
+            task = self._in_flight.get(key)
+            if task is None:
+                task = self._in_flight[key] = asyncio.ensure_future(self._synthesize_and_store(sentence, voice, key))
+                task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _submit(self, sentence: str, voice: str) -> asyncio.Future:
+        """Future of (pcm, synthesis seconds, cached) for one sentence"""
+        if self.cache is None:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, _synthesize, sentence, voice)
+            return asyncio.ensure_future(_not_cached(future))
+        return asyncio.ensure_future(self._cached_or_synthesize(sentence, voice))
+
+    async def prewarm(self, phrases: Iterable[str], voice: str = TTS_VOICE) -> int:
+        """Synthesize and cache every sentence of phrases that is not cached yet"""
+        if self.cache is None:
+            return 0
+        missing = list(dict.fromkeys(
+            sentence for phrase in phrases for sentence in split_sentences(phrase)
+            if self._key(sentence, voice) not in self.cache
+        ))
+        slots = asyncio.Semaphore(self.workers)
+
+        async def warm(sentence):
+            # Same single-flight path as streaming, so a cold request joins this synthesis
+            async with slots:
+                await self._submit(sentence, voice)
+
+        await asyncio.gather(*(warm(sentence) for sentence in missing))
+        return len(missing)
+
+    async def stream(self, text: str, voice: str = TTS_VOICE, stats: Optional[UtteranceStats] = None) -> AsyncIterator[memoryview]:
+        """Yield PCM chunks for text in order, synthesizing up to `lookahead` sentences ahead of playback"""
+        if len(text) > MAX_TEXT_CHARS:
+            raise ValueError(f"Text is longer than {MAX_TEXT_CHARS} characters")
+        validate_voice(voice)
+        stats = stats or UtteranceStats()
+        sentences = deque(split_sentences(text))
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            while sentences and len(pending) <= self.lookahead:
+                pending.append(self._submit(sentences.popleft(), voice))
+            while pending:
+                try:
+                    pcm, seconds, cached = await pending.popleft()
+                except Exception:
+                    self.metrics.failures += 1
+                    raise
+                if sentences:
+                    pending.append(self._submit(sentences.popleft(), voice))
+                stats.synthesis_seconds += seconds
+                self.metrics.sentences += 1
+                if cached:
+                    stats.cached_sentences += 1
+                    self.metrics.cached_sentences += 1
+                # Cached audio is sliced straight out of the file mapping, which
+                # is unmapped once the last slice has been sent and released
+                for chunk in self.chunks(pcm):
+                    if stats.ttfa_ms is None:
+                        stats.ttfa_ms = (time.perf_counter() - stats.started) * 1000
+                        self.metrics.ttfa_ms.append(stats.ttfa_ms)
+                    stats.audio_bytes += len(chunk)
+                    stats.chunks += 1
+                    yield chunk
+        finally:
+            # The listener went away or synthesis failed: drop queued sentences
+            for future in pending:
+                future.cancel()
+        self.metrics.utterances += 1
+        self.metrics.audio_seconds += pcm_duration(stats.audio_bytes)
+        self.metrics.synthesis_seconds += stats.synthesis_seconds
+        if stats.rtf is not None:
+            self.metrics.rtf.append(stats.rtf)
+
+    def chunks(self, pcm) -> List[memoryview]:
+        view = memoryview(pcm)
+        return [view[offset:offset + self.chunk_bytes] for offset in range(0, len(view), self.chunk_bytes)]
+
+async def _not_cached(future) -> Tuple[bytes, float, bool]:
+    pcm, seconds = await future
+    return pcm, seconds, False
@@ -0,0 +1,161 @@
+"""
+Dynamic micro-batching for NLU inference.
+
+Concurrent requests are queued and collected into batches of up to
+``max_batch_size`` items, waiting at most ``max_wait_ms`` after the first item
+arrives. Each batch runs as one forward pass on a thread pool so the event
+loop keeps serving requests while the model is busy.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Configuration
+MAX_BATCH_SIZE = int(os.getenv("NLU_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("NLU_MAX_WAIT_MS", "5"))
+MAX_QUEUE_SIZE = int(os.getenv("NLU_MAX_QUEUE_SIZE", "1024"))
+INFERENCE_WORKERS = int(os.getenv("NLU_INFERENCE_WORKERS", "1"))
+
+class BatcherOverloaded(Exception):
+    """Raised when the request queue is full"""
+
+class MicroBatcher:
+    def __init__(
+        self,
+        handler: Callable[[List[str]], List[Dict]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        workers: int = INFERENCE_WORKERS,
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self.batches = 0
+        self.items = 0
+        self.inference_seconds = 0.0
+
+    async def start(self):
+        """Start the batch collection loop on the running event loop"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nlu-infer")
+        self._task = asyncio.create_task(self._collect_loop())
+
+    async def stop(self):
+        """Stop collecting, finish in-flight batches and release the workers"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._queue:
+            pending = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._fail(pending, BatcherOverloaded("NLU engine is shutting down"))
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, text: str) -> Dict:
+        """Queue one text for inference and wait for its result"""
+        if self._task is None:
+            # Nothing would ever collect it
+            raise BatcherOverloaded("NLU engine is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future))
+        except asyncio.QueueFull:
+            raise BatcherOverloaded("NLU request queue is full")
+        return await future
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "avg_batch_ms": round(self.inference_seconds * 1000.0 / self.batches, 2) if self.batches else 0.0,
+        }
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Only start collecting once a worker is free: while all workers are
+            # busy, requests pile up in the queue and the next batch grows.
+            await self._slots.acquire()
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                # Cancelled mid-collection: the partial batch is no longer in the queue,
+                # so stop() cannot see it; fail its callers here instead of leaving them hanging
+                self._fail(batch, BatcherOverloaded("NLU engine is shutting down"))
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            # Skip requests whose callers have already gone away
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                return
+            texts = [text for text, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.handler, texts
+                )
+            except Exception as e:
+                self._fail(batch, e)
+                return
+            finally:
+                self.inference_seconds += time.perf_counter() - started
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
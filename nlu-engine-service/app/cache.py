@@ -0,0 +1,131 @@
+"""
+Result cache for NLU analysis.
+
+Entries are keyed by normalised text plus the model version, bounded by an
+LRU size limit and a TTL. Lookups are single-flight: concurrent requests for
+the same key share one inference instead of each queueing their own.
+"""
+
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# Configuration
+CACHE_ENABLED = os.getenv("NLU_CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("NLU_CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("NLU_CACHE_TTL_SECONDS", "3600"))
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = re.compile(r"^[\s.,!?;:'\"]+|[\s.,!?;:'\"]+$")
+
+def normalize_text(text: str) -> str:
+    """Case-fold, unify unicode forms and collapse whitespace and edge punctuation"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _EDGE_PUNCTUATION.sub("", text)
+    return _WHITESPACE.sub(" ", text)
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        enabled: bool = CACHE_ENABLED,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Tuple[str, str], value: Dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(
+        self,
+        normalized_text: str,
+        model_version: str,
+        compute: Callable[[str], Awaitable[Dict]],
+    ) -> Dict:
+        """Return the cached result for this key, joining an in-flight computation if any"""
+        if not self.enabled:
+            self.misses += 1
+            return await compute(normalized_text)
+
+        key = (model_version, normalized_text)
+        value = self._lookup(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute(key, normalized_text, compute, self._generation))
+            self._inflight[key] = task
+        # Shield so a caller going away does not cancel the shared computation
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, normalized_text, compute, generation: int) -> Dict:
+        # The generation is taken when the lookup misses, not when this task first runs,
+        # so an invalidation in between is still seen
+        try:
+            value = await compute(normalized_text)
+            # Results computed before an invalidation must not repopulate the cache
+            if generation == self._generation:
+                self._store(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self):
+        """Drop every entry, e.g. after a model reload"""
+        self._entries.clear()
+        self._inflight.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,309 @@
+"""
+CPU intent classifier for the NLU engine.
+
+Intents are scored by comparing a mean-pooled sentence embedding of the input
+with prototype embeddings built from a few example phrases per intent, so any
+small encoder checkpoint can be used without fine-tuning.
+
+Weights are exported once into a local snapshot and then memory-mapped by
+every worker process, so uvicorn workers share the same page-cache pages
+instead of each holding a private copy of the model.
+
+The encoder runs in one of three modes chosen at startup: ``fp32`` (plain
+PyTorch), ``int8`` (dynamic quantization of the Linear layers) or ``onnx``
+(an ONNX export of the encoder run by onnxruntime). If the int8 or onnx
+runtime is unavailable the engine logs why and falls back to fp32.
+"""
+
+import fcntl
+import inspect
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+import torch
+from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+from .entities import extract_entities
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+MODEL_NAME = os.getenv("NLU_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+MAX_SEQ_LENGTH = int(os.getenv("NLU_MAX_SEQ_LENGTH", "64"))
+INFERENCE_THREADS = int(os.getenv("NLU_INFERENCE_THREADS", "2"))
+MIN_INTENT_SCORE = float(os.getenv("NLU_MIN_INTENT_SCORE", "0.35"))
+MODEL_CACHE_DIR = os.getenv("NLU_MODEL_CACHE_DIR", "/tmp/nlu-model-cache")
+MMAP_WEIGHTS = os.getenv("NLU_MMAP_WEIGHTS", "true").lower() == "true"
+INFERENCE_MODE = os.getenv("NLU_INFERENCE_MODE", "fp32").lower()
+INFERENCE_MODES = ("fp32", "int8", "onnx")
+ONNX_OPSET = 14
+SOFTMAX_TEMPERATURE = 0.05
+
+FALLBACK_INTENT = "general_conversation"
+
+# Example phrases per intent; intent names line up with the SDK handlers
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "wallet_balance": [
+        "check my balance",
+        "what is my wallet balance",
+        "how many happy coins do I have",
+        "show me my wallet",
+        "how much money is in my account",
+    ],
+    "transfer": [
+        "send money to my friend",
+        "transfer 500 to Rahul",
+        "I want to send happy paisa",
+        "move funds to another user",
+        "pay back my friend 200 coins",
+    ],
+    "payment": [
+        "pay my electricity bill",
+        "make a payment",
+        "I need to pay for my order",
+        "recharge my phone",
+        "buy more happy coins",
+    ],
+    "card": [
+        "create a virtual card",
+        "show my virtual cards",
+        "block my card",
+        "what are my card transactions",
+        "change my card pin",
+    ],
+    "help": [
+        "help",
+        "what can you do",
+        "how does this work",
+        "show me the menu",
+        "I need assistance",
+    ],
+    "transaction_history": [
+        "show my recent transactions",
+        "how much did I spend this month",
+        "view my transaction history",
+        "what did I buy last week",
+        "list my payments",
+    ],
+}
+
+class IntentEngine:
+    """Batched intent classification and entity extraction on CPU"""
+
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        max_seq_length: int = MAX_SEQ_LENGTH,
+        num_threads: int = INFERENCE_THREADS,
+        mode: str = INFERENCE_MODE,
+    ):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown NLU inference mode {mode!r}, expected one of {INFERENCE_MODES}")
+        self.model_name = model_name
+        self.mode = mode
+        self.requested_mode = mode
+        self.fallback_reason: Optional[str] = None
+        self.max_seq_length = max_seq_length
+        self.num_threads = num_threads
+        self.tokenizer = None
+        self.model = None
+        self.onnx_session = None
+        self.intent_labels: List[str] = list(INTENT_EXAMPLES)
+        self.prototypes = None
+        self.state = "idle"
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.prototypes is not None
+
+    def snapshot_dir(self) -> str:
+        """Directory holding the mmap-ready export of the configured model"""
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", self.model_name.strip("/"))
+        return os.path.join(MODEL_CACHE_DIR, slug)
+
+    @property
+    def model_version(self) -> str:
+        return f"{self.model_name}@{self.mode}"
+
+    def _export_once(self, path: str, export: Callable[[str], None]):
+        """Run `export(tmp_path)` unless `path` exists; concurrent workers wait on a file lock"""
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(os.path.join(os.path.dirname(path), ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(path):
+                    # Write to a temp name first so other workers never see a partial file
+                    export(path + ".tmp")
+                    os.replace(path + ".tmp", path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def prepare_snapshot(self) -> str:
+        """Export config, tokenizer and weights once into the shared snapshot directory"""
+        snapshot = self.snapshot_dir()
+
+        def export_weights(tmp_path: str):
+            model = AutoModel.from_pretrained(self.model_name)
+            model.config.save_pretrained(snapshot)
+            AutoTokenizer.from_pretrained(self.model_name).save_pretrained(snapshot)
+            torch.save(model.state_dict(), tmp_path)
+
+        self._export_once(os.path.join(snapshot, "weights.pt"), export_weights)
+        return snapshot
+
+    def _load_onnx_session(self, tokenizer):
+        import onnxruntime
+
+        onnx_path = os.path.join(self.snapshot_dir(), "model.onnx")
+
+        def export_onnx(tmp_path: str):
+            _, model = self._load_model()
+            model.eval()
+            sample = tokenizer(["check my balance"], return_tensors="pt")
+            input_names = list(sample.keys())
+            dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+            dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+            export_options = {}
+            if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+                # Newer torch releases default to the dynamo exporter, which ignores dynamic_axes
+                export_options["dynamo"] = False
+            with torch.no_grad():
+                torch.onnx.export(
+                    _LastHiddenState(model, input_names),
+                    tuple(sample[name] for name in input_names),
+                    tmp_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=ONNX_OPSET,
+                    **export_options,
+                )
+
+        self.prepare_snapshot()
+        self._export_once(onnx_path, export_onnx)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        return onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def _load_model(self):
+        if not MMAP_WEIGHTS:
+            return AutoTokenizer.from_pretrained(self.model_name), AutoModel.from_pretrained(self.model_name)
+
+        snapshot = self.prepare_snapshot()
+        model = AutoModel.from_config(AutoConfig.from_pretrained(snapshot))
+        state_dict = torch.load(os.path.join(snapshot, "weights.pt"), mmap=True, weights_only=True)
+        # assign=True keeps the mmap-backed tensors instead of copying them into
+        # the freshly initialised parameters, which are released right away
+        model.load_state_dict(state_dict, assign=True)
+        return AutoTokenizer.from_pretrained(snapshot), model
+
+    def load(self):
+        """Load tokenizer and weights, then embed the intent prototypes"""
+        self.state = "loading"
+        started = time.perf_counter()
+        try:
+            torch.set_num_threads(self.num_threads)
+            if self.mode == "onnx":
+                try:
+                    self.tokenizer = AutoTokenizer.from_pretrained(self.prepare_snapshot())
+                    self.onnx_session = self._load_onnx_session(self.tokenizer)
+                except Exception as e:
+                    self._fall_back(e)
+            if self.onnx_session is None:
+                self.tokenizer, self.model = self._load_model()
+                self.model.eval()
+                if self.mode == "int8":
+                    try:
+                        # Quantized Linear weights are private to this worker; embeddings
+                        # and layer norms stay on the shared mmap pages
+                        self.model = torch.ao.quantization.quantize_dynamic(
+                            self.model, {torch.nn.Linear}, dtype=torch.qint8
+                        )
+                    except Exception as e:
+                        self._fall_back(e)
+            self._build_prototypes()
+        except Exception as e:
+            self.state = "failed"
+            self.load_error = str(e)
+            raise
+        self.load_seconds = time.perf_counter() - started
+        self.state = "ready"
+
+    def _fall_back(self, error: Exception):
+        """Switch to fp32 when the requested runtime cannot be used, keeping the reason"""
+        logger.warning(f"NLU {self.mode} inference unavailable, falling back to fp32: {error}")
+        self.fallback_reason = f"{self.mode}: {error}"
+        self.mode = "fp32"
+
+    def _build_prototypes(self):
+        prototypes = []
+        for label in self.intent_labels:
+            examples = self.embed(INTENT_EXAMPLES[label])
+            prototypes.append(torch.nn.functional.normalize(examples.mean(dim=0), dim=0))
+        self.prototypes = torch.stack(prototypes)
+
+    def embed(self, texts: List[str]) -> torch.Tensor:
+        """Return L2-normalised mean-pooled embeddings for a batch of texts"""
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="pt",
+        )
+        if self.onnx_session is not None:
+            feeds = {
+                node.name: encoded[node.name].numpy()
+                for node in self.onnx_session.get_inputs()
+            }
+            hidden = torch.from_numpy(self.onnx_session.run(["last_hidden_state"], feeds)[0])
+        else:
+            with torch.inference_mode():
+                hidden = self.model(**encoded).last_hidden_state
+        mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return torch.nn.functional.normalize(pooled, dim=1)
+
+    def analyze_batch(self, texts: List[str]) -> List[Dict]:
+        """Classify a batch of texts in a single forward pass"""
+        if not self.is_loaded:
+            raise RuntimeError("Intent model is not loaded")
+
+        similarities = self.embed(texts) @ self.prototypes.T
+        probabilities = torch.softmax(similarities / SOFTMAX_TEMPERATURE, dim=1)
+
+        results = []
+        for text, sims, probs in zip(texts, similarities.tolist(), probabilities.tolist()):
+            best = max(range(len(self.intent_labels)), key=lambda i: sims[i])
+            if sims[best] >= MIN_INTENT_SCORE:
+                intent, confidence = self.intent_labels[best], probs[best]
+            else:
+                intent, confidence = FALLBACK_INTENT, min(1.0, 1.0 - sims[best])
+            results.append({
+                "text": text,
+                "intent": intent,
+                "confidence": round(confidence, 4),
+                "intents": {label: round(p, 4) for label, p in zip(self.intent_labels, probs)},
+                "entities": extract_entities(text),
+                "model": self.model_name,
+            })
+        return results
+
+class _LastHiddenState(torch.nn.Module):
+    """Positional-argument wrapper used for the ONNX export"""
+
+    def __init__(self, model, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.model(**dict(zip(self.input_names, inputs))).last_hidden_state
@@ -0,0 +1,76 @@
+import re
+from typing import Dict, List
+
+# Currency words that may follow or precede an amount
+_CURRENCY_ALIASES = {
+    "₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "rupee": "INR", "rupees": "INR",
+    "$": "USD", "usd": "USD", "dollar": "USD", "dollars": "USD",
+    "hp": "HP", "happy paisa": "HP", "happy coin": "HP", "happy coins": "HP",
+    "coin": "HP", "coins": "HP",
+}
+
+AMOUNT_PATTERN = re.compile(
+    r"(?P<prefix>₹|\$|\brs\.?|\binr\b)?\s?"
+    r"(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"(?:\s?(?P<suffix>happy paisa|happy coins?|coins?|rupees?|inr|usd|dollars?|hp)\b)?",
+    re.IGNORECASE,
+)
+EMAIL_PATTERN = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+PHONE_PATTERN = re.compile(r"(?<!\d)(?:\+91[\s-]?)?[6-9]\d{9}(?!\d)")
+HANDLE_PATTERN = re.compile(r"(?<![\w.])@(?P<handle>[A-Za-z][\w.]{1,30})")
+RECIPIENT_PATTERN = re.compile(r"\bto\s+(?P<name>[A-Z][a-z]+(?:\s[A-Z][a-z]+)?)")
+CARD_PATTERN = re.compile(r"\bending (?:in|with)\s+(?P<last4>\d{4})\b", re.IGNORECASE)
+PERIOD_PATTERN = re.compile(
+    r"\b(today|yesterday|this week|last week|this month|last month|this year|last year)\b",
+    re.IGNORECASE,
+)
+
+def _entity(entity_type: str, value, match: re.Match, group: int = 0) -> Dict:
+    return {
+        "type": entity_type,
+        "value": value,
+        "text": match.group(group),
+        "start": match.start(group),
+        "end": match.end(group),
+    }
+
+def extract_entities(text: str) -> List[Dict]:
+    """Extract amounts, recipients, card references and time periods from text"""
+    entities: List[Dict] = []
+    taken = []
+
+    def overlaps(match: re.Match) -> bool:
+        return any(match.start() < end and start < match.end() for start, end in taken)
+
+    for pattern, entity_type in ((EMAIL_PATTERN, "email"), (PHONE_PATTERN, "phone")):
+        for match in pattern.finditer(text):
+            entities.append(_entity(entity_type, match.group(0), match))
+            taken.append(match.span())
+
+    for match in CARD_PATTERN.finditer(text):
+        entities.append(_entity("card_last4", match.group("last4"), match))
+        taken.append(match.span())
+
+    for match in AMOUNT_PATTERN.finditer(text):
+        if overlaps(match):
+            continue
+        currency_word = (match.group("prefix") or match.group("suffix") or "").strip().lower()
+        entity = _entity("amount", float(match.group("number").replace(",", "")), match)
+        entity["text"] = match.group(0).strip()
+        entity["start"] = match.start() + (len(match.group(0)) - len(match.group(0).lstrip()))
+        if currency_word:
+            entity["currency"] = _CURRENCY_ALIASES.get(currency_word, currency_word.upper())
+        entities.append(entity)
+
+    for match in HANDLE_PATTERN.finditer(text):
+        if not overlaps(match):
+            entities.append(_entity("recipient", match.group("handle"), match))
+
+    for match in RECIPIENT_PATTERN.finditer(text):
+        entities.append(_entity("recipient", match.group("name"), match, "name"))
+
+    for match in PERIOD_PATTERN.finditer(text):
+        entities.append(_entity("period", match.group(1).lower(), match))
+
+    entities.sort(key=lambda entity: entity["start"])
+    return entities
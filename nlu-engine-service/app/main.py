@@ -1,7 +1,18 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import asyncio
+import hmac
+import logging
 import os
+from typing import Optional
+
+from . import models
+from .batcher import MicroBatcher, BatcherOverloaded
+from .cache import ResultCache, normalize_text
+from .engine import MODEL_NAME, IntentEngine
+from .entities import extract_entities
 
 app = FastAPI(title="Axzora NLU Engine", version="1.0.0")
 
@@ -14,15 +25,136 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+logger = logging.getLogger(__name__)
+
+# Configuration
+# Models /internal/nlu/reload may switch to; from_pretrained can unpickle checkpoints, so never take arbitrary names
+NLU_ALLOWED_MODELS = [name.strip() for name in os.getenv("NLU_ALLOWED_MODELS", MODEL_NAME).split(",") if name.strip()]
+# Shared secret for /internal routes, which Kong does not expose; unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+engine = IntentEngine()
+cache = ResultCache()
+reload_lock = asyncio.Lock()
+
+def analyze_batch(texts):
+    # Resolve the engine per batch so a reload swaps it without restarting the batcher
+    return engine.analyze_batch(texts)
+
+batcher = MicroBatcher(analyze_batch)
+
+async def load_model():
+    """Load the model off the event loop so the worker can answer health checks meanwhile"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, engine.load)
+        logger.info(f"NLU model {engine.model_name} ready in {engine.load_seconds:.2f}s (pid {os.getpid()})")
+    except Exception as e:
+        logger.error(f"Failed to load NLU model {engine.model_name}: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    await batcher.start()
+    app.state.model_loader = asyncio.create_task(load_model())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await batcher.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Hello from Axzora NLU Engine!", "service": "nlu-engine"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "nlu-engine"}
+    """Report whether this worker is still loading the model or ready to serve"""
+    body = {
+        "status": "ok" if engine.is_loaded else engine.state,
+        "model_state": engine.state,
+        "service": "nlu-engine",
+        "model": engine.model_name,
+        "inference_mode": engine.mode,
+        "pid": os.getpid(),
+    }
+    if engine.fallback_reason:
+        body["inference_fallback"] = engine.fallback_reason
+    if engine.is_loaded:
+        body["load_seconds"] = round(engine.load_seconds, 3)
+        return body
+    if engine.load_error:
+        body["error"] = engine.load_error
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+
+@app.post("/v1/nlu/analyze", response_model=models.AnalyzeResponse)
+async def analyze_text(request: models.AnalyzeRequest):
+    """Classify the intent of a message and extract its entities"""
+    if not engine.is_loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"NLU model is {engine.state}",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        # The model only sees normalised text, so equivalent phrasings share one
+        # cache entry; entities are cheap and extracted from the original text
+        result = await cache.get_or_compute(
+            normalize_text(request.text), engine.model_version, batcher.submit
+        )
+    except BatcherOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    return {**result, "text": request.text, "entities": extract_entities(request.text)}
+
+@app.post("/process", response_model=models.AnalyzeResponse)
+@app.post("/v1/nlu/process", response_model=models.AnalyzeResponse)
+async def process_text(request: models.AnalyzeRequest):
+    """Alias of /v1/nlu/analyze kept for existing gateway routes"""
+    return await analyze_text(request)
+
+@app.get("/v1/nlu/metrics")
+async def get_metrics():
+    """Report micro-batching and result cache statistics"""
+    return {
+        "service": "nlu-engine",
+        "model_version": engine.model_version,
+        "batcher": batcher.stats(),
+        "cache": cache.stats(),
+    }
+
+def require_internal_token(token: Optional[str]):
+    if not INTERNAL_API_TOKEN or not token or not hmac.compare_digest(token, INTERNAL_API_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Internal endpoint"
+        )
 
-@app.post("/process")
-async def process_text():
-    # TODO: Implement NLU processing
-    return {"message": "NLU processing endpoint - implementation needed"}
+@app.post("/internal/nlu/reload")
+async def reload_model(request: models.ReloadRequest, x_internal_token: Optional[str] = Header(None)):
+    """Load a model (optionally another allowed one or mode) and swap it in once ready"""
+    global engine
+    require_internal_token(x_internal_token)
+    model_name = request.model_name or engine.model_name
+    if model_name not in NLU_ALLOWED_MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model {model_name!r} is not in NLU_ALLOWED_MODELS"
+        )
+    if reload_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A model reload is already in progress"
+        )
+    async with reload_lock:
+        try:
+            new_engine = IntentEngine(model_name=model_name, mode=request.mode or engine.requested_mode)
+            await asyncio.get_running_loop().run_in_executor(None, new_engine.load)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Model reload failed: {str(e)}"
+            )
+        engine = new_engine
+        cache.invalidate()
+    logger.info(f"Reloaded NLU model {engine.model_version}")
+    return {"status": "ok", "model_version": engine.model_version}
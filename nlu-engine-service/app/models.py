@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Any
+
+class AnalyzeRequest(BaseModel):
+    text: str
+    context: Optional[Dict[str, Any]] = {}
+
+class Entity(BaseModel):
+    type: str
+    value: Any
+    text: str
+    start: int
+    end: int
+    currency: Optional[str] = None
+
+class AnalyzeResponse(BaseModel):
+    text: str
+    intent: str
+    confidence: float
+    intents: Dict[str, float] = {}
+    entities: List[Entity] = []
+    model: str
+    status: str = "ok"
+
+class ReloadRequest(BaseModel):
+    model_name: Optional[str] = None
+    mode: Optional[str] = None
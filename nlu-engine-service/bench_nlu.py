@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the NLU Engine
+Measures requests/sec and latency of the micro-batching inference engine,
+per-worker memory and time-to-ready of multi-worker deployments, and the
+latency/throughput/memory/accuracy trade-off of the fp32, int8 and onnx modes,
+and the result cache on a Zipf-distributed phrase workload
+Run from the nlu-engine-service directory:
+
+    python bench_nlu.py batching --model sentence-transformers/all-MiniLM-L6-v2
+    python bench_nlu.py startup --workers 1,4,8
+    python bench_nlu.py modes --samples intent_samples.json
+    python bench_nlu.py cache --zipf 1.1
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from app.batcher import MicroBatcher
+from app.cache import ResultCache, normalize_text
+from app.engine import IntentEngine, INFERENCE_MODES, MODEL_NAME
+
+SAMPLE_MESSAGES = [
+    "check my balance",
+    "what's in my wallet right now",
+    "send 500 rupees to Rahul",
+    "transfer 25 happy coins to @priya",
+    "pay my electricity bill",
+    "I want to recharge my phone for 199",
+    "create a new virtual card",
+    "block my card ending in 4242",
+    "help",
+    "what can you do for me",
+    "how much did I spend last month",
+    "show my recent transactions",
+    "tell me a joke about money",
+    "what is a good way to save for a holiday",
+]
+
+# (max_batch_size, max_wait_ms) combinations; batch size 1 is the unbatched baseline
+DEFAULT_BATCH_SETTINGS = [(1, 0), (4, 2), (8, 5), (16, 5), (32, 10)]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def print_latency_row(label, total, elapsed, latencies, extra=""):
+    print(
+        f"{label:<16} {total / elapsed:>9.1f} req/s   "
+        f"p50 {percentile(latencies, 50) * 1000:>7.1f} ms   "
+        f"p95 {percentile(latencies, 95) * 1000:>7.1f} ms   "
+        f"p99 {percentile(latencies, 99) * 1000:>7.1f} ms   {extra}"
+    )
+
+async def run_load(submit, messages, total, concurrency):
+    """Fire `total` requests from `concurrency` clients and collect latencies"""
+    latencies = []
+    counter = iter(range(total))
+
+    async def client():
+        for _ in counter:
+            text = random.choice(messages)
+            started = time.perf_counter()
+            await submit(text)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies
+
+async def bench_batching(args):
+    print(f"🧪 Benchmarking NLU micro-batching with {args.model}...")
+    engine = IntentEngine(model_name=args.model, num_threads=args.threads)
+    started = time.perf_counter()
+    engine.load()
+    print(f"✅ Model loaded in {time.perf_counter() - started:.2f}s")
+    print(f"   {args.requests} requests, {args.concurrency} concurrent clients, {args.threads} torch threads\n")
+
+    for max_batch_size, max_wait_ms in args.settings:
+        batcher = MicroBatcher(
+            engine.analyze_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue_size=args.requests,
+        )
+        await batcher.start()
+        await run_load(batcher.submit, SAMPLE_MESSAGES, min(50, args.requests), args.concurrency)  # warm-up
+        batcher.batches = batcher.items = 0
+        elapsed, latencies = await run_load(batcher.submit, SAMPLE_MESSAGES, args.requests, args.concurrency)
+        stats = batcher.stats()
+        await batcher.stop()
+        print_latency_row(
+            f"batch={max_batch_size} wait={max_wait_ms:g}",
+            args.requests,
+            elapsed,
+            latencies,
+            f"avg batch {stats['avg_batch_size']}",
+        )
+
+def read_memory_kb(pid):
+    """Return Rss/Pss/shared figures (kB) for a process from /proc (Linux only)"""
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                memory[parts[0].rstrip(":")] = int(parts[1])
+    return memory
+
+def wait_for_ready_workers(url, workers, timeout):
+    """Poll /health until `workers` distinct pids report ready; returns those pids"""
+    ready = set()
+    deadline = time.time() + timeout
+
+    def poll():
+        while len(ready) < workers and time.time() < deadline:
+            try:
+                with urllib.request.urlopen(f"{url}/health", timeout=2) as response:
+                    body = json.loads(response.read())
+                    if body.get("model_state") == "ready":
+                        ready.add(body["pid"])
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            time.sleep(0.02)
+
+    pollers = [threading.Thread(target=poll) for _ in range(max(2, workers))]
+    for poller in pollers:
+        poller.start()
+    for poller in pollers:
+        poller.join()
+    return ready
+
+def measure_startup(args, workers, mmap_weights):
+    port = args.port
+    env = dict(os.environ, NLU_MODEL_NAME=args.model, NLU_MMAP_WEIGHTS=str(mmap_weights).lower())
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        pids = wait_for_ready_workers(f"http://127.0.0.1:{port}", workers, args.timeout)
+        time_to_ready = time.perf_counter() - started
+        if len(pids) < workers:
+            print(f"❌ workers={workers}: only {len(pids)} ready after {args.timeout}s")
+            return
+        memory = [read_memory_kb(pid) for pid in pids]
+        rss = [m["Rss"] / 1024 for m in memory]
+        pss = [m["Pss"] / 1024 for m in memory]
+        shared = [(m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)) / 1024 for m in memory]
+        print(
+            f"workers={workers:<2} mmap={str(mmap_weights):<5}  ready in {time_to_ready:>6.2f}s   "
+            f"RSS/worker {sum(rss) / workers:>7.1f} MB   PSS/worker {sum(pss) / workers:>7.1f} MB   "
+            f"shared/worker {sum(shared) / workers:>7.1f} MB   total PSS {sum(pss):>8.1f} MB"
+        )
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+async def bench_startup(args):
+    print(f"🧪 Benchmarking NLU worker startup with {args.model}...")
+    if args.compare:
+        modes = [False, True]
+    else:
+        modes = [os.getenv("NLU_MMAP_WEIGHTS", "true").lower() == "true"]
+    # Export the mmap snapshot up front so it is not counted in time-to-ready
+    IntentEngine(model_name=args.model).prepare_snapshot()
+    for workers in args.workers:
+        for mmap_weights in modes:
+            measure_startup(args, workers, mmap_weights)
+
+def measure_mode(model, mode, threads, samples, runs):
+    """Load one inference mode in a fresh process and measure it; returns a dict"""
+    pid = os.getpid()
+    baseline_rss = read_memory_kb(pid)["Rss"]
+    engine = IntentEngine(model_name=model, num_threads=threads, mode=mode)
+    engine.load()
+    rss_mb = (read_memory_kb(pid)["Rss"] - baseline_rss) / 1024
+
+    texts = [sample["text"] for sample in samples]
+    engine.analyze_batch(texts[:8])  # warm-up
+    latencies = []
+    for i in range(runs):
+        started = time.perf_counter()
+        engine.analyze_batch([texts[i % len(texts)]])
+        latencies.append(time.perf_counter() - started)
+
+    batch = (texts * (32 // len(texts) + 1))[:32]
+    started = time.perf_counter()
+    rounds = max(1, runs // 32)
+    for _ in range(rounds):
+        engine.analyze_batch(batch)
+    throughput = rounds * len(batch) / (time.perf_counter() - started)
+
+    predictions = [result["intent"] for result in engine.analyze_batch(texts)]
+    correct = sum(p == sample["intent"] for p, sample in zip(predictions, samples))
+    return {
+        "mode": mode if engine.fallback_reason is None else f"{mode} (fell back to fp32)",
+        "load_seconds": engine.load_seconds,
+        "rss_mb": rss_mb,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "throughput": throughput,
+        "accuracy": correct / len(samples),
+        "predictions": predictions,
+    }
+
+async def bench_modes(args):
+    with open(args.samples) as f:
+        samples = json.load(f)
+    print(f"🧪 Benchmarking NLU inference modes with {args.model} on {len(samples)} labelled samples...")
+    IntentEngine(model_name=args.model).prepare_snapshot()
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for mode in args.modes:
+        # A fresh process per mode keeps the memory figures independent
+        with context.Pool(1) as pool:
+            try:
+                results[mode] = pool.apply(measure_mode, (args.model, mode, args.threads, samples, args.runs))
+            except Exception as e:
+                print(f"❌ {mode} failed: {e}")
+
+    baseline = results.get("fp32")
+    print(f"\n{'mode':<6} {'load s':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'items/s':>9} {'accuracy':>9} {'Δ acc':>7} {'agree':>7}")
+    for mode, result in results.items():
+        delta = agreement = ""
+        if baseline:
+            delta = f"{(result['accuracy'] - baseline['accuracy']) * 100:+.1f}"
+            same = sum(a == b for a, b in zip(result["predictions"], baseline["predictions"]))
+            agreement = f"{same / len(samples) * 100:.1f}%"
+        print(
+            f"{mode:<6} {result['load_seconds']:>7.2f} {result['rss_mb']:>8.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['throughput']:>9.1f} {result['accuracy'] * 100:>8.1f}% {delta:>7} {agreement:>7}"
+        )
+
+def zipf_phrases(distinct):
+    """Build `distinct` phrases: the fixed assistant phrases first, then templated variants"""
+    phrases = ["check balance", "help", "send money"] + SAMPLE_MESSAGES
+    templates = [
+        "send {n} rupees to {name}",
+        "transfer {n} happy coins to @{handle}",
+        "pay {n} for my {bill} bill",
+        "how much did I spend on {bill} {period}",
+    ]
+    names = ["Rahul", "Priya", "Anita", "Vikram", "Sara", "Arjun"]
+    bills = ["electricity", "water", "internet", "phone", "gas"]
+    periods = ["this week", "last week", "this month", "last month"]
+    rng = random.Random(7)
+    while len(phrases) < distinct:
+        name = rng.choice(names)
+        phrases.append(rng.choice(templates).format(
+            n=rng.randint(1, 5000), name=name, handle=name.lower(),
+            bill=rng.choice(bills), period=rng.choice(periods),
+        ))
+    return phrases[:distinct]
+
+async def bench_cache(args):
+    print(f"🧪 Benchmarking NLU result cache with {args.model}...")
+    engine = IntentEngine(model_name=args.model, num_threads=args.threads)
+    engine.load()
+    phrases = zipf_phrases(args.distinct)
+    weights = [1.0 / (rank ** args.zipf) for rank in range(1, len(phrases) + 1)]
+    rng = random.Random(42)
+    workload = [
+        # Vary case and punctuation so normalisation is part of what is measured
+        rng.choice([p, p.capitalize(), p + "?", p.upper()])
+        for p in rng.choices(phrases, weights=weights, k=args.requests)
+    ]
+    print(f"   {args.requests} requests over {args.distinct} phrases, zipf s={args.zipf}, "
+          f"{args.concurrency} concurrent clients\n")
+
+    for enabled in (False, True):
+        batcher = MicroBatcher(engine.analyze_batch, max_queue_size=args.requests)
+        cache = ResultCache(max_entries=args.cache_size, enabled=enabled)
+        await batcher.start()
+        texts = iter(workload)
+
+        async def analyze(text):
+            return await cache.get_or_compute(normalize_text(text), engine.model_version, batcher.submit)
+
+        async def submit(_):
+            return await analyze(next(texts))
+
+        elapsed, latencies = await run_load(submit, [None], args.requests, args.concurrency)
+        await batcher.stop()
+        stats = cache.stats()
+        print_latency_row(
+            f"cache={'on' if enabled else 'off'}",
+            args.requests,
+            elapsed,
+            latencies,
+            f"hit rate {stats['hit_rate'] * 100:.1f}% (coalesced {stats['coalesced']}), "
+            f"{batcher.batches} batches",
+        )
+
+def parse_settings(value):
+    settings = []
+    for pair in value.split(","):
+        size, wait = pair.split(":")
+        settings.append((int(size), float(wait)))
+    return settings
+
+def main():
+    parser = argparse.ArgumentParser(description="NLU engine benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batching = subparsers.add_parser("batching", help="requests/sec and latency per batch setting")
+    batching.add_argument("--model", default=MODEL_NAME)
+    batching.add_argument("--requests", type=int, default=1000)
+    batching.add_argument("--concurrency", type=int, default=32)
+    batching.add_argument("--threads", type=int, default=2)
+    batching.add_argument(
+        "--settings",
+        type=parse_settings,
+        default=DEFAULT_BATCH_SETTINGS,
+        help="comma separated max_batch_size:max_wait_ms pairs, e.g. 1:0,8:5,32:10",
+    )
+    batching.set_defaults(func=bench_batching)
+
+    startup = subparsers.add_parser("startup", help="per-worker RSS/PSS and time-to-ready under uvicorn --workers")
+    startup.add_argument("--model", default=MODEL_NAME)
+    startup.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4, 8])
+    startup.add_argument("--port", type=int, default=18002)
+    startup.add_argument("--timeout", type=float, default=300.0)
+    startup.add_argument("--compare", action="store_true", help="also run with NLU_MMAP_WEIGHTS=false")
+    startup.set_defaults(func=bench_startup)
+
+    modes = subparsers.add_parser("modes", help="latency, throughput, memory and accuracy per inference mode")
+    modes.add_argument("--model", default=MODEL_NAME)
+    modes.add_argument("--samples", default="intent_samples.json")
+    modes.add_argument("--modes", type=lambda v: v.split(","), default=list(INFERENCE_MODES))
+    modes.add_argument("--threads", type=int, default=2)
+    modes.add_argument("--runs", type=int, default=500)
+    modes.set_defaults(func=bench_modes)
+
+    cache = subparsers.add_parser("cache", help="hit rate and latency of the result cache on a Zipf workload")
+    cache.add_argument("--model", default=MODEL_NAME)
+    cache.add_argument("--requests", type=int, default=5000)
+    cache.add_argument("--distinct", type=int, default=2000)
+    cache.add_argument("--zipf", type=float, default=1.1)
+    cache.add_argument("--cache-size", type=int, default=1000)
+    cache.add_argument("--concurrency", type=int, default=32)
+    cache.add_argument("--threads", type=int, default=2)
+    cache.set_defaults(func=bench_cache)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Test script for the NLU Engine
+Covers micro-batching, the result cache, text normalisation, entity
+extraction, readiness gating and the inference modes; the model tests use a
+tiny randomly initialised BERT written to a temp dir, so nothing is downloaded:
+
+    python test_nlu.py    (or: python -m pytest test_nlu.py)
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+os.environ.setdefault("INTERNAL_API_TOKEN", "internal-test-token")
+os.environ.setdefault("NLU_MODEL_CACHE_DIR", tempfile.mkdtemp(prefix="nlu-model-cache-"))
+
+import torch
+from fastapi.testclient import TestClient
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+from app import main
+from app.batcher import BatcherOverloaded, MicroBatcher
+from app.cache import ResultCache, normalize_text
+from app.engine import INTENT_EXAMPLES, IntentEngine
+from app.entities import extract_entities
+
+EXAMPLE_TEXTS = [text for examples in INTENT_EXAMPLES.values() for text in examples]
+
+def echo_handler(batches):
+    """Batch handler that records the size of every batch it is given"""
+    def handler(texts):
+        batches.append(len(texts))
+        return [{"intent": text} for text in texts]
+    return handler
+
+@functools.lru_cache(maxsize=None)
+def tiny_model() -> str:
+    """Write a two-layer BERT with a vocabulary built from the intent examples"""
+    path = tempfile.mkdtemp(prefix="nlu-tiny-model-")
+    words = sorted({word for text in EXAMPLE_TEXTS for word in text.lower().split()})
+    with open(os.path.join(path, "vocab.txt"), "w") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+    BertTokenizerFast(vocab_file=os.path.join(path, "vocab.txt")).save_pretrained(path)
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=5 + len(words), hidden_size=32, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64,
+    )
+    BertModel(config).save_pretrained(path)
+    return path
+
+class RecordingHandler(logging.Handler):
+    """Collects the log messages of one logger"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def load_intents(mode):
+    engine = IntentEngine(model_name=tiny_model(), mode=mode)
+    engine.load()
+    return engine, [result["intent"] for result in engine.analyze_batch(EXAMPLE_TEXTS)]
+
+def test_batcher_flushes_full_batches():
+    batches = []
+
+    async def scenario():
+        batcher = MicroBatcher(echo_handler(batches), max_batch_size=4, max_wait_ms=200, workers=1)
+        await batcher.start()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(f"text {i}") for i in range(8)))
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return results, elapsed, batcher.stats()
+
+    results, elapsed, stats = asyncio.run(scenario())
+    assert [result["intent"] for result in results] == [f"text {i}" for i in range(8)]
+    # Full batches go out without waiting for the deadline
+    assert batches == [4, 4] and elapsed < 0.2
+    assert stats["batches"] == 2 and stats["avg_batch_size"] == 4.0
+
+def test_batcher_flushes_partial_batch_at_deadline():
+    batches = []
+
+    async def scenario():
+        batcher = MicroBatcher(echo_handler(batches), max_batch_size=16, max_wait_ms=30, workers=1)
+        await batcher.start()
+        started = time.perf_counter()
+        result = await batcher.submit("check my balance")
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return result, elapsed
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == {"intent": "check my balance"}
+    assert batches == [1]
+    assert 0.02 <= elapsed < 1.0
+
+def test_batcher_propagates_handler_errors():
+    def failing(texts):
+        raise RuntimeError("model exploded")
+
+    async def scenario():
+        batcher = MicroBatcher(failing, max_batch_size=4, max_wait_ms=1)
+        await batcher.start()
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_batcher_rejects_when_queue_is_full():
+    async def scenario():
+        batcher = MicroBatcher(echo_handler([]), max_queue_size=1)
+        await batcher.start()
+        # Stop the collector first so nothing drains the queue
+        batcher._task.cancel()
+        first = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0)
+        try:
+            await batcher.submit("b")
+        except BatcherOverloaded:
+            overloaded = True
+        else:
+            overloaded = False
+        batcher._task = None
+        await batcher.stop()
+        return overloaded, first
+
+    overloaded, first = asyncio.run(scenario())
+    assert overloaded
+    assert isinstance(first.exception(), BatcherOverloaded)
+
+def test_batcher_stop_fails_partially_collected_batch():
+    async def scenario():
+        batcher = MicroBatcher(echo_handler([]), max_batch_size=16, max_wait_ms=10000)
+        await batcher.start()
+        # The collector has dequeued both and is waiting out the deadline for more
+        pending = [asyncio.ensure_future(batcher.submit(text)) for text in ("a", "b")]
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(batcher.stop(), 1.0)
+        late = asyncio.ensure_future(batcher.submit("c"))
+        return await asyncio.wait_for(asyncio.gather(*pending, late, return_exceptions=True), 1.0)
+
+    results = asyncio.run(scenario())
+    assert len(results) == 3
+    assert all(isinstance(result, BatcherOverloaded) for result in results)
+
+def test_normalize_text():
+    assert normalize_text("  Check   MY Balance?! ") == "check my balance"
+    # Full-width characters fold to their ASCII forms
+    assert normalize_text("ｃｈｅｃｋ my balance") == "check my balance"
+    assert normalize_text("send 1.5 coins") == "send 1.5 coins"
+
+def test_result_cache_hits_and_single_flight():
+    calls = []
+
+    async def compute(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return {"intent": text}
+
+    async def scenario():
+        cache = ResultCache(max_entries=10, ttl_seconds=60, enabled=True)
+        results = await asyncio.gather(*(cache.get_or_compute("hi", "v1", compute) for _ in range(5)))
+        again = await cache.get_or_compute("hi", "v1", compute)
+        other_model = await cache.get_or_compute("hi", "v2", compute)
+        return cache, results, again, other_model
+
+    cache, results, again, other_model = asyncio.run(scenario())
+    assert calls == ["hi", "hi"]
+    assert all(result == {"intent": "hi"} for result in results + [again, other_model])
+    stats = cache.stats()
+    assert stats["misses"] == 2 and stats["coalesced"] == 4 and stats["hits"] == 1
+
+def test_result_cache_lru_and_ttl():
+    async def compute(text):
+        return {"intent": text}
+
+    async def scenario():
+        cache = ResultCache(max_entries=2, ttl_seconds=60, enabled=True)
+        for text in ("a", "b"):
+            await cache.get_or_compute(text, "v1", compute)
+        # Touch "a" so "b" is the least recently used when "c" arrives
+        await cache.get_or_compute("a", "v1", compute)
+        await cache.get_or_compute("c", "v1", compute)
+        lru = (cache._lookup(("v1", "a")), cache._lookup(("v1", "b")), cache.evictions)
+
+        expiring = ResultCache(max_entries=10, ttl_seconds=0.01, enabled=True)
+        await expiring.get_or_compute("a", "v1", compute)
+        await asyncio.sleep(0.02)
+        await expiring.get_or_compute("a", "v1", compute)
+        return lru, expiring.stats()
+
+    (kept, evicted, evictions), expiring = asyncio.run(scenario())
+    assert kept == {"intent": "a"} and evicted is None and evictions == 1
+    assert expiring["expirations"] == 1 and expiring["misses"] == 2
+
+def test_result_cache_invalidation_discards_in_flight_results():
+    release = None
+
+    async def compute(text):
+        await release.wait()
+        return {"intent": "old model"}
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        cache = ResultCache(enabled=True)
+        pending = asyncio.ensure_future(cache.get_or_compute("hi", "v1", compute))
+        await asyncio.sleep(0)
+        # A reload lands while the old model is still computing
+        cache.invalidate()
+        release.set()
+        result = await pending
+        return result, len(cache._entries), cache.stats()["invalidations"]
+
+    result, entries, invalidations = asyncio.run(scenario())
+    assert result == {"intent": "old model"}
+    assert entries == 0 and invalidations == 1
+
+def test_extract_amounts_and_recipients():
+    entities = extract_entities("Send ₹1,500 to Rahul Sharma")
+    assert [(e["type"], e["value"]) for e in entities] == [("amount", 1500.0), ("recipient", "Rahul Sharma")]
+    assert entities[0]["currency"] == "INR" and entities[0]["text"] == "₹1,500"
+
+    entities = extract_entities("transfer 200 happy coins to @priya.k yesterday")
+    assert [(e["type"], e["value"]) for e in entities] == [
+        ("amount", 200.0), ("recipient", "priya.k"), ("period", "yesterday"),
+    ]
+    assert entities[0]["currency"] == "HP"
+
+def test_extract_contact_and_card_entities():
+    entities = extract_entities("call 9876543210 or mail a@b.com about the card ending in 4242")
+    assert [(e["type"], e["value"]) for e in entities] == [
+        ("phone", "9876543210"), ("email", "a@b.com"), ("card_last4", "4242"),
+    ]
+    # Phone and card digits are not also reported as amounts
+    assert not any(e["type"] == "amount" for e in entities)
+
+def test_reload_is_internal_and_allow_listed():
+    # Without the context manager the startup hook (and so the model load) does not run
+    client = TestClient(main.app)
+    token = {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}
+    # Not reachable under the /v1/nlu prefix Kong forwards
+    assert client.post("/v1/nlu/reload", json={}).status_code == 404
+    assert client.post("/internal/nlu/reload", json={}).status_code == 403
+    assert client.post("/internal/nlu/reload", json={}, headers={"X-Internal-Token": "guess"}).status_code == 403
+    response = client.post("/internal/nlu/reload", json={"model_name": "someone/pickled-model"}, headers=token)
+    assert response.status_code == 400 and "NLU_ALLOWED_MODELS" in response.json()["detail"]
+
+def test_health_and_analyze_are_gated_until_the_snapshot_loads():
+    engine = IntentEngine(model_name=tiny_model(), mode="fp32")
+    release = threading.Event()
+    load_model = engine._load_model
+
+    def slow_load_model():
+        release.wait(10)
+        return load_model()
+
+    original = main.engine
+    main.engine = engine
+    try:
+        with mock.patch.object(engine, "_load_model", slow_load_model), TestClient(main.app) as client:
+            health = client.get("/health")
+            assert health.status_code == 503 and health.json()["model_state"] == "loading"
+            busy = client.post("/v1/nlu/analyze", json={"text": "check my balance"})
+            assert busy.status_code == 503 and busy.headers["Retry-After"] == "1"
+
+            release.set()
+            deadline = time.monotonic() + 10
+            while client.get("/health").status_code != 200:
+                assert time.monotonic() < deadline, "model never became ready"
+                time.sleep(0.02)
+            assert client.get("/health").json()["model_state"] == "ready"
+            assert client.post("/v1/nlu/analyze", json={"text": "check my balance"}).status_code == 200
+        # The worker loaded from the shared mmap snapshot
+        assert os.path.exists(os.path.join(engine.snapshot_dir(), "weights.pt"))
+    finally:
+        main.engine = original
+
+def test_int8_and_onnx_match_fp32_or_fall_back():
+    _, expected = load_intents("fp32")
+    handler = RecordingHandler()
+    logging.getLogger("app.engine").addHandler(handler)
+    try:
+        for mode in ("int8", "onnx"):
+            engine, intents = load_intents(mode)
+            if engine.fallback_reason is None:
+                assert engine.mode == mode
+            else:
+                # e.g. the onnx exporter is not installed; the reason is logged and kept
+                assert engine.mode == "fp32" and engine.fallback_reason.startswith(mode)
+                assert any("falling back to fp32" in message for message in handler.messages)
+            assert intents == expected, mode
+    finally:
+        logging.getLogger("app.engine").removeHandler(handler)
+
+def test_onnx_failure_falls_back_to_fp32_with_logged_reason():
+    handler = RecordingHandler()
+    logging.getLogger("app.engine").addHandler(handler)
+    try:
+        with mock.patch.object(IntentEngine, "_load_onnx_session", side_effect=ImportError("no onnxruntime")):
+            engine, intents = load_intents("onnx")
+    finally:
+        logging.getLogger("app.engine").removeHandler(handler)
+    assert engine.state == "ready" and engine.mode == "fp32" and engine.requested_mode == "onnx"
+    assert engine.fallback_reason == "onnx: no onnxruntime"
+    assert handler.messages == ["NLU onnx inference unavailable, falling back to fp32: no onnxruntime"]
+    assert intents == load_intents("fp32")[1]
+
+    original = main.engine
+    main.engine = engine
+    try:
+        assert TestClient(main.app).get("/health").json()["inference_fallback"] == "onnx: no onnxruntime"
+    finally:
+        main.engine = original
+
+if __name__ == "__main__":
+    print("🧪 Testing NLU Engine...")
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n🎉 All NLU Engine tests completed!")
@@ -0,0 +1,2 @@
+
+# This file makes the directory a Python package
@@ -0,0 +1,154 @@
+"""
+Idempotency store for payment requests.
+
+A client retrying a request with the same Idempotency-Key gets the stored
+result of the first attempt without another upstream call. Results are kept
+in SQLite for IDEMPOTENCY_TTL_SECONDS (Stripe's own keys last 24 hours), so
+replays survive a restart. Concurrent requests with the same key share one
+in-flight call (single flight) instead of racing each other to Stripe. Only
+final outcomes are stored: if the upstream call fails in a way worth
+retrying, nothing is recorded and the next attempt goes upstream again.
+
+Keys are scoped by the caller (the user the payment is for), and a key reused
+with a different request body is rejected rather than replayed.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# Configuration
+IDEMPOTENCY_DB_PATH = os.getenv("IDEMPOTENCY_DB_PATH", "/tmp/payment-idempotency.sqlite")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_created ON idempotency_keys(created_at);
+"""
+
+Outcome = Tuple[int, Dict]
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+class IdempotencyInterrupted(Exception):
+    """The in-flight request this one joined was cancelled before finishing; safe to retry"""
+
+def request_fingerprint(body: Dict) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class IdempotencyStore:
+    def __init__(self, path: str = IDEMPOTENCY_DB_PATH, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.replays = 0
+        self.joined = 0
+        self.executed = 0
+
+    def open(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _load(self, key: str) -> Optional[Tuple[str, int, Dict]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT request_hash, status_code, response FROM idempotency_keys WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def _save(self, key: str, request_hash: str, outcome: Outcome):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO idempotency_keys (key, request_hash, status_code, response, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, request_hash, outcome[0], json.dumps(outcome[1]), time.time()),
+            )
+
+    def _purge(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+
+    def _joinable(self, key: str, request_hash: str) -> Optional[asyncio.Future]:
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            return None
+        if in_flight[0] != request_hash:
+            raise IdempotencyConflict(key)
+        return in_flight[1]
+
+    async def run(self, key: str, request_hash: str, operation: Callable[[], Awaitable[Outcome]]) -> Tuple[Outcome, bool]:
+        """Return (outcome, replayed), calling operation only if no result is stored or in flight for key"""
+        in_flight = self._joinable(key, request_hash)
+        if in_flight is not None:
+            self.joined += 1
+            return await asyncio.shield(in_flight), True
+
+        stored = await asyncio.to_thread(self._load, key)
+        if stored is not None:
+            if stored[0] != request_hash:
+                raise IdempotencyConflict(key)
+            self.replays += 1
+            return (stored[1], stored[2]), True
+
+        # Re-check: another request for the key may have started while we read
+        in_flight = self._joinable(key, request_hash)
+        if in_flight is not None:
+            self.joined += 1
+            return await asyncio.shield(in_flight), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (request_hash, future)
+        try:
+            self.executed += 1
+            outcome = await operation()
+            await asyncio.to_thread(self._save, key, request_hash, outcome)
+        except asyncio.CancelledError:
+            future.set_exception(IdempotencyInterrupted(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unjoined failure is not logged as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(outcome)
+        finally:
+            del self._in_flight[key]
+        return outcome, False
+
+    async def purge(self) -> int:
+        return await asyncio.to_thread(self._purge)
+
+    def stats(self) -> Dict:
+        return {
+            "executed": self.executed,
+            "replayed": self.replays,
+            "joined_in_flight": self.joined,
+            "in_flight": len(self._in_flight),
+        }
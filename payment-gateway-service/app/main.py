@@ -1,7 +1,23 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from typing import Optional
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
 import os
+import time
+import uuid
+
+import stripe
+
+from .idempotency import IdempotencyConflict, IdempotencyInterrupted, IdempotencyStore, request_fingerprint
+from .models import CreatePaymentIntentRequest, PaymentIntentResponse
+from .stripe_client import StripeAPIError, StripeClient, StripeUnavailableError
+from .webhook_queue import WebhookQueue
+from .webhooks import STRIPE_WEBHOOK_SECRET, WebhookStats, WebhookWorkerPool, verify_signature
 
 app = FastAPI(title="Axzora Payment Gateway", version="1.0.0")
 
@@ -14,6 +30,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PURGE_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_PURGE_INTERVAL_SECONDS", "3600"))
+# Shared secret for /internal routes, which Kong does not expose; unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+webhook_queue = WebhookQueue()
+webhook_stats = WebhookStats()
+webhook_workers = None
+idempotency_store = IdempotencyStore()
+stripe_client = None
+purge_task = None
+
+async def purge_periodically():
+    while True:
+        await asyncio.sleep(WEBHOOK_PURGE_INTERVAL_SECONDS)
+        try:
+            purged = await webhook_queue.purge()
+            if purged:
+                logger.info(f"Purged {purged} processed webhook events")
+            purged = await idempotency_store.purge()
+            if purged:
+                logger.info(f"Purged {purged} expired idempotency keys")
+        except Exception as e:
+            logger.error(f"Purging webhook events failed: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    global webhook_workers, stripe_client, purge_task
+    stripe_client = StripeClient()
+    idempotency_store.open()
+    webhook_queue.start()
+    webhook_workers = WebhookWorkerPool(webhook_queue, stats=webhook_stats)
+    webhook_workers.start()
+    purge_task = asyncio.create_task(purge_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    purge_task.cancel()
+    await webhook_workers.stop()
+    await webhook_workers.ledger.close()
+    webhook_queue.stop()
+    await stripe_client.close()
+    idempotency_store.close()
+
 @app.get("/")
 async def root():
     return {"message": "Hello from Axzora Payment Gateway!", "service": "payment-gateway"}
@@ -22,12 +83,153 @@ async def root():
 async def health_check():
     return {"status": "ok", "service": "payment-gateway"}
 
-@app.post("/create_payment_intent")
-async def create_payment_intent():
-    # TODO: Implement Stripe payment intent creation
-    return {"message": "Payment intent creation endpoint - implementation needed"}
+@app.post("/create_payment_intent", response_model=PaymentIntentResponse)
+@app.post("/v1/payments/create_payment_intent", response_model=PaymentIntentResponse)
+async def create_payment_intent(
+    request: CreatePaymentIntentRequest,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    """Create a Stripe PaymentIntent; retries with the same Idempotency-Key replay the first result"""
+    if not stripe_client.api_key:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Stripe is not configured"
+        )
+    # Without a key from the client we still send one upstream so our own
+    # retries are safe; returning it lets the client retry safely too
+    key = idempotency_key or str(uuid.uuid4())
+    scoped_key = f"{request.user_id}\0{key}"
+    body = request.model_dump()
+
+    async def create():
+        params = {
+            "amount": request.amount,
+            "currency": request.currency,
+            "description": request.description,
+            "metadata": {**request.metadata, "user_id": request.user_id},
+            "automatic_payment_methods": {"enabled": True},
+        }
+        try:
+            intent = await stripe_client.create_payment_intent(params, hashlib.sha256(scoped_key.encode()).hexdigest())
+        except StripeAPIError as e:
+            if not e.caused_by_request:
+                # Not an answer about this request: raising keeps it out of the idempotency store
+                raise
+            # Final answers are stored and replayed like successes
+            code = status.HTTP_402_PAYMENT_REQUIRED if e.status_code == 402 else status.HTTP_400_BAD_REQUEST
+            return code, {"detail": e.message}
+        return status.HTTP_200_OK, {
+            "id": intent["id"],
+            "client_secret": intent.get("client_secret"),
+            "amount": intent["amount"],
+            "currency": intent["currency"],
+            "status": intent["status"],
+        }
+
+    try:
+        (code, result), replayed = await idempotency_store.run(scoped_key, request_fingerprint(body), create)
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request"
+        )
+    except IdempotencyInterrupted:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key was interrupted; retry it"
+        )
+    except StripeUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Payment provider unavailable: {e}"
+        )
+    except StripeAPIError as e:
+        if e.status_code in (401, 403):
+            logger.error(f"Stripe rejected our credentials: {e.status_code} {e.message}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Payment provider is misconfigured"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Payment provider error: {e.message}"
+        )
+    if code != status.HTTP_200_OK:
+        raise HTTPException(status_code=code, detail=result["detail"])
+    return PaymentIntentResponse(**result, idempotency_key=key, replayed=replayed)
+
+@app.get("/v1/payments/intents/stats")
+async def payment_intent_stats():
+    """Upstream requests and retries, and how often idempotency saved an upstream call"""
+    return {
+        "stripe": {"requests": stripe_client.requests, "retries": stripe_client.retries},
+        "idempotency": idempotency_store.stats(),
+    }
 
 @app.post("/webhook")
-async def stripe_webhook():
-    # TODO: Implement Stripe webhook handling
-    return {"message": "Stripe webhook endpoint - implementation needed"}
+@app.post("/v1/payments/webhook")
+async def stripe_webhook(request: Request):
+    """Verify and durably enqueue a Stripe event; processing happens in the background"""
+    started = time.perf_counter()
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook secret is not configured"
+        )
+    payload = await request.body()
+    try:
+        verify_signature(payload, request.headers.get("stripe-signature", ""), STRIPE_WEBHOOK_SECRET)
+        event = json.loads(payload)
+        event_id, event_type = event["id"], event["type"]
+    except (stripe.error.SignatureVerificationError, ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid webhook signature or payload"
+        )
+
+    # Only acknowledge once the event is on disk: a 2xx tells Stripe to stop retrying
+    queued = await webhook_queue.append(event_id, event_type, payload)
+    if queued:
+        webhook_workers.notify()
+        webhook_stats.received += 1
+    else:
+        webhook_stats.duplicates += 1
+    webhook_stats.ack_ms.append((time.perf_counter() - started) * 1000)
+    return {"received": True, "duplicate": not queued}
+
+def require_internal_token(token: Optional[str]):
+    if not INTERNAL_API_TOKEN or not token or not hmac.compare_digest(token, INTERNAL_API_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Internal endpoint"
+        )
+
+@app.get("/internal/payments/webhooks/stats")
+async def webhook_queue_stats(x_internal_token: Optional[str] = Header(None)):
+    """Queue depth by status, dead letters, ack and processing latency"""
+    require_internal_token(x_internal_token)
+    return {
+        "queue": await webhook_queue.counts(),
+        "events": webhook_stats.summary(),
+        "group_commit": {
+            "commits": webhook_queue.commits,
+            "ops_per_commit": round(webhook_queue.committed_ops / max(1, webhook_queue.commits), 2),
+        },
+    }
+
+@app.get("/internal/payments/webhooks/dead-letters")
+async def list_dead_letters(limit: int = 50, x_internal_token: Optional[str] = Header(None)):
+    require_internal_token(x_internal_token)
+    return {"dead_letters": await webhook_queue.dead_letters(min(limit, 500))}
+
+@app.post("/internal/payments/webhooks/dead-letters/{event_id}/retry")
+async def retry_dead_letter(event_id: str, x_internal_token: Optional[str] = Header(None)):
+    """Put a dead-lettered event back on the queue; it is retried as a redelivery, never as a first attempt"""
+    require_internal_token(x_internal_token)
+    if not await webhook_queue.requeue_dead(event_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dead-lettered event not found"
+        )
+    webhook_workers.notify()
+    return {"event_id": event_id, "status": "requeued"}
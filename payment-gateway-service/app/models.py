@@ -0,0 +1,19 @@
+
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+class CreatePaymentIntentRequest(BaseModel):
+    user_id: str
+    amount: int = Field(gt=0, description="Amount in the currency's smallest unit, e.g. paise")
+    currency: str = "inr"
+    description: Optional[str] = None
+    metadata: Dict[str, str] = {}
+
+class PaymentIntentResponse(BaseModel):
+    id: str
+    client_secret: Optional[str] = None
+    amount: int
+    currency: str
+    status: str
+    idempotency_key: str
+    replayed: bool = False
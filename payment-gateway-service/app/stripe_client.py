@@ -0,0 +1,134 @@
+"""
+Async Stripe API client.
+
+The official ``stripe`` package is synchronous, so calling it from an async
+handler blocks the event loop for every upstream round trip. This client
+talks to the Stripe REST API directly over one pooled httpx.AsyncClient with
+explicit timeouts. Failures that Stripe documents as safe to retry
+(connection errors, timeouts, 409 lock conflicts, 429 and 5xx, or whatever
+``Stripe-Should-Retry`` says) are retried with exponential backoff and
+jitter, always with the same Idempotency-Key, so a retry can never create a
+second PaymentIntent.
+"""
+
+import asyncio
+import os
+import random
+from typing import Dict, Optional
+
+import httpx
+
+# Configuration
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "20"))
+STRIPE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STRIPE_CONNECT_TIMEOUT_SECONDS", "3"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+STRIPE_MAX_CONNECTIONS = int(os.getenv("STRIPE_MAX_CONNECTIONS", "100"))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 5.0
+
+class StripeAPIError(Exception):
+    def __init__(self, status_code: int, message: str, error: Optional[Dict] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.error = error or {}
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in (409, 429) or self.status_code >= 500
+
+    @property
+    def caused_by_request(self) -> bool:
+        """The request itself was refused (bad parameters, card declined); anything else,
+        e.g. 401/403 from our own key, is an outage on our side"""
+        return self.status_code in (400, 402, 404)
+
+class StripeUnavailableError(Exception):
+    """Stripe could not be reached, or kept failing, within the retry budget"""
+
+def encode_form(params: Dict, prefix: str = "") -> Dict[str, str]:
+    """Flatten nested dicts into Stripe's form encoding: metadata[user_id]=..."""
+    form = {}
+    for key, value in params.items():
+        name = f"{prefix}[{key}]" if prefix else key
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            form.update(encode_form(value, name))
+        elif isinstance(value, bool):
+            form[name] = "true" if value else "false"
+        else:
+            form[name] = str(value)
+    return form
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        try:
+            return min(RETRY_MAX_SECONDS, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+class StripeClient:
+    def __init__(
+        self,
+        api_key: Optional[str] = STRIPE_SECRET_KEY,
+        base_url: str = STRIPE_API_BASE,
+        max_retries: int = STRIPE_MAX_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            auth=(api_key or "", ""),
+            timeout=httpx.Timeout(STRIPE_TIMEOUT_SECONDS, connect=STRIPE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=STRIPE_MAX_CONNECTIONS, max_keepalive_connections=STRIPE_MAX_CONNECTIONS // 2),
+        )
+        self.requests = 0
+        self.retries = 0
+
+    async def request(self, method: str, path: str, params: Optional[Dict] = None, idempotency_key: Optional[str] = None) -> Dict:
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+        data = encode_form(params or {})
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                response = await self.client.request(method, path, data=data, headers=headers)
+            except httpx.TransportError as e:
+                # Includes timeouts; the idempotency key makes resending a POST safe
+                if attempt >= self.max_retries:
+                    raise StripeUnavailableError(f"Stripe request failed: {type(e).__name__}") from e
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+
+            if response.status_code < 400:
+                return response.json()
+            try:
+                error = response.json().get("error", {})
+            except ValueError:
+                error = {}
+            failure = StripeAPIError(response.status_code, error.get("message") or f"Stripe returned {response.status_code}", error)
+            should_retry = response.headers.get("stripe-should-retry")
+            retryable = failure.retryable if should_retry is None else should_retry == "true"
+            if not retryable:
+                raise failure
+            if attempt >= self.max_retries:
+                raise StripeUnavailableError(failure.message) from failure
+            await self._backoff(attempt, response.headers.get("retry-after"))
+            attempt += 1
+
+    async def _backoff(self, attempt: int, retry_after: Optional[str] = None):
+        self.retries += 1
+        await asyncio.sleep(retry_delay(attempt, retry_after))
+
+    async def create_payment_intent(self, params: Dict, idempotency_key: str) -> Dict:
+        return await self.request("POST", "/v1/payment_intents", params, idempotency_key)
+
+    async def close(self):
+        await self.client.aclose()
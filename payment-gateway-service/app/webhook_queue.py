@@ -0,0 +1,283 @@
+"""
+Durable local queue for Stripe webhook events.
+
+Events are appended to a SQLite database in WAL mode. All reads and writes go
+through one database thread that drains whatever requests are waiting and
+runs them in a single transaction, so a burst of webhooks shares one fsync
+(group commit) while each caller still only hears back once its event is on
+disk. The event id is the primary key: redeliveries of an event we already
+hold are detected at append time and acknowledged without being queued again.
+
+An event moves pending -> processing -> done, or back to pending with an
+exponential backoff after a failure, or to the dead_letters table once it
+runs out of attempts. A claim is a lease: events held by a worker that died
+become claimable again once the lease expires.
+"""
+
+import asyncio
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configuration
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "/tmp/webhook-queue.sqlite")
+# FULL survives power loss; NORMAL only survives a process crash
+WEBHOOK_QUEUE_SYNCHRONOUS = os.getenv("WEBHOOK_QUEUE_SYNCHRONOUS", "FULL")
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "60"))
+WEBHOOK_RETENTION_SECONDS = float(os.getenv("WEBHOOK_RETENTION_SECONDS", str(7 * 24 * 3600)))
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 3600.0
+MAX_GROUP_SIZE = 512
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    received_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ready ON events(status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    event_id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+def backoff_seconds(attempts: int, base: float = BACKOFF_BASE_SECONDS) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, base * 2 ** (attempts - 1)))
+
+class QueuedEvent:
+    def __init__(self, event_id: str, type: str, payload: bytes, attempts: int):
+        self.event_id = event_id
+        self.type = type
+        self.payload = payload
+        self.attempts = attempts
+
+class WebhookQueue:
+    def __init__(
+        self,
+        path: str = WEBHOOK_QUEUE_PATH,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        lease_seconds: float = WEBHOOK_LEASE_SECONDS,
+        synchronous: str = WEBHOOK_QUEUE_SYNCHRONOUS,
+        backoff_base_seconds: float = BACKOFF_BASE_SECONDS,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.synchronous = synchronous
+        self.backoff_base_seconds = backoff_base_seconds
+        self._requests: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.commits = 0
+        self.committed_ops = 0
+
+    # --- database thread ---
+
+    def start(self):
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="webhook-queue", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def stop(self):
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, ready: threading.Event):
+        db = sqlite3.connect(self.path, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(f"PRAGMA synchronous={self.synchronous}")
+        db.execute("PRAGMA busy_timeout=5000")
+        db.executescript(SCHEMA)
+        ready.set()
+        while True:
+            group = [self._requests.get()]
+            while len(group) < MAX_GROUP_SIZE:
+                try:
+                    group.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in group
+            group = [request for request in group if request is not None]
+            if group:
+                self._execute_group(db, group)
+            if stopping:
+                break
+        db.close()
+
+    def _execute_group(self, db: sqlite3.Connection, group: List[Tuple]):
+        results = []
+        try:
+            # IMMEDIATE takes the write lock up front, so claims from several
+            # processes sharing the file cannot interleave
+            db.execute("BEGIN IMMEDIATE")
+            for operation, args, _, _ in group:
+                try:
+                    results.append((True, operation(db, *args)))
+                except sqlite3.DatabaseError:
+                    raise
+                except Exception as e:
+                    results.append((False, e))
+            db.execute("COMMIT")
+            self.commits += 1
+            self.committed_ops += len(group)
+        except sqlite3.DatabaseError as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            results = [(False, e)] * len(group)
+        for (_, _, loop, future), (ok, value) in zip(group, results):
+            loop.call_soon_threadsafe(_resolve, future, ok, value)
+
+    async def _submit(self, operation: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._requests.put((operation, args, loop, future))
+        return await future
+
+    # --- operations, run inside the database thread's transaction ---
+
+    @staticmethod
+    def _append(db, event_id: str, type: str, payload: bytes) -> bool:
+        now = time.time()
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO events (event_id, type, payload, next_attempt_at, received_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (event_id, type, payload, now, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def _claim(self, db, limit: int) -> List[QueuedEvent]:
+        now = time.time()
+        rows = db.execute(
+            "SELECT event_id, type, payload, attempts FROM events "
+            "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+            "OR (status = 'processing' AND lease_until <= ?) "
+            "ORDER BY next_attempt_at LIMIT ?",
+            (now, now, limit),
+        ).fetchall()
+        db.executemany(
+            "UPDATE events SET status = 'processing', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+            "WHERE event_id = ?",
+            [(now + self.lease_seconds, now, row[0]) for row in rows],
+        )
+        return [QueuedEvent(event_id, type, payload, attempts + 1) for event_id, type, payload, attempts in rows]
+
+    @staticmethod
+    def _complete(db, event_id: str):
+        db.execute(
+            "UPDATE events SET status = 'done', lease_until = NULL, updated_at = ?, last_error = NULL WHERE event_id = ?",
+            (time.time(), event_id),
+        )
+
+    def _fail(self, db, event: QueuedEvent, error: str, permanent: bool) -> str:
+        now = time.time()
+        if permanent or event.attempts >= self.max_attempts:
+            db.execute(
+                "INSERT OR REPLACE INTO dead_letters (event_id, type, payload, attempts, error, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (event.event_id, event.type, event.payload, event.attempts, error, now),
+            )
+            db.execute(
+                "UPDATE events SET status = 'dead', lease_until = NULL, updated_at = ?, last_error = ? WHERE event_id = ?",
+                (now, error, event.event_id),
+            )
+            return "dead"
+        db.execute(
+            "UPDATE events SET status = 'pending', lease_until = NULL, next_attempt_at = ?, updated_at = ?, "
+            "last_error = ? WHERE event_id = ?",
+            (now + backoff_seconds(event.attempts, self.backoff_base_seconds), now, error, event.event_id),
+        )
+        return "retry"
+
+    @staticmethod
+    def _requeue_dead(db, event_id: str) -> bool:
+        now = time.time()
+        # The replay counts as a later attempt, so handlers look for the side
+        # effects of the attempts that failed before it was dead-lettered
+        cursor = db.execute(
+            "UPDATE events SET status = 'pending', attempts = 1, next_attempt_at = ?, updated_at = ? "
+            "WHERE event_id = ? AND status = 'dead'",
+            (now, now, event_id),
+        )
+        db.execute("DELETE FROM dead_letters WHERE event_id = ?", (event_id,))
+        return cursor.rowcount == 1
+
+    @staticmethod
+    def _purge(db, older_than: float) -> int:
+        # Done rows are kept for the retention window so late redeliveries are still deduplicated
+        return db.execute(
+            "DELETE FROM events WHERE status = 'done' AND updated_at < ?", (older_than,)
+        ).rowcount
+
+    @staticmethod
+    def _counts(db) -> Dict[str, int]:
+        counts = dict(db.execute("SELECT status, COUNT(*) FROM events GROUP BY status").fetchall())
+        counts["dead_letters"] = db.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return counts
+
+    @staticmethod
+    def _dead_letters(db, limit: int) -> List[Dict]:
+        rows = db.execute(
+            "SELECT event_id, type, attempts, error, failed_at FROM dead_letters ORDER BY failed_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {"event_id": event_id, "type": type, "attempts": attempts, "error": error, "failed_at": failed_at}
+            for event_id, type, attempts, error, failed_at in rows
+        ]
+
+    # --- async API ---
+
+    async def append(self, event_id: str, type: str, payload: bytes) -> bool:
+        """Durably enqueue an event; False if it was already received"""
+        return await self._submit(self._append, event_id, type, payload)
+
+    async def claim(self, limit: int = 1) -> List[QueuedEvent]:
+        return await self._submit(self._claim, limit)
+
+    async def complete(self, event_id: str):
+        await self._submit(self._complete, event_id)
+
+    async def fail(self, event: QueuedEvent, error: str, permanent: bool = False) -> str:
+        """Schedule a retry or dead-letter the event; returns 'retry' or 'dead'"""
+        return await self._submit(self._fail, event, error, permanent)
+
+    async def requeue_dead(self, event_id: str) -> bool:
+        return await self._submit(self._requeue_dead, event_id)
+
+    async def purge(self, retention_seconds: float = WEBHOOK_RETENTION_SECONDS) -> int:
+        return await self._submit(self._purge, time.time() - retention_seconds)
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._submit(self._counts)
+
+    async def dead_letters(self, limit: int = 50) -> List[Dict]:
+        return await self._submit(self._dead_letters, limit)
+
+def _resolve(future: asyncio.Future, ok: bool, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
@@ -0,0 +1,225 @@
+"""
+Stripe webhook verification and background processing.
+
+The HTTP handler only verifies the signature and appends the event to the
+WebhookQueue; everything that talks to other services happens here, in a pool
+of worker tasks that claim queued events, dispatch them by type and record
+success, retry or dead-letter. Handlers must be safe to run more than once
+for the same event (delivery is at-least-once). The ledger does not
+de-duplicate on reference_id, and a credit that timed out or got a 5xx may
+still have been committed, so on every attempt after the first the handler
+looks for a credit carrying the PaymentIntent id before crediting again.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+import stripe
+
+from .webhook_queue import QueuedEvent, WebhookQueue
+
+# Configuration
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+WEBHOOK_TOLERANCE_SECONDS = int(os.getenv("WEBHOOK_TOLERANCE_SECONDS", "300"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_HANDLER_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_HANDLER_TIMEOUT_SECONDS", "30"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "1"))
+HAPPY_PAISA_LEDGER_API_URL = os.getenv("HAPPY_PAISA_LEDGER_API_URL", "http://happy-paisa-ledger:8004")
+SAMPLE_WINDOW = 10000
+# The ledger lists at most a user's latest 100 transactions
+LEDGER_LOOKBACK = 100
+
+logger = logging.getLogger(__name__)
+
+class PermanentEventError(Exception):
+    """Raised by a handler when retrying the event can never succeed"""
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """Build a Stripe-Signature header for payload, as Stripe does; used by tests and load tests"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def verify_signature(payload: bytes, header: str, secret: str, tolerance: int = WEBHOOK_TOLERANCE_SECONDS):
+    """Raise stripe.error.SignatureVerificationError unless header signs payload"""
+    stripe.WebhookSignature.verify_header(payload.decode("utf-8"), header, secret, tolerance=tolerance)
+
+def percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))], 2)
+
+class LedgerClient:
+    def __init__(self, base_url: str = HAPPY_PAISA_LEDGER_API_URL, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            timeout=httpx.Timeout(10.0, connect=2.0),
+            limits=httpx.Limits(max_connections=WEBHOOK_WORKERS * 2, max_keepalive_connections=WEBHOOK_WORKERS),
+        )
+
+    @staticmethod
+    def _check(response: httpx.Response, action: str):
+        if response.status_code >= 500 or response.status_code == 429:
+            raise RuntimeError(f"Ledger returned {response.status_code}")
+        if response.status_code >= 400:
+            raise PermanentEventError(f"Ledger rejected {action}: {response.status_code} {response.text[:200]}")
+
+    async def add_funds(self, user_id: str, amount: float, reference_id: str):
+        response = await self.client.post(
+            "/api/v1/add-funds",
+            json={"user_id": user_id, "amount": amount, "source": "stripe", "reference_id": reference_id},
+        )
+        self._check(response, "credit")
+        return response.json()
+
+    async def find_credit(self, user_id: str, reference_id: str) -> Optional[Dict]:
+        """A credit already applied with this reference among the user's recent transactions, if any"""
+        response = await self.client.get(f"/api/v1/transactions/{user_id}", params={"limit": LEDGER_LOOKBACK})
+        self._check(response, "transaction lookup")
+        for transaction in response.json() or []:
+            if transaction.get("transaction_type") == "credit" and transaction.get("reference_id") == reference_id:
+                return transaction
+        return None
+
+    async def close(self):
+        await self.client.aclose()
+
+async def handle_payment_succeeded(event: Dict, ledger: LedgerClient, attempt: int = 1):
+    """Credit the paying user's wallet with the amount received, exactly once"""
+    intent = event["data"]["object"]
+    user_id = (intent.get("metadata") or {}).get("user_id")
+    if not user_id:
+        raise PermanentEventError(f"PaymentIntent {intent.get('id')} has no metadata.user_id")
+    if attempt > 1 and await ledger.find_credit(user_id, intent["id"]) is not None:
+        logger.info(f"PaymentIntent {intent['id']} was already credited by an earlier attempt")
+        return
+    await ledger.add_funds(user_id, intent["amount_received"] / 100.0, intent["id"])
+
+async def handle_payment_failed(event: Dict, ledger: LedgerClient, attempt: int = 1):
+    intent = event["data"]["object"]
+    error = (intent.get("last_payment_error") or {}).get("message")
+    logger.info(f"PaymentIntent {intent.get('id')} failed: {error}")
+
+# Called as handler(event, ledger, attempt); attempt counts from 1, and an
+# event replayed from the dead letters always arrives with attempt > 1
+EventHandler = Callable[[Dict, LedgerClient, int], Awaitable[None]]
+
+DEFAULT_HANDLERS: Dict[str, EventHandler] = {
+    "payment_intent.succeeded": handle_payment_succeeded,
+    "payment_intent.payment_failed": handle_payment_failed,
+}
+
+class WebhookStats:
+    def __init__(self):
+        self.received = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.ignored = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.ack_ms: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+        self.processing_ms: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def summary(self) -> Dict:
+        return {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "ignored": self.ignored,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "ack_ms_p50": percentile(self.ack_ms, 50),
+            "ack_ms_p99": percentile(self.ack_ms, 99),
+            "processing_ms_p50": percentile(self.processing_ms, 50),
+            "processing_ms_p99": percentile(self.processing_ms, 99),
+        }
+
+class WebhookWorkerPool:
+    def __init__(
+        self,
+        queue: WebhookQueue,
+        ledger: Optional[LedgerClient] = None,
+        handlers: Optional[Dict[str, EventHandler]] = None,
+        workers: int = WEBHOOK_WORKERS,
+        stats: Optional[WebhookStats] = None,
+        poll_seconds: float = WEBHOOK_POLL_SECONDS,
+    ):
+        self.queue = queue
+        self.ledger = ledger or LedgerClient()
+        self.handlers = DEFAULT_HANDLERS if handlers is None else handlers
+        self.workers = workers
+        self.stats = stats or WebhookStats()
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Let in-flight events finish; anything unfinished is re-claimed after its lease expires"""
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after an append"""
+        self._wakeup.set()
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                events = await self.queue.claim(1)
+            except Exception as e:
+                logger.error(f"Claiming webhook events failed: {e}")
+                events = []
+            if not events:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for event in events:
+                await self._process(event)
+
+    async def _process(self, queued: QueuedEvent):
+        started = time.perf_counter()
+        handler = self.handlers.get(queued.type)
+        try:
+            if handler is not None:
+                event = json.loads(queued.payload)
+                await asyncio.wait_for(handler(event, self.ledger, queued.attempts), WEBHOOK_HANDLER_TIMEOUT_SECONDS)
+        except PermanentEventError as e:
+            await self.queue.fail(queued, str(e), permanent=True)
+            self.stats.dead_lettered += 1
+            logger.error(f"Webhook {queued.event_id} dead-lettered: {e}")
+            return
+        except Exception as e:
+            outcome = await self.queue.fail(queued, f"{type(e).__name__}: {e}")
+            if outcome == "dead":
+                self.stats.dead_lettered += 1
+                logger.error(f"Webhook {queued.event_id} dead-lettered after {queued.attempts} attempts: {e}")
+            else:
+                self.stats.retried += 1
+            return
+        await self.queue.complete(queued.event_id)
+        if handler is None:
+            self.stats.ignored += 1
+        else:
+            self.stats.processed += 1
+        self.stats.processing_ms.append((time.perf_counter() - started) * 1000)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for Payment Gateway intent creation
+Starts fake_stripe_server.py in-process and creates PaymentIntents
+concurrently two ways: calling the synchronous stripe SDK from a coroutine
+(what an async handler would do with it) and through the gateway's
+/v1/payments/create_payment_intent endpoint on the async client. Then resends
+every request with the same Idempotency-Key and checks none reach the fake
+server. Reports throughput, latency and event loop stalls for each.
+Run from the payment-gateway-service directory:
+
+    python bench_payments.py --requests 500 --concurrency 100 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+import uvicorn
+
+from fake_stripe_server import create_app
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))] if ordered else 0.0
+
+def start_fake_stripe(args) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(args.latency_ms, args.error_rate, args.seed), host="127.0.0.1", port=port, log_level="warning"
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+async def measure(name, calls, concurrency):
+    """Run calls with bounded concurrency while a ticker measures how long the event loop stalls"""
+    latencies, failures, stalls = [], 0, []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append((time.perf_counter() - started - 0.01) * 1000)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(call):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                failures += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick
+    print(f"   {name:<28} {len(calls) / elapsed:8.1f} req/s  p50 {percentile(latencies, 50):7.1f}ms  "
+          f"p99 {percentile(latencies, 99):7.1f}ms  max loop stall {max(stalls or [0]):7.1f}ms  failures {failures}")
+
+async def run(args, base_url):
+    import httpx
+    import stripe
+
+    from app import main
+
+    stripe.api_key = os.environ["STRIPE_SECRET_KEY"]
+    stripe.api_base = base_url
+    users = [str(uuid.uuid4()) for _ in range(args.requests)]
+
+    async def fetch_stats():
+        async with httpx.AsyncClient(base_url=base_url) as fake:
+            return (await fake.get("/_stats")).json()
+
+    def sync_call(user_id):
+        async def call():
+            stripe.PaymentIntent.create(amount=5000, currency="inr", metadata={"user_id": user_id},
+                                        idempotency_key=str(uuid.uuid4()))
+        return call
+
+    print(f"🚀 Creating {args.requests} PaymentIntents, {args.concurrency} at a time, "
+          f"fake Stripe latency ~{args.latency_ms:.0f}ms...")
+    await measure("blocking stripe SDK", [sync_call(u) for u in users], args.concurrency)
+
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway", timeout=60) as client:
+            keys = [str(uuid.uuid4()) for _ in users]
+
+            def gateway_call(user_id, key):
+                async def call():
+                    response = await client.post(
+                        "/v1/payments/create_payment_intent",
+                        json={"user_id": user_id, "amount": 5000, "currency": "inr"},
+                        headers={"Idempotency-Key": key},
+                    )
+                    response.raise_for_status()
+                return call
+
+            calls = [gateway_call(u, k) for u, k in zip(users, keys)]
+            before = await fetch_stats()
+            await measure("async client via gateway", calls, args.concurrency)
+            middle = await fetch_stats()
+            await measure("idempotent replays", calls, args.concurrency)
+            after = await fetch_stats()
+            stats = (await client.get("/v1/payments/intents/stats")).json()
+
+    print(f"\n📊 Upstream requests: first pass {middle['requests'] - before['requests']} "
+          f"(created {middle['created'] - before['created']}), replay pass {after['requests'] - middle['requests']}")
+    print(f"   gateway: {stats['stripe']}, idempotency: {stats['idempotency']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Payment intent creation benchmark against a fake Stripe server")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake Stripe 500s, retried by the client")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base_url = start_fake_stripe(args)
+    # The app reads its configuration at import time
+    data_dir = tempfile.mkdtemp(prefix="payments-bench-")
+    os.environ["STRIPE_SECRET_KEY"] = "sk_test_fake"
+    os.environ["STRIPE_API_BASE"] = base_url
+    os.environ["IDEMPOTENCY_DB_PATH"] = os.path.join(data_dir, "idempotency.sqlite")
+    os.environ["WEBHOOK_QUEUE_PATH"] = os.path.join(data_dir, "webhook-queue.sqlite")
+    asyncio.run(run(args, base_url))
+
+if __name__ == "__main__":
+    main()
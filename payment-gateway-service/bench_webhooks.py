@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for Payment Gateway webhooks
+Sends locally signed fake Stripe events to the app in-process at a sustained
+rate, with a share of redeliveries, against a mocked ledger with configurable
+latency and error rate. Reports acknowledged events/sec, ack latency, how
+many appends shared each SQLite commit and how long the workers took to drain
+the queue. Run from the payment-gateway-service directory:
+
+    python bench_webhooks.py --rate 1000 --seconds 10
+    python bench_webhooks.py --rate 500 --ledger-ms 50 --ledger-error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+
+def make_event(rng):
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {
+            "id": f"pi_{uuid.uuid4().hex[:24]}",
+            "amount_received": rng.randint(100, 500000),
+            "metadata": {"user_id": str(uuid.uuid4())},
+        }},
+    }
+
+async def run(args):
+    import httpx
+
+    from app import main
+    from app.webhooks import LedgerClient, percentile, sign_payload
+
+    rng = random.Random(args.seed)
+    credited = 0
+
+    async def fake_ledger(request):
+        nonlocal credited
+        await asyncio.sleep(args.ledger_ms / 1000.0)
+        if rng.random() < args.ledger_error_rate:
+            return httpx.Response(503)
+        credited += 1
+        return httpx.Response(200, json={"success": True})
+
+    secret = os.environ["STRIPE_WEBHOOK_SECRET"]
+    ack_ms, statuses = [], {}
+    sent = []
+
+    async with main.app.router.lifespan_context(main.app):
+        await main.webhook_workers.ledger.close()
+        main.webhook_workers.ledger = LedgerClient("http://ledger", transport=httpx.MockTransport(fake_ledger))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway") as client:
+
+            async def deliver(event):
+                payload = json.dumps(event).encode()
+                headers = {"Stripe-Signature": sign_payload(payload, secret), "Content-Type": "application/json"}
+                started = time.perf_counter()
+                response = await client.post("/v1/payments/webhook", content=payload, headers=headers)
+                ack_ms.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            total = int(args.rate * args.seconds)
+            print(f"🚀 Sending {total} events at {args.rate}/s ({args.duplicate_rate:.0%} redeliveries)...")
+            tasks = []
+            started = time.perf_counter()
+            for i in range(total):
+                # Open loop: keep to the schedule however slow the acks are
+                delay = started + i / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if sent and rng.random() < args.duplicate_rate:
+                    event = rng.choice(sent)
+                else:
+                    event = make_event(rng)
+                    sent.append(event)
+                tasks.append(asyncio.create_task(deliver(event)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+
+            drain_started = time.perf_counter()
+            while time.perf_counter() - drain_started < args.drain_timeout:
+                counts = await main.webhook_queue.counts()
+                if counts.get("pending", 0) + counts.get("processing", 0) == 0:
+                    break
+                await asyncio.sleep(0.05)
+            drain_seconds = time.perf_counter() - drain_started
+            stats = (await client.get(
+                "/internal/payments/webhooks/stats", headers={"X-Internal-Token": main.INTERNAL_API_TOKEN}
+            )).json()
+
+    print(f"\n📊 Acknowledged {sum(statuses.values())} deliveries in {elapsed:.2f}s "
+          f"({sum(statuses.values()) / elapsed:.0f} events/sec), statuses {statuses}")
+    print(f"   ack latency ms: p50 {percentile(ack_ms, 50)}  p99 {percentile(ack_ms, 99)}  max {max(ack_ms):.2f}")
+    print(f"   group commit: {stats['group_commit']['commits']} commits, "
+          f"{stats['group_commit']['ops_per_commit']} operations per commit")
+    print(f"   unique events {len(sent)}, duplicates detected {stats['events']['duplicates']}")
+    print(f"   drained {counts.get('done', 0)} events ({counts.get('dead_letters', 0)} dead-lettered) "
+          f"{drain_seconds:.2f}s after the last ack; ledger credits {credited}, retries {stats['events']['retried']}")
+    print(f"   processing ms: p50 {stats['events']['processing_ms_p50']}  p99 {stats['events']['processing_ms_p99']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Payment gateway webhook load test")
+    parser.add_argument("--rate", type=float, default=1000, help="deliveries per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--ledger-ms", type=float, default=20)
+    parser.add_argument("--ledger-error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--synchronous", choices=["FULL", "NORMAL"], default="FULL")
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time
+    os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_bench"
+    os.environ["WEBHOOK_QUEUE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="webhook-bench-"), "queue.sqlite")
+    os.environ["WEBHOOK_QUEUE_SYNCHRONOUS"] = args.synchronous
+    os.environ["WEBHOOK_WORKERS"] = str(args.workers)
+    os.environ["WEBHOOK_POLL_SECONDS"] = "0.05"
+    os.environ["INTERNAL_API_TOKEN"] = "bench-internal-token"
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
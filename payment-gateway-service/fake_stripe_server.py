@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Stripe API, for load tests
+Implements POST /v1/payment_intents with Stripe's form encoding, bearer/basic
+auth check and Idempotency-Key replay, plus a configurable response latency
+and rate of 500s. GET /_stats reports how many requests actually arrived and
+how many intents were created. Run from the payment-gateway-service directory:
+
+    python fake_stripe_server.py --port 12111 --latency-ms 150
+    STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_fake uvicorn app.main:app --port 8005
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+def create_app(latency_ms: float = 150, error_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI(title="Fake Stripe API")
+    rng = random.Random(seed)
+    intents = {}
+    stats = {"requests": 0, "created": 0, "replayed": 0, "errors": 0}
+
+    def error(status_code: int, message: str, error_type: str = "api_error"):
+        return JSONResponse(status_code=status_code, content={"error": {"type": error_type, "message": message}})
+
+    @app.post("/v1/payment_intents")
+    async def create_payment_intent(request: Request):
+        stats["requests"] += 1
+        if not request.headers.get("authorization"):
+            return error(401, "You did not provide an API key.", "invalid_request_error")
+        params = dict(parse_qsl((await request.body()).decode()))
+        await asyncio.sleep(rng.expovariate(1000.0 / latency_ms) if latency_ms else 0)
+
+        key = request.headers.get("idempotency-key")
+        if key and key in intents:
+            stats["replayed"] += 1
+            return JSONResponse(intents[key], headers={"Idempotent-Replayed": "true"})
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return error(500, "An unknown error occurred")
+        try:
+            amount = int(params["amount"])
+        except (KeyError, ValueError):
+            return error(400, "Missing required param: amount.", "invalid_request_error")
+        if amount < 50:
+            return error(400, "Amount must be at least 50 paise.", "invalid_request_error")
+
+        intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+        intent = {
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": amount,
+            "currency": params.get("currency", "inr"),
+            "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:24]}",
+            "status": "requires_payment_method",
+            "metadata": {k[len("metadata["):-1]: v for k, v in params.items() if k.startswith("metadata[")},
+            "created": int(time.time()),
+        }
+        if key:
+            intents[key] = intent
+        stats["created"] += 1
+        return intent
+
+    @app.get("/_stats")
+    async def fake_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Stripe API server")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=150, help="mean of an exponential response delay")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.error_rate, args.seed), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Test script for the Payment Gateway
+Runs in-process with locally signed webhook events, a mocked ledger and a
+mocked Stripe API:
+
+    python test_payments.py    (or: python -m pytest test_payments.py)
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_test")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fake")
+os.environ.setdefault("WEBHOOK_QUEUE_PATH", os.path.join(tempfile.mkdtemp(prefix="webhooks-test-"), "queue.sqlite"))
+os.environ.setdefault("INTERNAL_API_TOKEN", "internal-test-token")
+os.environ.setdefault("IDEMPOTENCY_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="idempotency-test-"), "keys.sqlite"))
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app import main
+from app.idempotency import IdempotencyConflict, IdempotencyStore
+from app.main import app
+from app.stripe_client import StripeClient, encode_form
+from app.webhook_queue import WebhookQueue
+from app.webhooks import LedgerClient, PermanentEventError, WebhookWorkerPool, sign_payload
+
+SECRET = os.environ["STRIPE_WEBHOOK_SECRET"]
+INTERNAL = {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}
+
+def make_event(event_type="payment_intent.succeeded", amount=2500, user_id=None):
+    intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "type": event_type,
+        "data": {"object": {
+            "id": intent_id,
+            "amount_received": amount,
+            "metadata": {"user_id": user_id or str(uuid.uuid4())},
+        }},
+    }
+
+def post_event(client, event, secret=SECRET):
+    payload = json.dumps(event).encode()
+    return client.post(
+        "/v1/payments/webhook",
+        content=payload,
+        headers={"Stripe-Signature": sign_payload(payload, secret), "Content-Type": "application/json"},
+    )
+
+def run_pool(ledger_handler, events, handlers=None, max_attempts=3, until=None, timeout=5.0):
+    """Queue events, run a worker pool against a mocked ledger until `until(queue_counts)` holds"""
+
+    async def scenario():
+        queue = WebhookQueue(
+            path=os.path.join(tempfile.mkdtemp(prefix="webhooks-test-"), "queue.sqlite"),
+            max_attempts=max_attempts,
+            backoff_base_seconds=0.01,
+        )
+        queue.start()
+        ledger = LedgerClient("http://ledger", transport=httpx.MockTransport(ledger_handler))
+        pool = WebhookWorkerPool(queue, ledger, handlers=handlers, workers=2, poll_seconds=0.01)
+        for event in events:
+            await queue.append(event["id"], event["type"], json.dumps(event).encode())
+        pool.start()
+        deadline = time.monotonic() + timeout
+        counts = await queue.counts()
+        while not until(counts) and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            counts = await queue.counts()
+        await pool.stop()
+        dead = await queue.dead_letters()
+        await ledger.close()
+        queue.stop()
+        return counts, dead, pool.stats
+
+    return asyncio.run(scenario())
+
+def test_signed_event_is_acknowledged_once():
+    with TestClient(app) as client:
+        event = make_event("customer.created")
+        first = post_event(client, event)
+        assert first.status_code == 200
+        assert first.json() == {"received": True, "duplicate": False}
+
+        again = post_event(client, event)
+        assert again.status_code == 200
+        assert again.json()["duplicate"] is True
+
+        stats = client.get("/internal/payments/webhooks/stats", headers=INTERNAL).json()
+        assert stats["events"]["duplicates"] >= 1
+        assert stats["events"]["ack_ms_p50"] is not None
+
+def test_bad_signature_is_rejected():
+    with TestClient(app) as client:
+        assert post_event(client, make_event(), secret="whsec_wrong").status_code == 400
+        response = client.post("/v1/payments/webhook", content=b"{}", headers={"Stripe-Signature": "t=1,v1=00"})
+        assert response.status_code == 400
+
+def test_payment_succeeded_credits_ledger():
+    credits = []
+
+    def ledger(request):
+        credits.append(json.loads(request.content))
+        return httpx.Response(200, json={"success": True})
+
+    event = make_event(amount=12345)
+    counts, dead, stats = run_pool(ledger, [event], until=lambda c: c.get("done") == 1)
+    assert counts.get("done") == 1 and not dead
+    assert credits == [{
+        "user_id": event["data"]["object"]["metadata"]["user_id"],
+        "amount": 123.45,
+        "source": "stripe",
+        "reference_id": event["data"]["object"]["id"],
+    }]
+    assert stats.processed == 1
+
+def test_transient_ledger_errors_are_retried():
+    responses = iter([503, 500, 200])
+
+    def ledger(request):
+        if request.method == "GET":
+            return httpx.Response(200, json=[])
+        return httpx.Response(next(responses), json={})
+
+    counts, dead, stats = run_pool(ledger, [make_event()], max_attempts=5, until=lambda c: c.get("done") == 1)
+    assert counts.get("done") == 1 and not dead
+    assert stats.retried == 2
+
+def test_credit_committed_before_timeout_is_not_repeated():
+    transactions = []
+    credits = 0
+
+    def ledger(request):
+        nonlocal credits
+        if request.method == "GET":
+            return httpx.Response(200, json=transactions)
+        body = json.loads(request.content)
+        credits += 1
+        transactions.append({"transaction_type": "credit", "amount": body["amount"], "reference_id": body["reference_id"]})
+        if credits == 1:
+            # Committed, but the response never makes it back
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json={"success": True})
+
+    counts, dead, stats = run_pool(ledger, [make_event()], max_attempts=8, until=lambda c: c.get("done") == 1)
+    assert counts.get("done") == 1 and not dead
+    assert credits == 1 and stats.retried == 1
+
+def test_exhausted_retries_are_dead_lettered():
+    def ledger(request):
+        return httpx.Response(503)
+
+    event = make_event()
+    counts, dead, stats = run_pool(ledger, [event], max_attempts=3, until=lambda c: c.get("dead_letters") == 1)
+    assert [d["event_id"] for d in dead] == [event["id"]]
+    assert dead[0]["attempts"] == 3
+    assert stats.retried == 2 and stats.dead_lettered == 1
+
+def test_permanent_errors_skip_retries():
+    async def reject(event, ledger, attempt):
+        raise PermanentEventError("unknown customer")
+
+    counts, dead, stats = run_pool(
+        lambda request: httpx.Response(200),
+        [make_event()],
+        handlers={"payment_intent.succeeded": reject},
+        until=lambda c: c.get("dead_letters") == 1,
+    )
+    assert dead[0]["attempts"] == 1
+    assert stats.retried == 0
+
+def test_unhandled_event_types_are_completed():
+    counts, dead, stats = run_pool(
+        lambda request: httpx.Response(500), [make_event("charge.refund.updated")], until=lambda c: c.get("done") == 1
+    )
+    assert counts.get("done") == 1
+    assert stats.ignored == 1
+
+def test_dead_letter_can_be_requeued():
+    async def scenario():
+        queue = WebhookQueue(path=os.path.join(tempfile.mkdtemp(prefix="webhooks-test-"), "queue.sqlite"), max_attempts=1)
+        queue.start()
+        await queue.append("evt_1", "payment_intent.succeeded", b"{}")
+        [claimed] = await queue.claim(5)
+        assert await queue.fail(claimed, "boom") == "dead"
+        assert await queue.claim(5) == []
+        assert await queue.requeue_dead("evt_1") is True
+        assert await queue.requeue_dead("evt_1") is False
+        [again] = await queue.claim(5)
+        counts = await queue.counts()
+        queue.stop()
+        return again, counts
+
+    again, counts = asyncio.run(scenario())
+    # Replays are never treated as a first attempt
+    assert again.event_id == "evt_1" and again.attempts == 2
+    assert counts["dead_letters"] == 0 and counts["processing"] == 1
+
+def test_replayed_dead_letter_is_not_credited_twice():
+    transactions = []
+    credits = 0
+
+    def ledger(request):
+        nonlocal credits
+        if request.method == "GET":
+            return httpx.Response(200, json=transactions)
+        body = json.loads(request.content)
+        credits += 1
+        transactions.append({"transaction_type": "credit", "amount": body["amount"], "reference_id": body["reference_id"]})
+        # Committed, but the only attempt reports a server error
+        return httpx.Response(503 if credits == 1 else 200, json={})
+
+    async def scenario():
+        queue = WebhookQueue(
+            path=os.path.join(tempfile.mkdtemp(prefix="webhooks-test-"), "queue.sqlite"),
+            max_attempts=1,
+            backoff_base_seconds=0.01,
+        )
+        queue.start()
+        client = LedgerClient("http://ledger", transport=httpx.MockTransport(ledger))
+        pool = WebhookWorkerPool(queue, client, workers=1, poll_seconds=0.01)
+        event = make_event()
+        await queue.append(event["id"], event["type"], json.dumps(event).encode())
+        pool.start()
+
+        async def wait_for(status):
+            deadline = time.monotonic() + 5.0
+            while not (await queue.counts()).get(status) and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+
+        await wait_for("dead_letters")
+        assert await queue.requeue_dead(event["id"]) is True
+        await wait_for("done")
+        counts = await queue.counts()
+        await pool.stop()
+        await client.close()
+        queue.stop()
+        return counts
+
+    counts = asyncio.run(scenario())
+    assert counts.get("done") == 1 and not counts.get("dead_letters")
+    assert credits == 1 and len(transactions) == 1
+
+def test_webhook_operator_routes_are_internal_only():
+    with TestClient(app) as client:
+        # Not reachable under the /v1/payments prefix Kong forwards
+        assert client.get("/v1/payments/webhooks/stats").status_code == 404
+        assert client.get("/v1/payments/webhooks/dead-letters").status_code == 404
+        assert client.post("/v1/payments/webhooks/dead-letters/evt_1/retry").status_code == 404
+        assert client.get("/internal/payments/webhooks/dead-letters").status_code == 403
+        assert client.get("/internal/payments/webhooks/stats", headers={"X-Internal-Token": "guess"}).status_code == 403
+        assert client.post("/internal/payments/webhooks/dead-letters/evt_1/retry").status_code == 403
+        assert client.get("/internal/payments/webhooks/dead-letters", headers=INTERNAL).status_code == 200
+        assert client.post("/internal/payments/webhooks/dead-letters/evt_missing/retry", headers=INTERNAL).status_code == 404
+
+def test_expired_lease_is_reclaimed():
+    async def scenario():
+        queue = WebhookQueue(path=os.path.join(tempfile.mkdtemp(prefix="webhooks-test-"), "queue.sqlite"), lease_seconds=0.05)
+        queue.start()
+        await queue.append("evt_1", "payment_intent.succeeded", b"{}")
+        first = await queue.claim(5)
+        held = await queue.claim(5)
+        await asyncio.sleep(0.1)
+        reclaimed = await queue.claim(5)
+        queue.stop()
+        return first, held, reclaimed
+
+    first, held, reclaimed = asyncio.run(scenario())
+    assert len(first) == 1 and held == []
+    assert reclaimed[0].attempts == 2
+
+def test_concurrent_appends_share_commits():
+    async def scenario():
+        queue = WebhookQueue(path=os.path.join(tempfile.mkdtemp(prefix="webhooks-test-"), "queue.sqlite"))
+        queue.start()
+        results = await asyncio.gather(*(queue.append(f"evt_{i}", "t", b"{}") for i in range(200)))
+        counts = await queue.counts()
+        queue.stop()
+        return results, counts, queue.commits
+
+    results, counts, commits = asyncio.run(scenario())
+    assert all(results) and counts["pending"] == 200
+    assert commits < 200
+
+class FakeStripe:
+    """MockTransport handler that records requests and replies from a script of status codes"""
+
+    def __init__(self, statuses=(200,)):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        code = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        if code == 402:
+            return httpx.Response(402, json={"error": {"type": "card_error", "message": "Your card was declined."}})
+        if code != 200:
+            return httpx.Response(code, headers={"Retry-After": "0"}, json={"error": {"message": "try again"}})
+        return httpx.Response(200, json={
+            "id": f"pi_{len(self.requests)}", "client_secret": "pi_secret", "amount": 5000,
+            "currency": "inr", "status": "requires_payment_method",
+        })
+
+def create_intent(client, fake, key=None, **body):
+    main.stripe_client = StripeClient("sk_test_fake", "https://stripe.test", transport=httpx.MockTransport(fake))
+    headers = {"Idempotency-Key": key} if key else {}
+    payload = {"user_id": "user-1", "amount": 5000, **body}
+    return client.post("/v1/payments/create_payment_intent", json=payload, headers=headers)
+
+def test_form_encoding_matches_stripe():
+    assert encode_form({"amount": 5, "metadata": {"user_id": "u"}, "automatic_payment_methods": {"enabled": True}, "x": None}) == {
+        "amount": "5", "metadata[user_id]": "u", "automatic_payment_methods[enabled]": "true",
+    }
+
+def test_create_intent_replays_retries_with_same_key():
+    fake = FakeStripe()
+    with TestClient(app) as client:
+        first = create_intent(client, fake, key="order-1")
+        assert first.status_code == 200
+        assert first.json()["id"] == "pi_1" and first.json()["replayed"] is False
+        upstream = fake.requests[0]
+        assert upstream.headers["idempotency-key"] and b"metadata%5Buser_id%5D=user-1" in upstream.content
+
+        again = create_intent(client, fake, key="order-1")
+        assert again.json()["id"] == "pi_1" and again.json()["replayed"] is True
+        assert len(fake.requests) == 1
+
+        # Keys are per user, and a key reused with a different body is refused
+        assert create_intent(client, fake, key="order-1", user_id="user-2").json()["replayed"] is False
+        assert create_intent(client, fake, key="order-1", amount=9999).status_code == 422
+
+def test_create_intent_generates_key_when_missing():
+    fake = FakeStripe()
+    with TestClient(app) as client:
+        response = create_intent(client, fake)
+        assert response.status_code == 200
+        assert uuid.UUID(response.json()["idempotency_key"])
+
+def test_transient_stripe_errors_are_retried_with_same_key():
+    fake = FakeStripe([500, 429, 200])
+    with TestClient(app) as client:
+        response = create_intent(client, fake, key="order-retry")
+        assert response.status_code == 200
+        assert len(fake.requests) == 3
+        assert len({r.headers["idempotency-key"] for r in fake.requests}) == 1
+
+def test_stripe_outage_is_not_stored():
+    with TestClient(app) as client:
+        assert create_intent(client, FakeStripe([503]), key="order-down").status_code == 502
+        recovered = FakeStripe()
+        assert create_intent(client, recovered, key="order-down").status_code == 200
+        assert len(recovered.requests) == 1
+
+def test_stripe_auth_errors_are_not_stored():
+    with TestClient(app) as client:
+        # Our own key being rejected is an outage, not an answer about the request
+        response = create_intent(client, FakeStripe([401]), key="order-bad-key")
+        assert response.status_code == 503
+        assert create_intent(client, FakeStripe([403]), key="order-bad-key").status_code == 503
+        recovered = FakeStripe()
+        assert create_intent(client, recovered, key="order-bad-key").status_code == 200
+        assert len(recovered.requests) == 1
+
+def test_card_errors_are_replayed():
+    fake = FakeStripe([402])
+    with TestClient(app) as client:
+        assert create_intent(client, fake, key="order-declined").status_code == 402
+        assert create_intent(client, fake, key="order-declined").status_code == 402
+        assert len(fake.requests) == 1
+
+def test_concurrent_requests_share_one_call():
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 200, {"id": "pi_1"}
+
+    async def scenario():
+        store = IdempotencyStore(os.path.join(tempfile.mkdtemp(prefix="idempotency-test-"), "keys.sqlite"))
+        store.open()
+        results = await asyncio.gather(*(store.run("k", "h", operation) for _ in range(10)))
+        try:
+            await store.run("k", "other", operation)
+        except IdempotencyConflict:
+            conflict = True
+        else:
+            conflict = False
+        store.close()
+        return results, conflict
+
+    results, conflict = asyncio.run(scenario())
+    assert calls == 1 and conflict
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(outcome == (200, {"id": "pi_1"}) for outcome, _ in results)
+
+if __name__ == "__main__":
+    print("🧪 Testing Payment Gateway...")
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n🎉 All Payment Gateway tests completed!")
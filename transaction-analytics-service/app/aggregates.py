@@ -0,0 +1,156 @@
+"""
+Vectorized aggregates over a user's TransactionColumns.
+
+Every function here is a handful of whole-array NumPy operations (masks,
+bincount, cumsum): grouping is done by turning the group key into a small
+integer and letting np.bincount sum the weights, so cost is linear in the
+number of rows with no per-row Python. Amounts come back in paise; the API
+layer converts to Happy Paisa.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .columns import NO_COUNTERPARTY, TransactionColumns
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+EPOCH_WEEKDAY_OFFSET = 3
+PERIODS = ("day", "week", "month")
+
+def time_mask(columns: TransactionColumns, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+    """Rows with start <= timestamp < end"""
+    timestamps = columns.timestamp
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        mask &= timestamps >= start
+    if end is not None:
+        mask &= timestamps < end
+    return mask
+
+def flows(amounts: np.ndarray):
+    """(inflow, outflow) per row, both non-negative"""
+    return np.maximum(amounts, 0), np.maximum(-amounts, 0)
+
+def period_keys(timestamps: np.ndarray, period: str) -> np.ndarray:
+    """Integer bucket per row: days, Monday-based weeks, or months since the epoch"""
+    days = timestamps // SECONDS_PER_DAY
+    if period == "day":
+        return days
+    if period == "week":
+        return (days + EPOCH_WEEKDAY_OFFSET) // 7
+    if period == "month":
+        if not len(days):
+            return days
+        # Convert each distinct day once through a lookup table rather than every row through datetime64
+        first = days.min()
+        table = np.arange(first, days.max() + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        return table[days - first]
+    raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+
+def group_sums(keys: np.ndarray, inflow: np.ndarray, outflow: np.ndarray):
+    """(keys present, inflow, outflow, count) per key; keys are small dense integers, so bincount replaces sorting"""
+    first = keys.min()
+    index = keys - first
+    counts = np.bincount(index)
+    present = np.flatnonzero(counts)
+    received = np.bincount(index, weights=inflow, minlength=len(counts))[present]
+    spent = np.bincount(index, weights=outflow, minlength=len(counts))[present]
+    return present + first, received, spent, counts[present]
+
+def period_label(key: int, period: str) -> str:
+    if period == "day":
+        return str(np.datetime64(int(key), "D"))
+    if period == "week":
+        return str(np.datetime64(int(key) * 7 - EPOCH_WEEKDAY_OFFSET, "D"))
+    return str(np.datetime64(int(key), "M"))
+
+def category_totals(columns: TransactionColumns, categories: List[str],
+                    start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+    mask = time_mask(columns, start, end)
+    codes = columns.category[mask]
+    inflow, outflow = flows(columns.amount[mask])
+    size = len(categories)
+    spent = np.bincount(codes, weights=outflow, minlength=size)
+    received = np.bincount(codes, weights=inflow, minlength=size)
+    counts = np.bincount(codes, minlength=size)
+    total_spent = spent.sum()
+    rows = []
+    for code in np.flatnonzero(counts)[np.argsort(-spent[counts > 0], kind="stable")]:
+        rows.append({
+            "category": categories[code],
+            "spent": int(spent[code]),
+            "received": int(received[code]),
+            "count": int(counts[code]),
+            "percentage": round(float(spent[code] / total_spent * 100), 1) if total_spent else 0.0,
+        })
+    return rows
+
+def period_totals(columns: TransactionColumns, period: str,
+                  start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+    mask = time_mask(columns, start, end)
+    if not mask.any():
+        return []
+    inflow, outflow = flows(columns.amount[mask])
+    keys, received, spent, counts = group_sums(period_keys(columns.timestamp[mask], period), inflow, outflow)
+    return [
+        {"period": period_label(key, period), "received": int(r), "spent": int(s), "net": int(r - s), "count": int(c)}
+        for key, r, s, c in zip(keys, received, spent, counts)
+    ]
+
+def counterparty_totals(columns: TransactionColumns, counterparties: List[str], limit: int = 10,
+                        start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+    mask = time_mask(columns, start, end) & (columns.counterparty != NO_COUNTERPARTY)
+    codes = columns.counterparty[mask]
+    if not len(codes):
+        return []
+    inflow, outflow = flows(columns.amount[mask])
+    size = len(counterparties)
+    sent = np.bincount(codes, weights=outflow, minlength=size)
+    received = np.bincount(codes, weights=inflow, minlength=size)
+    counts = np.bincount(codes, minlength=size)
+    volume = sent + received
+    top = np.argsort(-volume, kind="stable")[:limit]
+    return [
+        {"counterparty": counterparties[code], "sent": int(sent[code]), "received": int(received[code]), "count": int(counts[code])}
+        for code in top if counts[code]
+    ]
+
+def weekday_activity(columns: TransactionColumns, start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+    """Transaction counts Monday..Sunday"""
+    days = columns.timestamp[time_mask(columns, start, end)] // SECONDS_PER_DAY
+    return np.bincount((days + EPOCH_WEEKDAY_OFFSET) % 7, minlength=7).tolist()
+
+def rolling_daily(columns: TransactionColumns, window_days: int, days: int, end: int) -> Dict:
+    """Daily spending and net flow for the `days` days before `end`, with trailing window_days statistics"""
+    last_day = (end - 1) // SECONDS_PER_DAY
+    first_day = last_day - days + 1
+    # Read window_days - 1 extra days so the first reported day has a full window
+    history_start = first_day - window_days + 1
+    mask = time_mask(columns, history_start * SECONDS_PER_DAY, (last_day + 1) * SECONDS_PER_DAY)
+    offsets = columns.timestamp[mask] // SECONDS_PER_DAY - history_start
+    amounts = columns.amount[mask]
+    length = days + window_days - 1
+    spent = np.bincount(offsets, weights=np.maximum(-amounts, 0), minlength=length)
+    net = np.bincount(offsets, weights=amounts, minlength=length)
+
+    def trailing_sum(values):
+        cumulative = np.concatenate(([0.0], np.cumsum(values)))
+        return cumulative[window_days:] - cumulative[:-window_days]
+
+    spent_sum = trailing_sum(spent)
+    spent_mean = spent_sum / window_days
+    # Var = E[x^2] - E[x]^2 over each window; clip the rounding noise below zero
+    spent_std = np.sqrt(np.maximum(trailing_sum(spent ** 2) / window_days - spent_mean ** 2, 0.0))
+    dates = np.arange(first_day, last_day + 1).astype("datetime64[D]")
+    return {
+        "window_days": window_days,
+        "dates": [str(d) for d in dates],
+        "spent": spent[window_days - 1:].astype(np.int64).tolist(),
+        "net": net[window_days - 1:].astype(np.int64).tolist(),
+        "rolling_spent": spent_sum.astype(np.int64).tolist(),
+        "rolling_mean_spent": np.round(spent_mean, 2).tolist(),
+        "rolling_std_spent": np.round(spent_std, 2).tolist(),
+        "rolling_net": trailing_sum(net).astype(np.int64).tolist(),
+    }
@@ -0,0 +1,172 @@
+"""
+Columnar storage for one user's transaction history.
+
+Each field is a NumPy array grown by doubling, so appending a batch costs
+amortised O(batch) and aggregates run over contiguous typed memory instead
+of lists of dicts. Amounts are integer paise (1/100 Happy Paisa) to keep
+sums exact; timestamps are UTC epoch seconds. Categories and counterparties
+are dictionary-encoded: the column holds a small integer code and the store
+keeps the code -> label table.
+"""
+
+import hashlib
+import math
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Transaction types as the ledger writes them (happy-paisa-ledger/app/service.go)
+TRANSACTION_TYPES = ["credit", "debit", "transfer_in", "transfer_out", "other"]
+TYPE_CODES = {name: code for code, name in enumerate(TRANSACTION_TYPES)}
+
+# First matching keyword in the description wins; otherwise the transaction type decides
+CATEGORY_RULES = [
+    ("Rewards", ("reward", "cashback", "bonus")),
+    ("Virtual Cards", ("card",)),
+    ("Bills", ("bill", "recharge", "electricity", "utility")),
+    ("Fees", ("fee",)),
+    ("Purchases", ("purchase", "order", "shop", "payment")),
+]
+TYPE_CATEGORIES = {"credit": "Top-ups", "transfer_in": "Received", "transfer_out": "Transfers"}
+DEFAULT_CATEGORIES = ["Top-ups", "Received", "Transfers", "Rewards", "Virtual Cards", "Bills", "Fees", "Purchases", "Other"]
+
+NO_COUNTERPARTY = -1
+INITIAL_CAPACITY = 64
+# Transaction times outside [2000-01-01, now + skew] are rejected: per-day and
+# per-month lookups allocate in proportion to the span between timestamps
+MIN_TIMESTAMP = 946684800
+MAX_CLOCK_SKEW_SECONDS = 86400
+# Per-row bound in paise (10 billion Happy Paisa): far above any real payment,
+# and low enough that summing millions of rows stays inside int64
+MAX_AMOUNT_PAISE = 10**12
+
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+_TRANSFER_PREFIX = re.compile(r"^transfer (to|from) user [0-9a-f-]+:\s*")
+
+def categorize(transaction_type: str, description: str) -> str:
+    # "Transfer to user <uuid>: <note>" - only the note says what the money was for
+    text = _TRANSFER_PREFIX.sub("", (description or "").lower())
+    for category, keywords in CATEGORY_RULES:
+        if any(keyword in text for keyword in keywords):
+            return category
+    return TYPE_CATEGORIES.get(transaction_type, "Other")
+
+def parse_amount(value) -> int:
+    """Integer paise from a Happy Paisa amount given as a number or numeric string"""
+    amount = float(value)
+    if not math.isfinite(amount) or abs(amount) * 100 > MAX_AMOUNT_PAISE:
+        raise ValueError(f"amount {value!r} is not a finite amount within {MAX_AMOUNT_PAISE // 100}")
+    return int(round(amount * 100))
+
+def parse_timestamp(value) -> int:
+    """Epoch seconds from epoch numbers or ISO 8601 / RFC 3339 strings (Go's nanosecond precision included)"""
+    if isinstance(value, (int, float)):
+        try:
+            timestamp = int(value)
+        except OverflowError:
+            raise ValueError(f"timestamp {value!r} is not finite")
+    else:
+        if isinstance(value, datetime):
+            parsed = value
+        else:
+            text = _FRACTION.sub(r"\1", str(value).strip().replace("Z", "+00:00"))
+            parsed = datetime.fromisoformat(text)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        timestamp = int(parsed.timestamp())
+    if not MIN_TIMESTAMP <= timestamp <= time.time() + MAX_CLOCK_SKEW_SECONDS:
+        raise ValueError(f"timestamp {value!r} is outside 2000-01-01 to now")
+    return timestamp
+
+def id_hash(transaction_id: Optional[str]) -> int:
+    """Stable 63-bit hash of a transaction ID for de-duplication; 0 means no ID"""
+    if not transaction_id:
+        return 0
+    digest = hashlib.blake2b(str(transaction_id).encode(), digest_size=8).digest()
+    return (int.from_bytes(digest, "little") >> 1) or 1
+
+class Vocabulary:
+    """Label <-> integer code table for a dictionary-encoded column"""
+
+    def __init__(self, labels: Optional[List[str]] = None):
+        self.labels: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for label in labels or []:
+            self.code(label)
+
+    def code(self, label: str) -> int:
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+class TransactionColumns:
+    FIELDS = {
+        "timestamp": np.int64,
+        "amount": np.int64,
+        "type": np.int8,
+        "category": np.int16,
+        "counterparty": np.int32,
+        "id_hash": np.int64,
+    }
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.size = 0
+        self._data = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.FIELDS.items()}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getattr__(self, name):
+        data = self.__dict__.get("_data")
+        if data is not None and name in data:
+            # A view of the filled part; callers must not keep it across appends
+            return data[name][:self.size]
+        raise AttributeError(name)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self._data.values())
+
+    def reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = len(self._data["timestamp"])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, array in self._data.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self._data[name] = grown
+
+    def append(self, batch: Dict[str, np.ndarray]):
+        count = len(batch["timestamp"])
+        self.reserve(count)
+        for name, array in self._data.items():
+            array[self.size:self.size + count] = batch[name]
+        self.size += count
+
+    def snapshot(self) -> "TransactionColumns":
+        """The rows present now, as views that later appends on other threads do not change"""
+        view = TransactionColumns.__new__(TransactionColumns)
+        # Size first: every array already holds at least that many written rows
+        view.size = self.size
+        view._data = {name: array[:view.size] for name, array in self._data.items()}
+        return view
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "TransactionColumns":
+        columns = cls(max(INITIAL_CAPACITY, len(arrays["timestamp"])))
+        columns.append(arrays)
+        return columns
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {name: array[:self.size].copy() for name, array in self._data.items()}
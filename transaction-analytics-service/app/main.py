@@ -0,0 +1,231 @@
+from fastapi import FastAPI, Header, HTTPException, Query, Request, status
+from fastapi.middleware.cors import CORSMiddleware
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import hmac
+import json
+import logging
+import os
+import time
+
+import httpx
+import numpy as np
+
+from . import aggregates, models
+from .columns import parse_timestamp
+from .store import AnalyticsStore
+
+app = FastAPI(title="Axzora Transaction Analytics", version="1.0.0")
+
+# CORS middleware for frontend connections
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Configure properly for production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+HAPPY_PAISA_LEDGER_API_URL = os.getenv("HAPPY_PAISA_LEDGER_API_URL", "http://happy-paisa-ledger:8004")
+ANALYTICS_SNAPSHOT_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_SECONDS", "300"))
+LEDGER_PAGE_LIMIT = 100
+# Shared secret for /internal routes, which Kong does not expose; unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+store = AnalyticsStore()
+ledger: Optional[httpx.AsyncClient] = None
+snapshot_task: Optional[asyncio.Task] = None
+
+def happy_paisa(paise) -> float:
+    return round(paise / 100, 2)
+
+def in_happy_paisa(rows: List[Dict], *fields: str) -> List[Dict]:
+    return [{**row, **{field: happy_paisa(row[field]) for field in fields}} for row in rows]
+
+def month_label(month: int) -> str:
+    return str(np.datetime64(month, "M"))
+
+def parse_time(value: Optional[str], name: str) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid {name}: {value!r}")
+
+def require_internal_token(token: Optional[str]):
+    if not INTERNAL_API_TOKEN or not token or not hmac.compare_digest(token, INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoint")
+
+def get_history(user_id: str):
+    history = store.history(user_id)
+    if history is None or not len(history.columns):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No transactions for this user")
+    return history
+
+async def snapshot_periodically():
+    while True:
+        await asyncio.sleep(ANALYTICS_SNAPSHOT_SECONDS)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, store.save)
+        except Exception as e:
+            logger.error(f"Analytics snapshot failed: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    global ledger, snapshot_task
+    loaded = store.load()
+    logger.info(f"Transaction analytics ready with {loaded} users")
+    ledger = httpx.AsyncClient(base_url=HAPPY_PAISA_LEDGER_API_URL, timeout=httpx.Timeout(10.0, connect=2.0))
+    snapshot_task = asyncio.create_task(snapshot_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    snapshot_task.cancel()
+    await asyncio.get_running_loop().run_in_executor(None, store.save)
+    await ledger.aclose()
+
+async def ndjson_records(request: Request):
+    """Decode an NDJSON body line by line as it arrives"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield decode_record(line)
+    if buffer.strip():
+        yield decode_record(buffer)
+
+def decode_record(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Handed on as-is so the store counts it as rejected
+        return line.decode(errors="replace")
+
+async def ingest(records: List) -> Dict:
+    """Encode and append on a worker thread; the store locks per user, so requests for others keep being served"""
+    return await asyncio.get_running_loop().run_in_executor(None, store.ingest, records)
+
+def merge_results(total: Dict, result: Dict):
+    for key in ("ingested", "duplicates", "rejected"):
+        total[key] += result[key]
+    total["errors"].extend(result["errors"][:5 - len(total["errors"])])
+
+def ingest_response(total: Dict) -> Dict:
+    # Partly valid bodies are accepted and report their rejects; nothing usable is an error
+    if total["rejected"] and not total["ingested"] and not total["duplicates"]:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail={"message": "No valid transactions", "errors": total["errors"]})
+    return total
+
+@app.post("/internal/analytics/transactions", response_model=models.IngestResponse)
+async def ingest_transactions(request: Request, x_internal_token: Optional[str] = Header(None)):
+    """Ingest ledger transactions, as a JSON array or streamed as NDJSON (application/x-ndjson)"""
+    require_internal_token(x_internal_token)
+    total = {"ingested": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    if "ndjson" in request.headers.get("content-type", ""):
+        batch = []
+        async for record in ndjson_records(request):
+            batch.append(record)
+            if len(batch) >= store.batch_size:
+                merge_results(total, await ingest(batch))
+                batch = []
+        merge_results(total, await ingest(batch))
+        return ingest_response(total)
+    try:
+        body = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid JSON")
+    records = body.get("transactions") if isinstance(body, dict) else body
+    if not isinstance(records, list):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Expected a list of transactions")
+    merge_results(total, await ingest(records))
+    return ingest_response(total)
+
+@app.post("/internal/analytics/users/{user_id}/sync", response_model=models.SyncResponse)
+async def sync_user(user_id: str, x_internal_token: Optional[str] = Header(None)):
+    """Pull the user's latest ledger transactions; rows already ingested are skipped"""
+    require_internal_token(x_internal_token)
+    try:
+        response = await ledger.get(f"/api/v1/transactions/{user_id}", params={"limit": LEDGER_PAGE_LIMIT})
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Ledger returned {e.response.status_code}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Ledger unavailable: {e!r}")
+    rows = response.json() or []
+    result = await ingest(rows)
+    return {"user_id": user_id, "fetched": len(rows), "ingested": result["ingested"], "duplicates": result["duplicates"]}
+
+@app.get("/v1/analytics/users/{user_id}/summary", response_model=models.SummaryResponse)
+async def get_summary(user_id: str, month: Optional[str] = Query(None, description="YYYY-MM, default the current month")):
+    """Precomputed totals for dashboards and "how much did I spend this month" answers"""
+    history = get_history(user_id)
+    summary = history.summary
+    try:
+        current = int(np.datetime64(month or datetime.now(timezone.utc).strftime("%Y-%m"), "M").astype(np.int64))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid month: {month!r}")
+    this_month, last_month = summary.month(current), summary.month(current - 1)
+    growth = None
+    if last_month["spent"]:
+        growth = round((this_month["spent"] - last_month["spent"]) / last_month["spent"] * 100, 1)
+    return {
+        "user_id": user_id,
+        "transactions": summary.count,
+        "total_received": happy_paisa(summary.received),
+        "total_spent": happy_paisa(summary.spent),
+        "first_transaction_at": datetime.fromtimestamp(summary.first_timestamp, timezone.utc).isoformat(),
+        "last_transaction_at": datetime.fromtimestamp(summary.last_timestamp, timezone.utc).isoformat(),
+        "this_month": {"month": month_label(current), **in_happy_paisa([this_month], "received", "spent", "net")[0]},
+        "last_month": {"month": month_label(current - 1), **in_happy_paisa([last_month], "received", "spent", "net")[0]},
+        "spending_growth_percent": growth,
+        "spending_categories": in_happy_paisa(summary.categories(store.categories.labels), "spent", "received"),
+        "weekly_activity": summary.weekday_count.tolist(),
+    }
+
+@app.get("/v1/analytics/users/{user_id}/categories", response_model=List[models.CategoryTotal])
+async def get_categories(user_id: str, start: Optional[str] = None, end: Optional[str] = None):
+    history = get_history(user_id)
+    rows = aggregates.category_totals(history.columns.snapshot(), store.categories.labels, parse_time(start, "start"), parse_time(end, "end"))
+    return in_happy_paisa(rows, "spent", "received")
+
+@app.get("/v1/analytics/users/{user_id}/periods", response_model=List[models.PeriodTotal])
+async def get_periods(user_id: str, period: str = Query("month", pattern="^(day|week|month)$"),
+                      start: Optional[str] = None, end: Optional[str] = None):
+    history = get_history(user_id)
+    rows = aggregates.period_totals(history.columns.snapshot(), period, parse_time(start, "start"), parse_time(end, "end"))
+    return in_happy_paisa(rows, "received", "spent", "net")
+
+@app.get("/v1/analytics/users/{user_id}/counterparties", response_model=List[models.CounterpartyTotal])
+async def get_counterparties(user_id: str, limit: int = Query(10, ge=1, le=100),
+                             start: Optional[str] = None, end: Optional[str] = None):
+    history = get_history(user_id)
+    rows = aggregates.counterparty_totals(history.columns.snapshot(), history.counterparties.labels, limit,
+                                          parse_time(start, "start"), parse_time(end, "end"))
+    return in_happy_paisa(rows, "sent", "received")
+
+@app.get("/v1/analytics/users/{user_id}/rolling", response_model=models.RollingResponse)
+async def get_rolling(user_id: str, window_days: int = Query(7, ge=1, le=365), days: int = Query(30, ge=1, le=730),
+                      end: Optional[str] = None):
+    """Daily spending and net flow with trailing-window sum, mean and standard deviation"""
+    history = get_history(user_id)
+    end_timestamp = parse_time(end, "end") or int(time.time())
+    result = aggregates.rolling_daily(history.columns.snapshot(), window_days, days, end_timestamp)
+    amounts = ("spent", "net", "rolling_spent", "rolling_mean_spent", "rolling_std_spent", "rolling_net")
+    return {"user_id": user_id, **result, **{key: [happy_paisa(v) for v in result[key]] for key in amounts}}
+
+@app.get("/internal/analytics/stats")
+async def get_stats(x_internal_token: Optional[str] = Header(None)):
+    require_internal_token(x_internal_token)
+    return store.stats()
+
+@app.get("/health")
+async def health_check():
+    return {"status": "ok", "service": "transaction-analytics-service"}
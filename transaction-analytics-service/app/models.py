@@ -0,0 +1,65 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class IngestResponse(BaseModel):
+    ingested: int
+    duplicates: int
+    rejected: int
+    errors: List[str] = []
+
+class CategoryTotal(BaseModel):
+    category: str
+    spent: float
+    received: float
+    count: int
+    percentage: float
+
+class PeriodTotal(BaseModel):
+    period: str
+    received: float
+    spent: float
+    net: float
+    count: int
+
+class CounterpartyTotal(BaseModel):
+    counterparty: str
+    sent: float
+    received: float
+    count: int
+
+class MonthTotals(BaseModel):
+    month: str
+    received: float
+    spent: float
+    net: float
+    count: int
+
+class SummaryResponse(BaseModel):
+    user_id: str
+    transactions: int
+    total_received: float
+    total_spent: float
+    first_transaction_at: Optional[str] = None
+    last_transaction_at: Optional[str] = None
+    this_month: MonthTotals
+    last_month: MonthTotals
+    spending_growth_percent: Optional[float] = None
+    spending_categories: List[CategoryTotal]
+    weekly_activity: List[int]
+
+class RollingResponse(BaseModel):
+    user_id: str
+    window_days: int
+    dates: List[str]
+    spent: List[float]
+    net: List[float]
+    rolling_spent: List[float]
+    rolling_mean_spent: List[float]
+    rolling_std_spent: List[float]
+    rolling_net: List[float]
+
+class SyncResponse(BaseModel):
+    user_id: str
+    fetched: int
+    ingested: int
+    duplicates: int
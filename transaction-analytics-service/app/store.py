@@ -0,0 +1,293 @@
+"""
+In-memory analytics store: one columnar history plus running summary per user.
+
+Records are consumed from any iterable in fixed-size chunks, so a history
+streamed from a request body or a file is encoded into arrays chunk by chunk
+instead of being materialised as a list of dicts. Rows carrying a ledger
+transaction ID are de-duplicated against a sorted array of ID hashes, so
+re-syncing an overlapping page from the ledger is harmless. The store is
+snapshotted to ANALYTICS_DATA_DIR as one .npz per user and reloaded at
+start-up; summaries are rebuilt from the columns on load.
+
+ingest and save run on executor threads. The store lock guards the shared
+vocabularies and bookkeeping; each history has its own lock for appends
+and snapshot copies, so one user's write never waits on another's.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .columns import (
+    DEFAULT_CATEGORIES,
+    NO_COUNTERPARTY,
+    TYPE_CODES,
+    TransactionColumns,
+    Vocabulary,
+    categorize,
+    id_hash,
+    parse_amount,
+    parse_timestamp,
+)
+from .summary import UserSummary
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ANALYTICS_DATA_DIR = os.getenv("ANALYTICS_DATA_DIR", "/app/data")
+ANALYTICS_INGEST_BATCH = int(os.getenv("ANALYTICS_INGEST_BATCH", "50000"))
+MAX_REPORTED_ERRORS = 5
+CATEGORY_MEMO_SIZE = 100000
+# Category codes are int16; client-supplied labels beyond this count as "Other"
+MAX_CATEGORIES = 1000
+
+class UserHistory:
+    def __init__(self):
+        self.columns = TransactionColumns()
+        self.summary = UserSummary()
+        self.counterparties = Vocabulary()
+        self._seen = np.zeros(0, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    def add(self, batch: Dict[str, np.ndarray]) -> int:
+        """Append rows whose transaction ID has not been seen; returns how many were added"""
+        with self.lock:
+            return self._add(batch)
+
+    def _add(self, batch: Dict[str, np.ndarray]) -> int:
+        hashes = batch["id_hash"]
+        keep = hashes == 0
+        with_id = np.flatnonzero(~keep)
+        if len(with_id):
+            # First occurrence within the batch, and not already stored
+            _, first = np.unique(hashes[with_id], return_index=True)
+            candidates = with_id[first]
+            if len(self._seen):
+                position = np.minimum(np.searchsorted(self._seen, hashes[candidates]), len(self._seen) - 1)
+                known = self._seen[position] == hashes[candidates]
+            else:
+                known = np.zeros(len(candidates), dtype=bool)
+            keep[candidates[~known]] = True
+        if not keep.all():
+            batch = {name: array[keep] for name, array in batch.items()}
+        if not len(batch["timestamp"]):
+            return 0
+        # Allocate first and append last, so a failure part-way leaves columns,
+        # summary and seen IDs agreeing with each other
+        seen = self._seen
+        new_hashes = np.sort(batch["id_hash"][batch["id_hash"] != 0])
+        if len(new_hashes):
+            seen = np.insert(seen, np.searchsorted(seen, new_hashes), new_hashes)
+        self.columns.reserve(len(batch["timestamp"]))
+        self.summary.update(batch)
+        self.columns.append(batch)
+        self._seen = seen
+        return len(batch["timestamp"])
+
+class AnalyticsStore:
+    def __init__(self, data_dir: Optional[str] = ANALYTICS_DATA_DIR, batch_size: int = ANALYTICS_INGEST_BATCH):
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.users: Dict[str, UserHistory] = {}
+        self.categories = Vocabulary(DEFAULT_CATEGORIES)
+        self._category_memo: Dict = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.ingested = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def history(self, user_id: str) -> Optional[UserHistory]:
+        return self.users.get(user_id)
+
+    def _history_for(self, user_id: str) -> UserHistory:
+        history = self.users.get(user_id)
+        if history is None:
+            history = self.users[user_id] = UserHistory()
+        return history
+
+    def _category_code(self, transaction_type: str, description: str, category: Optional[str]) -> int:
+        if category:
+            category = str(category)
+            if category not in self.categories.codes and len(self.categories) >= MAX_CATEGORIES:
+                category = "Other"
+            return self.categories.code(category)
+        key = (transaction_type, description)
+        code = self._category_memo.get(key)
+        if code is None:
+            if len(self._category_memo) >= CATEGORY_MEMO_SIZE:
+                self._category_memo.clear()
+            code = self._category_memo[key] = self.categories.code(categorize(transaction_type, description))
+        return code
+
+    def ingest(self, records: Iterable[Dict]) -> Dict:
+        """Encode and append ledger-shaped transaction records, batch_size rows at a time"""
+        result = {"ingested": 0, "duplicates": 0, "rejected": 0, "errors": []}
+        iterator = iter(records)
+        offset = 0
+        while True:
+            chunk = list(islice(iterator, self.batch_size))
+            if not chunk:
+                break
+            self._ingest_chunk(chunk, offset, result)
+            offset += len(chunk)
+        with self._lock:
+            self.ingested += result["ingested"]
+            self.duplicates += result["duplicates"]
+            self.rejected += result["rejected"]
+        return result
+
+    def _ingest_chunk(self, chunk: List[Dict], offset: int, result: Dict):
+        user_ids: List[str] = []
+        user_codes: Dict[str, int] = {}
+        owners = []
+        columns = [[] for _ in TransactionColumns.FIELDS]
+        # Vocabularies are shared with ingests running on other threads
+        with self._lock:
+            for index, record in enumerate(chunk, offset):
+                try:
+                    if not isinstance(record, dict):
+                        raise ValueError(f"not a JSON object: {str(record)[:80]}")
+                    user_id = str(record["user_id"])
+                    amount = parse_amount(record["amount"])
+                    timestamp = parse_timestamp(record["created_at"])
+                    transaction_type = record.get("transaction_type") or ("credit" if amount >= 0 else "debit")
+                    type_code = TYPE_CODES.get(transaction_type, TYPE_CODES["other"])
+                    counterparty = record.get("recipient_id") or record.get("counterparty")
+                    category = self._category_code(transaction_type, str(record.get("description") or ""), record.get("category"))
+                    transaction_hash = id_hash(record.get("id"))
+                    # Only a fully parsed row may create the user's history
+                    history = self._history_for(user_id)
+                    values = (
+                        timestamp,
+                        amount,
+                        type_code,
+                        category,
+                        history.counterparties.code(str(counterparty)) if counterparty else NO_COUNTERPARTY,
+                        transaction_hash,
+                    )
+                except (KeyError, TypeError, ValueError) as e:
+                    result["rejected"] += 1
+                    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                        result["errors"].append(f"record {index}: {e!r}")
+                    continue
+                code = user_codes.get(user_id)
+                if code is None:
+                    code = user_codes[user_id] = len(user_ids)
+                    user_ids.append(user_id)
+                owners.append(code)
+                for column, value in zip(columns, values):
+                    column.append(value)
+        if not owners:
+            return
+        # Encode the whole chunk once, then hand each user a contiguous slice of it
+        arrays = {
+            name: np.asarray(values, dtype=dtype)
+            for (name, dtype), values in zip(TransactionColumns.FIELDS.items(), columns)
+        }
+        owners = np.asarray(owners, dtype=np.int64)
+        order = np.argsort(owners, kind="stable")
+        arrays = {name: array[order] for name, array in arrays.items()}
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(owners, minlength=len(user_ids)))))
+        for code, user_id in enumerate(user_ids):
+            start, stop = bounds[code], bounds[code + 1]
+            batch = {name: array[start:stop] for name, array in arrays.items()}
+            added = self.add_batch(user_id, batch)
+            result["ingested"] += added
+            result["duplicates"] += int(stop - start) - added
+
+    def add_batch(self, user_id: str, batch: Dict[str, np.ndarray]) -> int:
+        """Append already-encoded column arrays for one user"""
+        with self._lock:
+            history = self._history_for(user_id)
+        added = history.add(batch)
+        if added:
+            with self._lock:
+                self._dirty.add(user_id)
+        return added
+
+    def stats(self) -> Dict:
+        with self._lock:
+            histories = list(self.users.values())
+            unsaved = len(self._dirty)
+        return {
+            "users": len(histories),
+            "transactions": sum(len(h.columns) for h in histories),
+            "column_bytes": sum(h.columns.nbytes for h in histories),
+            "categories": len(self.categories),
+            "ingested": self.ingested,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "unsaved_users": unsaved,
+        }
+
+    @staticmethod
+    def _snapshot_name(user_id: str) -> str:
+        return hashlib.sha256(user_id.encode()).hexdigest()[:32] + ".npz"
+
+    def save(self) -> int:
+        """Write the histories changed since the last save; returns how many users were written"""
+        if not self.data_dir:
+            return 0
+        with self._save_lock:
+            os.makedirs(self.data_dir, exist_ok=True)
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                categories = list(self.categories.labels)
+            written = 0
+            try:
+                for user_id in list(dirty):
+                    history = self.users[user_id]
+                    # Copy under the user's lock, write without holding it
+                    with history.lock:
+                        arrays = history.columns.to_arrays()
+                        counterparties = list(history.counterparties.labels)
+                    fd, temp_path = tempfile.mkstemp(dir=self.data_dir, suffix=".tmp")
+                    with os.fdopen(fd, "wb") as f:
+                        np.savez(f, user_id=np.array(user_id), counterparties=np.array(counterparties, dtype=str), **arrays)
+                    os.replace(temp_path, os.path.join(self.data_dir, self._snapshot_name(user_id)))
+                    dirty.discard(user_id)
+                    written += 1
+                self._write_index(categories)
+            finally:
+                # Histories not written yet are retried by the next save
+                with self._lock:
+                    self._dirty |= dirty
+        return written
+
+    def _write_index(self, categories: List[str]):
+        fd, temp_path = tempfile.mkstemp(dir=self.data_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"categories": categories}, f)
+        os.replace(temp_path, os.path.join(self.data_dir, "index.json"))
+
+    def load(self) -> int:
+        """Rebuild the store from a snapshot directory; returns how many users were loaded"""
+        if not self.data_dir or not os.path.exists(os.path.join(self.data_dir, "index.json")):
+            return 0
+        with open(os.path.join(self.data_dir, "index.json")) as f:
+            self.categories = Vocabulary(json.load(f)["categories"])
+        self.users.clear()
+        for name in os.listdir(self.data_dir):
+            path = os.path.join(self.data_dir, name)
+            if name.endswith(".tmp"):
+                # Leftover from a save that was interrupted
+                os.unlink(path)
+                continue
+            if not name.endswith(".npz"):
+                continue
+            with np.load(path) as snapshot:
+                history = UserHistory()
+                history.counterparties = Vocabulary(snapshot["counterparties"].tolist())
+                history.add({field: snapshot[field] for field in TransactionColumns.FIELDS})
+                self.users[str(snapshot["user_id"])] = history
+        logger.info(f"Loaded {len(self.users)} transaction histories from {self.data_dir}")
+        return len(self.users)
@@ -0,0 +1,86 @@
+"""
+Per-user running summary, updated incrementally.
+
+The dashboard and "how much did I spend this month" only need totals per
+category, per month and per weekday. Those are folded in batch by batch as
+transactions are ingested (one bincount per batch), so reading them is
+independent of how long the user's history is.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from .aggregates import EPOCH_WEEKDAY_OFFSET, SECONDS_PER_DAY, flows, group_sums, period_keys
+
+class UserSummary:
+    def __init__(self):
+        self.count = 0
+        self.received = 0
+        self.spent = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.category_spent = np.zeros(0, dtype=np.int64)
+        self.category_received = np.zeros(0, dtype=np.int64)
+        self.category_count = np.zeros(0, dtype=np.int64)
+        self.weekday_count = np.zeros(7, dtype=np.int64)
+        # months since 1970-01 -> [received, spent, count]
+        self.months: Dict[int, List[int]] = {}
+
+    def _grow_categories(self, size: int):
+        if size > len(self.category_spent):
+            extra = size - len(self.category_spent)
+            self.category_spent = np.concatenate((self.category_spent, np.zeros(extra, dtype=np.int64)))
+            self.category_received = np.concatenate((self.category_received, np.zeros(extra, dtype=np.int64)))
+            self.category_count = np.concatenate((self.category_count, np.zeros(extra, dtype=np.int64)))
+
+    def update(self, batch: Dict[str, np.ndarray]):
+        """Fold a batch of new rows (TransactionColumns field arrays) into the totals"""
+        timestamps, amounts, categories = batch["timestamp"], batch["amount"], batch["category"]
+        if not len(timestamps):
+            return
+        # Everything that allocates in proportion to the batch runs before any total
+        # changes, so a failure leaves the summary as it was
+        inflow, outflow = flows(amounts)
+        size = int(categories.max()) + 1
+        category_spent = np.bincount(categories, weights=outflow, minlength=size).astype(np.int64)
+        category_received = np.bincount(categories, weights=inflow, minlength=size).astype(np.int64)
+        category_count = np.bincount(categories, minlength=size)
+        days = timestamps // SECONDS_PER_DAY
+        weekday_count = np.bincount((days + EPOCH_WEEKDAY_OFFSET) % 7, minlength=7)
+        months, received, spent, counts = group_sums(period_keys(timestamps, "month"), inflow, outflow)
+        self._grow_categories(size)
+
+        self.count += len(timestamps)
+        self.received += int(inflow.sum())
+        self.spent += int(outflow.sum())
+        low, high = int(timestamps.min()), int(timestamps.max())
+        self.first_timestamp = low if self.first_timestamp is None else min(self.first_timestamp, low)
+        self.last_timestamp = high if self.last_timestamp is None else max(self.last_timestamp, high)
+        self.category_spent[:size] += category_spent
+        self.category_received[:size] += category_received
+        self.category_count[:size] += category_count
+        self.weekday_count += weekday_count
+        for month, r, s, c in zip(months.tolist(), received, spent, counts):
+            totals = self.months.setdefault(month, [0, 0, 0])
+            totals[0] += int(r)
+            totals[1] += int(s)
+            totals[2] += int(c)
+
+    def month(self, month: int) -> Dict:
+        received, spent, count = self.months.get(month, (0, 0, 0))
+        return {"received": received, "spent": spent, "net": received - spent, "count": count}
+
+    def categories(self, labels: List[str]) -> List[Dict]:
+        total = int(self.category_spent.sum())
+        rows = [
+            {
+                "category": labels[code],
+                "spent": int(self.category_spent[code]),
+                "received": int(self.category_received[code]),
+                "count": int(self.category_count[code]),
+                "percentage": round(float(self.category_spent[code] / total * 100), 1) if total else 0.0,
+            }
+            for code in np.flatnonzero(self.category_count)
+        ]
+        return sorted(rows, key=lambda row: -row["spent"])
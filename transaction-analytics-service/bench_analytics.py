@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Transaction Analytics Service
+Streams a synthetic cohort of ledger-shaped transactions (1M by default)
+through the store, then times the vectorized aggregates against the current
+approach of summing paged rows one by one in Python, the precomputed summary
+against recomputing it, and the incremental update when a few new
+transactions arrive. Run from the transaction-analytics-service directory:
+
+    python bench_analytics.py --rows 1000000 --users 1000 --heavy-share 0.1
+"""
+
+import argparse
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app import aggregates
+from app.columns import categorize
+from app.store import AnalyticsStore
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+DEBIT_REASONS = ["Service fee", "card purchase", "electricity bill", "mobile recharge", "online order", "cashback reversal"]
+
+def generate(args, users):
+    """Ledger-shaped records, produced lazily so the cohort is never held as dicts"""
+    rng = random.Random(args.seed)
+    friends = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(200)]
+    span = args.days * 86400
+    for _ in range(args.rows):
+        user = users[0] if rng.random() < args.heavy_share else rng.choice(users)
+        kind = rng.choices(("credit", "debit", "transfer_in", "transfer_out"), (2, 4, 1, 3))[0]
+        amount = round(rng.uniform(1, 2000), 2)
+        friend = rng.choice(friends)
+        if kind == "credit":
+            description = "Funds added: stripe"
+        elif kind == "debit":
+            description, amount = f"Funds deducted: {rng.choice(DEBIT_REASONS)}", -amount
+        elif kind == "transfer_in":
+            description = f"Transfer from user {friend}: split"
+        else:
+            description, amount = f"Transfer to user {friend}: dinner", -amount
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": user,
+            "amount": amount,
+            "transaction_type": kind,
+            "description": description,
+            "recipient_id": friend if kind.startswith("transfer") else None,
+            "created_at": (START + timedelta(seconds=rng.randrange(span))).isoformat(),
+        }
+
+def timed(function, repeat=5):
+    """Best of `repeat` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+def naive_aggregates(records):
+    """What paging /api/v1/transactions and summing row by row amounts to"""
+    categories = defaultdict(int)
+    months = defaultdict(lambda: [0, 0, 0])
+    people = defaultdict(int)
+    for record in records:
+        cents = int(round(record["amount"] * 100))
+        month = months[datetime.fromisoformat(record["created_at"]).strftime("%Y-%m")]
+        if cents < 0:
+            categories[categorize(record["transaction_type"], record["description"])] += -cents
+            month[1] += -cents
+        else:
+            month[0] += cents
+        month[2] += 1
+        if record["recipient_id"]:
+            people[record["recipient_id"]] += abs(cents)
+    return categories, months, people
+
+def main():
+    parser = argparse.ArgumentParser(description="Transaction analytics benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--heavy-share", type=float, default=0.1, help="share of rows belonging to one heavy user")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--naive-rows", type=int, default=100_000, help="rows of the heavy user to sum row by row")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    users = [str(uuid.UUID(int=i + 1)) for i in range(args.users)]
+    store = AnalyticsStore(data_dir=None)
+    print(f"🚀 Streaming {args.rows:,} transactions for {args.users} users ({args.heavy_share:.0%} to one heavy user)")
+    started = time.perf_counter()
+    result = store.ingest(generate(args, users))
+    elapsed = time.perf_counter() - started
+    stats = store.stats()
+    print(f"   ingested {result['ingested']:,} in {elapsed:.1f}s ({result['ingested'] / elapsed:,.0f} rows/s), "
+          f"{stats['column_bytes'] / 2**20:.1f} MiB of columns ({stats['column_bytes'] / stats['transactions']:.0f} B/row)")
+
+    heavy = store.history(users[0])
+    columns = heavy.columns
+    labels = store.categories.labels
+    end = int(START.timestamp()) + args.days * 86400
+    print(f"\n📊 Heavy user, {len(columns):,} transactions (best of 5)")
+    for name, function in (
+        ("categories", lambda: aggregates.category_totals(columns, labels)),
+        ("months", lambda: aggregates.period_totals(columns, "month")),
+        ("weeks", lambda: aggregates.period_totals(columns, "week")),
+        ("days", lambda: aggregates.period_totals(columns, "day")),
+        ("counterparties", lambda: aggregates.counterparty_totals(columns, heavy.counterparties.labels, 10)),
+        ("rolling 7d over 90d", lambda: aggregates.rolling_daily(columns, 7, 90, end)),
+        ("last 30 days categories", lambda: aggregates.category_totals(columns, labels, end - 30 * 86400, end)),
+        ("precomputed summary", lambda: (heavy.summary.categories(labels), heavy.summary.month(0))),
+    ):
+        ms, _ = timed(function)
+        print(f"   {name:<26}{ms:>9.2f}ms")
+
+    sample = [r for r in generate(argparse.Namespace(**{**vars(args), "heavy_share": 1.0, "rows": args.naive_rows}), users)]
+    ms, _ = timed(lambda: naive_aggregates(sample), repeat=1)
+    sample_store = AnalyticsStore(data_dir=None)
+    sample_store.ingest(sample)
+    sample_columns = sample_store.history(users[0]).columns
+    vector_ms, _ = timed(lambda: (
+        aggregates.category_totals(sample_columns, sample_store.categories.labels),
+        aggregates.period_totals(sample_columns, "month"),
+        aggregates.counterparty_totals(sample_columns, sample_store.history(users[0]).counterparties.labels),
+    ))
+    print(f"\n🐢 Categories + months + counterparties over {len(sample):,} rows: "
+          f"row by row {ms:,.0f}ms, vectorized {vector_ms:.1f}ms ({ms / vector_ms:,.0f}x)")
+
+    ms, _ = timed(lambda: [aggregates.category_totals(h.columns, labels) for h in store.users.values()], repeat=3)
+    summary_ms, _ = timed(lambda: [h.summary.categories(labels) for h in store.users.values()], repeat=3)
+    print(f"\n👥 Category breakdown for all {len(store.users)} users: recomputed {ms:.0f}ms, precomputed summaries {summary_ms:.0f}ms")
+
+    fresh = list(generate(argparse.Namespace(**{**vars(args), "heavy_share": 1.0, "rows": 10, "seed": args.seed + 1}), users))
+    started = time.perf_counter()
+    store.ingest(fresh)
+    ingest_ms = (time.perf_counter() - started) * 1000
+    ms, _ = timed(lambda: heavy.summary.categories(labels))
+    rebuild_ms, _ = timed(lambda: (aggregates.category_totals(columns, labels), aggregates.period_totals(columns, "month")))
+    print(f"\n➕ 10 new transactions for the heavy user: ingest + summary update {ingest_ms:.2f}ms, "
+          f"summary read {ms:.3f}ms (full recompute {rebuild_ms:.1f}ms)")
+
+if __name__ == "__main__":
+    main()
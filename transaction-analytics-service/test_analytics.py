@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Test script for the Transaction Analytics Service
+Runs in-process; the ledger is mocked:
+
+    python test_analytics.py    (or: python -m pytest test_analytics.py)
+"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("INTERNAL_API_TOKEN", "internal-test-token")
+os.environ.setdefault("ANALYTICS_DATA_DIR", tempfile.mkdtemp(prefix="analytics-test-"))
+
+import httpx
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import aggregates, main
+from app.columns import categorize, parse_timestamp
+from app.main import app
+from app.store import AnalyticsStore
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+INTERNAL = {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}
+
+def make_records(user_id, count, seed=0):
+    rng = random.Random(seed)
+    friends = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(5)]
+    records = []
+    for _ in range(count):
+        kind = rng.choice(["credit", "debit", "transfer_in", "transfer_out"])
+        amount = round(rng.uniform(1, 500), 2) * (1 if kind in ("credit", "transfer_in") else -1)
+        friend = rng.choice(friends)
+        description = {
+            "credit": "Funds added: stripe",
+            "debit": rng.choice(["Funds deducted: Service fee", "Funds deducted: card purchase", "Funds deducted: electricity bill"]),
+            "transfer_in": f"Transfer from user {friend}: rent share",
+            "transfer_out": f"Transfer to user {friend}: dinner",
+        }[kind]
+        records.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": user_id,
+            "amount": amount,
+            "transaction_type": kind,
+            "description": description,
+            "recipient_id": friend if kind.startswith("transfer") else None,
+            "created_at": (START + timedelta(seconds=rng.randint(0, 180 * 86400))).isoformat(),
+        })
+    return records
+
+def naive_totals(records, key):
+    """What summing paged rows one by one gives"""
+    totals = defaultdict(lambda: [0, 0, 0])
+    for record in records:
+        cents = int(round(record["amount"] * 100))
+        bucket = totals[key(record)]
+        bucket[0] += max(cents, 0)
+        bucket[1] += max(-cents, 0)
+        bucket[2] += 1
+    return dict(totals)
+
+def test_categorize():
+    assert categorize("credit", "Funds added: stripe") == "Top-ups"
+    assert categorize("debit", "Funds deducted: Service fee") == "Fees"
+    assert categorize("debit", "Funds deducted: card purchase") == "Virtual Cards"
+    assert categorize("transfer_out", f"Transfer to user {uuid.uuid4()}: dinner") == "Transfers"
+    assert categorize("transfer_in", f"Transfer from user {uuid.uuid4()}: cashback") == "Rewards"
+
+def test_parse_timestamp_accepts_go_timestamps():
+    assert parse_timestamp("2024-03-01T10:00:00.123456789Z") == 1709287200
+    assert parse_timestamp("2024-03-01T15:30:00.5+05:30") == 1709287200
+    assert parse_timestamp(1709287200) == 1709287200
+
+def test_aggregates_match_row_by_row_sums():
+    store = AnalyticsStore(data_dir=None, batch_size=97)
+    user = str(uuid.uuid4())
+    records = make_records(user, 2000)
+    assert store.ingest(records)["ingested"] == 2000
+    columns = store.history(user).columns
+
+    months = naive_totals(records, lambda r: r["created_at"][:7])
+    for row in aggregates.period_totals(columns, "month"):
+        assert (row["received"], row["spent"], row["count"]) == tuple(months[row["period"]])
+
+    def monday(record):
+        day = datetime.fromisoformat(record["created_at"]).date()
+        return str(day - timedelta(days=day.weekday()))
+
+    weeks = naive_totals(records, monday)
+    assert {row["period"]: [row["received"], row["spent"], row["count"]] for row in aggregates.period_totals(columns, "week")} == weeks
+
+    categories = naive_totals(records, lambda r: categorize(r["transaction_type"], r["description"]))
+    for row in aggregates.category_totals(columns, store.categories.labels):
+        assert (row["received"], row["spent"], row["count"]) == tuple(categories[row["category"]])
+
+    people = naive_totals([r for r in records if r["recipient_id"]], lambda r: r["recipient_id"])
+    for row in aggregates.counterparty_totals(columns, store.history(user).counterparties.labels):
+        assert (row["received"], row["sent"], row["count"]) == tuple(people[row["counterparty"]])
+
+def test_rolling_window_matches_a_loop():
+    store = AnalyticsStore(data_dir=None)
+    user = str(uuid.uuid4())
+    records = make_records(user, 1500, seed=1)
+    store.ingest(records)
+    end = parse_timestamp("2024-05-01T00:00:00Z")
+    result = aggregates.rolling_daily(store.history(user).columns, 7, 30, end)
+    daily = naive_totals(records, lambda r: r["created_at"][:10])
+    for i, date in enumerate(result["dates"]):
+        day = datetime.fromisoformat(date)
+        window = [daily.get(str((day - timedelta(days=k)).date()), [0, 0, 0])[1] for k in range(7)]
+        assert result["rolling_spent"][i] == sum(window)
+        assert abs(result["rolling_std_spent"][i] - np.std(window)) < 0.01
+    assert result["dates"][-1] == "2024-04-30" and len(result["dates"]) == 30
+
+def test_incremental_summary_matches_full_rebuild():
+    store = AnalyticsStore(data_dir=None, batch_size=50)
+    user = str(uuid.uuid4())
+    records = make_records(user, 1000, seed=2)
+    for start in range(0, 1000, 130):
+        store.ingest(records[start:start + 130])
+    summary = store.history(user).summary
+    rebuilt = AnalyticsStore(data_dir=None)
+    rebuilt.ingest(records)
+    columns = rebuilt.history(user).columns
+    assert summary.count == 1000
+    assert summary.categories(store.categories.labels) == aggregates.category_totals(columns, rebuilt.categories.labels)
+    months = {row["period"]: row for row in aggregates.period_totals(columns, "month")}
+    for month, (received, spent, count) in summary.months.items():
+        assert months[str(np.datetime64(month, "M"))]["spent"] == spent
+    assert summary.weekday_count.tolist() == aggregates.weekday_activity(columns)
+
+def test_duplicate_transactions_are_skipped():
+    store = AnalyticsStore(data_dir=None)
+    user = str(uuid.uuid4())
+    records = make_records(user, 300, seed=3)
+    assert store.ingest(records[:200])["ingested"] == 200
+    result = store.ingest(records[100:] + records[250:260])
+    assert (result["ingested"], result["duplicates"]) == (100, 110)
+    assert len(store.history(user).columns) == 300
+
+def test_snapshot_round_trip():
+    directory = tempfile.mkdtemp(prefix="analytics-snapshot-")
+    store = AnalyticsStore(data_dir=directory)
+    users = [str(uuid.uuid4()) for _ in range(3)]
+    for seed, user in enumerate(users):
+        store.ingest(make_records(user, 400, seed=seed))
+    assert store.save() == 3
+    loaded = AnalyticsStore(data_dir=directory)
+    assert loaded.load() == 3
+    for user in users:
+        assert np.array_equal(loaded.history(user).columns.amount, store.history(user).columns.amount)
+        assert loaded.history(user).summary.categories(loaded.categories.labels) == store.history(user).summary.categories(store.categories.labels)
+    # IDs survive the round trip, so a re-sync does not double count
+    assert loaded.ingest(make_records(users[0], 400, seed=0))["duplicates"] == 400
+
+def test_concurrent_ingests_and_saves_stay_consistent():
+    directory = tempfile.mkdtemp(prefix="analytics-snapshot-")
+    store = AnalyticsStore(data_dir=directory, batch_size=50)
+    users = [str(uuid.uuid4()) for _ in range(4)]
+    # Two threads per user, overlapping records, with snapshots written throughout
+    workers = [threading.Thread(target=store.ingest, args=(make_records(user, 300, seed=seed),))
+               for seed, user in enumerate(users) for _ in range(2)]
+    saver = threading.Thread(target=lambda: [store.save() for _ in range(20)])
+    for thread in workers + [saver]:
+        thread.start()
+    for thread in workers + [saver]:
+        thread.join()
+    store.save()
+    assert store.stats()["unsaved_users"] == 0
+    loaded = AnalyticsStore(data_dir=directory)
+    assert loaded.load() == 4
+    for user in users:
+        history = store.history(user)
+        assert len(history.columns) == history.summary.count == 300
+        assert np.array_equal(np.sort(loaded.history(user).columns.id_hash), np.sort(history.columns.id_hash))
+
+def test_api_ingest_and_snapshot_run_off_the_event_loop():
+    on_loop = []
+    ingest, save = main.store.ingest, main.store.save
+
+    def recorded(method):
+        def call(*args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(method.__name__)
+            except RuntimeError:
+                pass
+            return method(*args)
+        return call
+
+    main.store.ingest, main.store.save = recorded(ingest), recorded(save)
+    try:
+        with TestClient(app) as client:
+            user = str(uuid.uuid4())
+            response = client.post("/internal/analytics/transactions", headers=INTERNAL, json=make_records(user, 50, seed=6))
+            assert response.json()["ingested"] == 50
+        # Leaving the client ran the shutdown snapshot
+        assert main.store.stats()["unsaved_users"] == 0
+    finally:
+        del main.store.ingest, main.store.save
+    assert on_loop == []
+
+def test_rejected_records_are_reported():
+    store = AnalyticsStore(data_dir=None)
+    result = store.ingest([{"user_id": "u1", "amount": "abc", "created_at": "2024-01-01"}, "garbage",
+                           {"user_id": "u1", "amount": 5, "created_at": "2024-01-01T00:00:00Z"}])
+    assert (result["ingested"], result["rejected"]) == (1, 2)
+    assert len(result["errors"]) == 2
+
+def test_out_of_range_timestamps_are_rejected_without_touching_the_history():
+    store = AnalyticsStore(data_dir=None)
+    store.ingest([{"id": "t1", "user_id": "u1", "amount": 5, "created_at": "2024-01-01T00:00:00Z"}])
+    # Days from 1970 to the year 3 million: the month lookup alone would need gigabytes
+    for created_at in (10**14, float("inf"), "1999-12-31T23:59:59Z", "2999-01-01T00:00:00Z"):
+        result = store.ingest([{"id": "t2", "user_id": "u1", "amount": 7, "created_at": created_at}])
+        assert (result["ingested"], result["rejected"]) == (0, 1)
+        assert "outside" in result["errors"][0] or "not finite" in result["errors"][0]
+    history = store.history("u1")
+    assert len(history.columns) == history.summary.count == 1
+    assert store.ingest([{"id": "t2", "user_id": "u1", "amount": 7, "created_at": "2024-01-02T00:00:00Z"}])["ingested"] == 1
+
+def test_bad_amounts_are_rejected_next_to_good_rows():
+    store = AnalyticsStore(data_dir=None)
+    good = {"id": "t1", "user_id": "u1", "amount": 5, "created_at": "2024-01-01T00:00:00Z"}
+    bad = [{"user_id": f"bad{i}", "amount": amount, "created_at": "2024-01-01T00:00:00Z"}
+           for i, amount in enumerate(("1e400", float("inf"), float("nan"), 1e20, "-1e20"))]
+    result = store.ingest(bad[:3] + [good] + bad[3:])
+    assert (result["ingested"], result["rejected"]) == (1, 5)
+    # Rejected rows do not leave empty histories behind
+    assert (store.stats()["users"], store.stats()["transactions"]) == (1, 1)
+    assert store.history("bad0") is None
+
+def test_summary_failure_leaves_history_consistent():
+    store = AnalyticsStore(data_dir=None)
+    store.ingest([{"id": "t1", "user_id": "u1", "amount": 5, "created_at": "2024-01-01T00:00:00Z"}])
+    history = store.history("u1")
+    update = history.summary.update
+    def failing(batch):
+        raise MemoryError
+    history.summary.update = failing
+    batch = {name: array[:1].copy() for name, array in history.columns.to_arrays().items()}
+    batch["id_hash"][:] = 12345
+    try:
+        history.add(batch)
+    except MemoryError:
+        pass
+    history.summary.update = update
+    assert len(history.columns) == history.summary.count == 1
+    # The failed row was not remembered as seen, so it can be retried
+    assert history.add(batch) == 1 and len(history.columns) == history.summary.count == 2
+
+def test_api_ingest_and_summary():
+    user = str(uuid.uuid4())
+    records = make_records(user, 500, seed=4)
+    with TestClient(app) as client:
+        body = "\n".join(json.dumps(r) for r in records[:300]) + "\n{not json}\n"
+        response = client.post("/internal/analytics/transactions", content=body, headers={**INTERNAL, "Content-Type": "application/x-ndjson"})
+        assert response.json() == {**response.json(), "ingested": 300, "rejected": 1}
+        response = client.post("/internal/analytics/transactions", headers=INTERNAL, json=records[250:])
+        assert (response.json()["ingested"], response.json()["duplicates"]) == (200, 50)
+
+        summary = client.get(f"/v1/analytics/users/{user}/summary", params={"month": "2024-03"}).json()
+        spent = sum(-r["amount"] for r in records if r["amount"] < 0 and r["created_at"].startswith("2024-03"))
+        assert summary["transactions"] == 500
+        assert abs(summary["this_month"]["spent"] - spent) < 0.01
+        assert summary["last_month"]["month"] == "2024-02"
+        assert abs(sum(c["percentage"] for c in summary["spending_categories"]) - 100) < 0.5
+        assert sum(summary["weekly_activity"]) == 500
+
+        periods = client.get(f"/v1/analytics/users/{user}/periods", params={"period": "month", "start": "2024-03-01", "end": "2024-04-01"}).json()
+        assert [p["period"] for p in periods] == ["2024-03"] and abs(periods[0]["spent"] - spent) < 0.01
+        assert len(client.get(f"/v1/analytics/users/{user}/counterparties", params={"limit": 3}).json()) == 3
+        rolling = client.get(f"/v1/analytics/users/{user}/rolling", params={"window_days": 7, "days": 14, "end": "2024-04-01"}).json()
+        assert rolling["dates"][-1] == "2024-03-31"
+        assert client.get(f"/v1/analytics/users/{uuid.uuid4()}/summary").status_code == 404
+        assert client.get(f"/v1/analytics/users/{user}/categories", params={"start": "yesterday"}).status_code == 422
+        response = client.post("/internal/analytics/transactions", headers=INTERNAL, json=[{"user_id": user, "amount": 1, "created_at": 10**14}])
+        assert response.status_code == 422 and "outside" in response.json()["detail"]["errors"][0]
+        response = client.post("/internal/analytics/transactions", headers=INTERNAL, content=b'[{"user_id": "x", "amount": 1e400, "created_at": "2024-01-01"}]')
+        assert response.status_code == 422
+
+def test_writes_and_stats_are_internal_only():
+    user = str(uuid.uuid4())
+    with TestClient(app) as client:
+        # Not reachable under the /v1/analytics prefix Kong forwards
+        assert client.post("/v1/analytics/transactions", json=make_records(user, 5)).status_code == 404
+        assert client.post(f"/v1/analytics/users/{user}/sync").status_code == 404
+        assert client.get("/v1/analytics/stats").status_code == 404
+        assert client.post("/internal/analytics/transactions", json=make_records(user, 5)).status_code == 403
+        assert client.post(f"/internal/analytics/users/{user}/sync", headers={"X-Internal-Token": "guess"}).status_code == 403
+        assert client.get("/internal/analytics/stats").status_code == 403
+        assert client.get("/internal/analytics/stats", headers=INTERNAL).status_code == 200
+        assert client.get(f"/v1/analytics/users/{user}/summary").status_code == 404
+
+def test_sync_pulls_from_the_ledger():
+    user = str(uuid.uuid4())
+    records = make_records(user, 100, seed=5)
+
+    def ledger_handler(request):
+        assert request.url.path == f"/api/v1/transactions/{user}"
+        return httpx.Response(200, json=records)
+
+    with TestClient(app) as client:
+        main.ledger = httpx.AsyncClient(base_url="http://ledger", transport=httpx.MockTransport(ledger_handler))
+        first = client.post(f"/internal/analytics/users/{user}/sync", headers=INTERNAL).json()
+        second = client.post(f"/internal/analytics/users/{user}/sync", headers=INTERNAL).json()
+        assert (first["fetched"], first["ingested"]) == (100, 100)
+        assert (second["ingested"], second["duplicates"]) == (0, 100)
+
+if __name__ == "__main__":
+    print("🧪 Testing Transaction Analytics Service...")
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("🎉 All Transaction Analytics tests completed!")